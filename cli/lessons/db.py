@@ -11,27 +11,55 @@ with sessions.db.projects.id) in claude-sessions v0.48.0. The toolkit retains
 INIT_SQL for runtime bootstrap — it must stay byte-compatible with the yaml.
 
 Usage:
+    claude-toolkit lessons [--format text|json|jsonl|tsv] <subcommand> ...
     claude-toolkit lessons migrate [--json-path PATH]
     claude-toolkit lessons add --text TEXT --tags t1,t2 [--project NAME] [--branch B] [--scope global|project]
-    claude-toolkit lessons search <query> [--limit N]
-    claude-toolkit lessons list [--tier T] [--active] [--tags t1,t2] [--project P]
-    claude-toolkit lessons summary
+    claude-toolkit lessons search <query> [--limit N] [--prefix] [--active-only] [--all]
+    claude-toolkit lessons list [--tier T] [--active] [--tags t1,t2 [--all-tags]] [--project P [--project-like]] [--explain]
+    claude-toolkit lessons summary [--recompute]
+    claude-toolkit lessons health [--recompute]
+    claude-toolkit lessons archive [--older-than DAYS] [--dry-run]
+    claude-toolkit lessons export [--output PATH[.gz]]
+    claude-toolkit lessons import PATH[.gz]|- [--skip-existing]
     claude-toolkit lessons promote --id ID
     claude-toolkit lessons deactivate --id ID
     claude-toolkit lessons set-meta KEY VALUE
+    claude-toolkit lessons batch [--savepoints] < ops.jsonl
+    claude-toolkit lessons reindex-counts
+    claude-toolkit lessons serve [--socket PATH]
+    claude-toolkit lessons match --context TEXT [--project P] [--exclude IDS]
+    claude-toolkit lessons surface --context TEXT [--budget-bytes N | --budget-tokens N] [--project P] [--exclude IDS] [--session ID]
+    claude-toolkit lessons snapshot [--path PATH]
 """
 
 from __future__ import annotations
 
-import argparse
-import json
+import atexit
 import os
+import re
 import sqlite3
 import sys
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from itertools import combinations, islice
 from pathlib import Path
+from types import SimpleNamespace
 
-from cli.lessons.formatting import _c
+from cli.lessons.formatting import OUTPUT_FORMATS, _c, write_record, write_records
+
+# Startup cost is the bulk of a hook-driven `get`/`search`/`list`. Modules only
+# some subcommands need (argparse, json, typing, cli.lessons.similarity) are
+# imported where they are used; tests/test_lesson_db.py::TestStartup keeps them
+# off the import path.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    from typing import Any, TextIO, TypeVar
+
+    from cli.lessons.seen import SeenSet
+
+    T = TypeVar("T")
 
 # ---------------------------------------------------------------------------
 # Constants
@@ -39,16 +67,39 @@ from cli.lessons.formatting import _c
 
 LESSONS_DB_PATH = Path(os.environ.get("CLAUDE_ANALYTICS_LESSONS_DB") or (Path.home() / "claude-analytics" / "lessons.db"))
 SESSIONS_DB_PATH = Path(os.environ.get("CLAUDE_ANALYTICS_SESSIONS_DB") or (Path.home() / "claude-analytics" / "sessions.db"))
+LESSONS_SOCKET_PATH = Path(os.environ.get("CLAUDE_ANALYTICS_LESSONS_SOCKET") or (LESSONS_DB_PATH.parent / "lessons.sock"))
 LEARNED_JSON_PATH = Path(".claude/learned.json")
 
+BULK_CHUNK_SIZE = 500
+
+# Connection tuning (see CONNECTION_PRAGMAS). Parallel sessions share one
+# lessons.db: a writer waits up to BUSY_TIMEOUT_MS for the lock, then
+# transaction() retries BEGIN IMMEDIATE up to BUSY_RETRIES times after a
+# jittered backoff (0..BUSY_BACKOFF_MS * 2**attempt) before giving up.
+BUSY_TIMEOUT_MS = int(os.environ.get("CLAUDE_ANALYTICS_LESSONS_BUSY_TIMEOUT_MS") or 5000)
+BUSY_RETRIES = 3
+BUSY_BACKOFF_MS = 50
+CACHED_STATEMENTS = 256
+MMAP_SIZE = 64 * 1024 * 1024
+
+# FTS5 ranking: bm25() weight per lessons_fts column (text is the only one)
+# and the snippet() window size in tokens.
+SEARCH_COLUMN_WEIGHTS = (1.0,)
+SNIPPET_TOKENS = 16
+
+# Subcommands that change what surfacing sees; main() refreshes the snapshot after them.
+SNAPSHOT_COMMANDS = frozenset({
+    "migrate", "add", "crystallize", "absorb", "promote", "deactivate", "batch", "import",
+    "reindex-counts",
+})
+
 # ---------------------------------------------------------------------------
 # Schema initialization
 # ---------------------------------------------------------------------------
 
+# Baseline schema (migration 1). Mirrors the claude-sessions yaml; connection
+# pragmas (journal_mode, foreign_keys) are applied by init_lessons_db.
 INIT_SQL = """
-PRAGMA journal_mode=WAL;
-PRAGMA foreign_keys=ON;
-
 CREATE TABLE IF NOT EXISTS projects (
     id  TEXT PRIMARY KEY
 );
@@ -126,14 +177,344 @@ END;
 """
 
 
+# Toolkit-side schema, applied in order on top of INIT_SQL.
+TAG_KEYWORDS_SQL = """
+-- Inverted keyword index for surfacing: one row per (keyword token, tag).
+-- Derived from tags.keywords (see TAG_KEYWORD_TRIGGERS_SQL); toolkit-side only.
+CREATE TABLE IF NOT EXISTS tag_keywords (
+    keyword     TEXT NOT NULL,
+    tag_id      INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+    PRIMARY KEY (keyword, tag_id)
+) WITHOUT ROWID;
+"""
+
+# _keyword_tokens() in SQL, so the index follows tags.keywords however the
+# row is written (hand `UPDATE tags SET keywords = ...` from sqlite3
+# included). Triggers allow no CTEs, so character positions come from
+# json_each over a length(kw)-element array: a token starts at a [a-z0-9_-]
+# char not preceded by one and stops at the next char outside the class.
+_KEYWORD_TOKENS_SELECT = """
+    INSERT OR IGNORE INTO tag_keywords (keyword, tag_id)
+    SELECT substr(kw, start, stop - start), new.id FROM (
+        SELECT kw, p.key + 1 AS start, COALESCE((
+            SELECT MIN(q.key) + 1 FROM json_each(pos) q
+            WHERE q.key > p.key AND substr(kw, q.key + 1, 1) NOT GLOB '[a-z0-9_-]'
+        ), length(kw) + 1) AS stop
+        FROM (SELECT lower(new.keywords) AS kw,
+                     '[' || replace(hex(zeroblob(length(new.keywords))), '00', '0,') || '0]' AS pos)
+        JOIN json_each(pos) p
+        WHERE substr(kw, p.key + 1, 1) GLOB '[a-z0-9_-]'
+          AND (p.key = 0 OR substr(kw, p.key, 1) NOT GLOB '[a-z0-9_-]')
+    ) WHERE stop - start >= 3;"""
+
+TAG_KEYWORD_TRIGGERS_SQL = f"""
+-- Keep tag_keywords in step with tags.keywords on every insert and edit.
+CREATE TRIGGER IF NOT EXISTS tags_keywords_ai AFTER INSERT ON tags
+WHEN new.keywords IS NOT NULL BEGIN{_KEYWORD_TOKENS_SELECT}
+END;
+CREATE TRIGGER IF NOT EXISTS tags_keywords_au AFTER UPDATE OF keywords ON tags BEGIN
+    DELETE FROM tag_keywords WHERE tag_id = new.id;{_KEYWORD_TOKENS_SELECT}
+END;
+"""
+
+TAG_COUNT_TRIGGERS_SQL = """
+-- Keep tags.lesson_count (active lessons per tag) current incrementally.
+-- Deleting a lesson decrements before the lesson_tags cascade runs; the
+-- cascaded lesson_tags deletes then see no active lesson and skip.
+CREATE TRIGGER IF NOT EXISTS lesson_tags_count_ai AFTER INSERT ON lesson_tags
+WHEN (SELECT active FROM lessons WHERE id = new.lesson_id) = 1 BEGIN
+    UPDATE tags SET lesson_count = lesson_count + 1 WHERE id = new.tag_id;
+END;
+CREATE TRIGGER IF NOT EXISTS lesson_tags_count_ad AFTER DELETE ON lesson_tags
+WHEN (SELECT active FROM lessons WHERE id = old.lesson_id) = 1 BEGIN
+    UPDATE tags SET lesson_count = lesson_count - 1 WHERE id = old.tag_id;
+END;
+CREATE TRIGGER IF NOT EXISTS lessons_count_bd BEFORE DELETE ON lessons
+WHEN old.active = 1 BEGIN
+    UPDATE tags SET lesson_count = lesson_count - 1
+    WHERE id IN (SELECT tag_id FROM lesson_tags WHERE lesson_id = old.id);
+END;
+CREATE TRIGGER IF NOT EXISTS lessons_count_au AFTER UPDATE OF active ON lessons
+WHEN (old.active = 1) != (new.active = 1) BEGIN
+    UPDATE tags SET lesson_count = lesson_count + (CASE WHEN new.active = 1 THEN 1 ELSE -1 END)
+    WHERE id IN (SELECT tag_id FROM lesson_tags WHERE lesson_id = new.id);
+END;
+"""
+
+
+LESSON_SIGNATURES_SQL = """
+-- MinHash signatures of lesson text (cli.lessons.similarity) and their LSH
+-- band buckets. Filled lazily by refresh_signatures(); editing a lesson's
+-- text drops its rows so only new or changed lessons are re-hashed.
+CREATE TABLE IF NOT EXISTS lesson_signatures (
+    lesson_id   TEXT NOT NULL REFERENCES lessons(id) ON DELETE CASCADE,
+    kind        TEXT NOT NULL,
+    signature   BLOB NOT NULL,
+    PRIMARY KEY (lesson_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lesson_lsh (
+    kind        TEXT NOT NULL,
+    band        INTEGER NOT NULL,
+    bucket      INTEGER NOT NULL,
+    lesson_id   TEXT NOT NULL REFERENCES lessons(id) ON DELETE CASCADE,
+    PRIMARY KEY (kind, band, bucket, lesson_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lesson_lsh_lesson ON lesson_lsh(lesson_id);
+CREATE TRIGGER IF NOT EXISTS lessons_signature_au AFTER UPDATE OF text ON lessons BEGIN
+    DELETE FROM lesson_signatures WHERE lesson_id = new.id;
+    DELETE FROM lesson_lsh WHERE lesson_id = new.id;
+END;
+"""
+
+
+FTS_UPDATE_OF_TEXT_SQL = """
+-- Re-index FTS only when the text changes, not on tier/active/... updates.
+DROP TRIGGER IF EXISTS lessons_fts_au;
+CREATE TRIGGER lessons_fts_au AFTER UPDATE OF text ON lessons BEGIN
+    INSERT INTO lessons_fts(lessons_fts, rowid, text)
+    VALUES('delete', old.rowid, old.text);
+    INSERT INTO lessons_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+"""
+
+
+LESSON_ID_SEQUENCES_SQL = """
+-- Per-prefix counters for generated lesson ids (<project>_<YYYYMMDDTHHMM>_<NNN>);
+-- see allocate_lesson_id().
+CREATE TABLE IF NOT EXISTS lesson_id_sequences (
+    prefix      TEXT PRIMARY KEY,
+    last_seq    INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+LIST_INDEXES_SQL = """
+-- Covering indexes for plan_list_query(): filters that end in ORDER BY date
+-- without a sort step, and tag filters answered from lesson_tags' index
+-- alone. They sit alongside the yaml-owned prefix indexes, not in place.
+CREATE INDEX IF NOT EXISTS idx_lessons_active_tier_date ON lessons(active, tier, date);
+CREATE INDEX IF NOT EXISTS idx_lessons_project_date ON lessons(project_id, date);
+CREATE INDEX IF NOT EXISTS idx_lesson_tags_tag_lesson ON lesson_tags(tag_id, lesson_id);
+"""
+
+YAML_INDEXES_SQL = """
+-- Restore the lessons.yaml indexes an earlier migration 7 dropped as
+-- redundant prefixes; INIT_SQL must stay byte-compatible with the yaml.
+CREATE INDEX IF NOT EXISTS idx_lessons_project ON lessons(project_id);
+CREATE INDEX IF NOT EXISTS idx_lessons_active_tier ON lessons(active, tier);
+CREATE INDEX IF NOT EXISTS idx_lesson_tags_tag ON lesson_tags(tag_id);
+"""
+
+# Running totals behind `health` and `summary`: column -> per-row term, with
+# {r} standing for the row (new/old in triggers, the table in a recount).
+# The triggers add a row's terms on insert, subtract them on delete, and do
+# both on an update of a column the terms read.
+LESSON_STATS_TERMS = {
+    "total": "1",
+    "active": "{r}.active = 1",
+    **{
+        f"{tier}_{kind}": f"{{r}}.tier = '{tier}'" + (" AND {r}.active = 1" if kind == "active" else "")
+        for tier in ("historical", "key", "recent") for kind in ("total", "active")
+    },
+    "absorbed": "{r}.absorbed_into IS NOT NULL",
+    "crystallized": "{r}.crystallized_from IS NOT NULL",
+}
+TAG_STATS_TERMS = {
+    "active_tags": "{r}.status = 'active'",
+    "orphaned_tags": "{r}.status = 'active' AND {r}.lesson_count = 0",
+}
+_STATS_COLUMNS = (*LESSON_STATS_TERMS, *TAG_STATS_TERMS)
+
+
+def _stats_trigger_sql(table: str, terms: dict[str, str], columns: str) -> str:
+    def sets(*parts: tuple[str, str]) -> str:
+        return ",\n        ".join(
+            f"{col} = {col}" + "".join(f" {sign} ({term.format(r=r)})" for sign, r in parts)
+            for col, term in terms.items()
+            if len(parts) == 1 or "{r}" in term  # an update never changes a constant term
+        )
+
+    return f"""
+CREATE TRIGGER IF NOT EXISTS {table}_stats_ai AFTER INSERT ON {table} BEGIN
+    UPDATE lesson_stats SET
+        {sets(("+", "new"))}
+    WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_stats_ad AFTER DELETE ON {table} BEGIN
+    UPDATE lesson_stats SET
+        {sets(("-", "old"))}
+    WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_stats_au AFTER UPDATE OF {columns} ON {table} BEGIN
+    UPDATE lesson_stats SET
+        {sets(("-", "old"), ("+", "new"))}
+    WHERE id = 1;
+END;
+"""
+
+
+LESSON_STATS_SQL = (
+    """
+-- One row of running totals for health/summary, kept current by the
+-- *_stats_* triggers so reading them costs the same at any archive size.
+-- recompute_lesson_stats() rebuilds it from the base tables.
+CREATE TABLE IF NOT EXISTS lesson_stats (
+    id  INTEGER PRIMARY KEY CHECK (id = 1),
+"""
+    + ",\n".join(f"    {col:<18}INTEGER NOT NULL DEFAULT 0" for col in _STATS_COLUMNS)
+    + "\n);\nINSERT OR IGNORE INTO lesson_stats (id) VALUES (1);\n"
+    + _stats_trigger_sql("lessons", LESSON_STATS_TERMS, "tier, active, absorbed_into, crystallized_from")
+    + _stats_trigger_sql("tags", TAG_STATS_TERMS, "status, lesson_count")
+)
+
+_GENERATED_ID_RE = re.compile(r"^(.+_\d{8}T\d{4})_(\d+)$")
+
+
+def _migrate_tag_keywords(conn: sqlite3.Connection) -> None:
+    _run_script(conn, TAG_KEYWORDS_SQL)
+    rebuild_keyword_index(conn)
+
+
+def _migrate_tag_keyword_triggers(conn: sqlite3.Connection) -> None:
+    _run_script(conn, TAG_KEYWORD_TRIGGERS_SQL)
+    # Catch up on keywords edited by hand while only Python kept the index.
+    rebuild_keyword_index(conn)
+
+
+def _migrate_lesson_stats(conn: sqlite3.Connection) -> None:
+    _run_script(conn, LESSON_STATS_SQL)
+    recompute_lesson_stats(conn)
+
+
+def _migrate_id_sequences(conn: sqlite3.Connection) -> None:
+    _run_script(conn, LESSON_ID_SEQUENCES_SQL)
+    # Seed from ids generated before the table existed.
+    last: dict[str, int] = {}
+    for (lesson_id,) in conn.execute("SELECT id FROM lessons"):
+        if m := _GENERATED_ID_RE.match(lesson_id):
+            last[m[1]] = max(last.get(m[1], 0), int(m[2]))
+    conn.executemany(
+        """INSERT INTO lesson_id_sequences (prefix, last_seq) VALUES (?, ?)
+           ON CONFLICT (prefix) DO UPDATE SET last_seq = max(last_seq, excluded.last_seq)""",
+        last.items(),
+    )
+
+
+# Ordered schema migrations: entry N brings PRAGMA user_version from N-1 to N.
+# Append only — never edit or reorder a shipped entry. Every entry must be
+# idempotent, since databases created before versioning start at 0.
+MIGRATIONS: list[str | Callable[[sqlite3.Connection], None]] = [
+    INIT_SQL,  # 1: baseline tables, FTS and FTS triggers
+    _migrate_tag_keywords,  # 2: tag_keywords inverted index + backfill
+    TAG_COUNT_TRIGGERS_SQL,  # 3: incremental tags.lesson_count
+    LESSON_SIGNATURES_SQL,  # 4: MinHash signatures + LSH buckets
+    FTS_UPDATE_OF_TEXT_SQL,  # 5: lessons_fts_au limited to UPDATE OF text
+    _migrate_id_sequences,  # 6: lesson_id_sequences for allocate_lesson_id
+    LIST_INDEXES_SQL,  # 7: covering indexes for plan_list_query
+    _migrate_lesson_stats,  # 8: trigger-maintained lesson_stats row + backfill
+    _migrate_tag_keyword_triggers,  # 9: tag_keywords kept current by triggers + rebuild
+    YAML_INDEXES_SQL,  # 10: yaml-owned indexes dropped by early migration 7
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _run_script(conn: sqlite3.Connection, script: str) -> None:
+    """Execute a multi-statement script inside the current transaction.
+
+    Unlike executescript(), this issues no implicit COMMIT first, so a
+    migration and its user_version bump land atomically.
+    """
+    stmt = ""
+    for line in script.splitlines(keepends=True):
+        stmt += line
+        if sqlite3.complete_statement(stmt):
+            conn.execute(stmt)
+            stmt = ""
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Apply pending MIGRATIONS and bump user_version, all in one transaction."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    with transaction(conn):
+        # Re-read under the write lock: a concurrent opener may have migrated.
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            if isinstance(step, str):
+                _run_script(conn, step)
+            else:
+                step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+
+
+# Per-connection tuning. synchronous=NORMAL is crash-safe under WAL (a power
+# loss can drop the last commits, never corrupt); busy_timeout comes from
+# sqlite3.connect(timeout=...).
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+)
+
+
 def init_lessons_db(db_path: Path = LESSONS_DB_PATH) -> sqlite3.Connection:
-    """Create or open the lessons database and ensure schema exists."""
+    """Create or open the lessons database and ensure schema exists.
+
+    Warm databases (user_version == SCHEMA_VERSION) skip the schema script
+    entirely; only per-connection pragmas are set.
+    """
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(db_path))
-    conn.executescript(INIT_SQL)
+    conn = sqlite3.connect(
+        str(db_path), timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=CACHED_STATEMENTS,
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate(conn)
     return conn
 
 
+# Process-wide connections by absolute DB path, with the file identity they
+# were opened against (a replaced or deleted file gets a fresh connection).
+_CONNECTIONS: dict[str, tuple[sqlite3.Connection, tuple[int, int] | None]] = {}
+
+
+def _file_identity(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+
+def get_connection(db_path: Path = LESSONS_DB_PATH) -> sqlite3.Connection:
+    """Shared, warmed connection for db_path — opened on first use, reused after.
+
+    CLI subcommands (and batch callers) go through this instead of
+    init_lessons_db, and must not close the connection; close_connections()
+    runs at exit.
+    """
+    key = os.path.abspath(db_path)
+    cached = _CONNECTIONS.get(key)
+    if cached is not None:
+        conn, identity = cached
+        if identity is not None and identity == _file_identity(key):
+            return conn
+        conn.close()
+    conn = init_lessons_db(db_path)
+    _CONNECTIONS[key] = (conn, _file_identity(key))
+    return conn
+
+
+def close_connections() -> None:
+    """Close every cached connection (checkpointing their WAL)."""
+    while _CONNECTIONS:
+        _, (conn, _) = _CONNECTIONS.popitem()
+        conn.close()
+
+
+atexit.register(close_connections)
+
+
 # ---------------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------------
@@ -143,12 +524,130 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
 
 
+# Connections currently inside a transaction() block (keyed by id(conn)).
+_UNITS_OF_WORK: set[int] = set()
+
+
+def _is_busy(exc: sqlite3.OperationalError) -> bool:
+    return exc.sqlite_errorcode in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def _begin_immediate(conn: sqlite3.Connection) -> None:
+    """BEGIN IMMEDIATE, retried with jittered backoff once the busy timeout runs out.
+
+    Only the BEGIN is retried: nothing has run yet, so a retry is always safe.
+    """
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as exc:
+            if attempt == BUSY_RETRIES or not _is_busy(exc):
+                raise
+            import random
+            import time
+
+            time.sleep(random.uniform(0, BUSY_BACKOFF_MS * 2**attempt) / 1000)
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, *, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+    """Run a block of helper calls as one transaction (one commit, one fsync).
+
+    Helpers called inside the block skip their own commits; the block commits
+    on success and rolls back on any exception (including sys.exit). Nested
+    blocks on the same connection join the outermost one. Blocks take the
+    write lock up front (BEGIN IMMEDIATE, see _begin_immediate): a deferred
+    transaction that reads first cannot wait for the lock when it later
+    writes, it fails with "database is locked". `immediate=False` is for
+    read-only blocks.
+    """
+    if id(conn) in _UNITS_OF_WORK:
+        yield conn
+        return
+    if conn.in_transaction:
+        conn.commit()
+    if immediate:
+        _begin_immediate(conn)
+    else:
+        conn.execute("BEGIN")
+    _UNITS_OF_WORK.add(id(conn))
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _UNITS_OF_WORK.discard(id(conn))
+
+
+@contextmanager
+def fts_bulk_mode(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Bulk-load block: no row-by-row FTS maintenance, one rebuild at the end.
+
+    Runs as a transaction(): the lessons_fts_* triggers are dropped, the
+    block runs, then lessons_fts is rebuilt from lessons, optimized, and the
+    triggers are recreated from their stored definitions. DDL is
+    transactional, so a failure rolls the triggers back into place and
+    other connections never see them missing.
+    """
+    with transaction(conn):
+        triggers = conn.execute(
+            """SELECT name, sql FROM sqlite_master
+               WHERE type = 'trigger' AND tbl_name = 'lessons' AND name LIKE 'lessons_fts_%'"""
+        ).fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        yield conn
+        conn.execute("INSERT INTO lessons_fts(lessons_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO lessons_fts(lessons_fts) VALUES ('optimize')")
+        for _, sql in triggers:
+            conn.execute(sql)
+
+
+# Triggers that only keep derived counters current (tags.lesson_count,
+# lesson_stats); bulk_load() swaps them for one recount at the end.
+_COUNTER_TRIGGERS = ("lesson_tags_count_%", "lessons_count_%", "lessons_stats_%", "tags_stats_%")
+
+
+@contextmanager
+def bulk_load(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """fts_bulk_mode() that also defers the counter triggers.
+
+    Per-row tag-count and lesson_stats updates are most of the remaining
+    per-row cost of a large load; they are dropped for the block, then tag
+    counts and lesson_stats are recounted once and the triggers restored,
+    all in the same transaction.
+    """
+    with fts_bulk_mode(conn):
+        triggers = conn.execute(
+            f"""SELECT name, sql FROM sqlite_master WHERE type = 'trigger'
+                AND ({" OR ".join("name LIKE ?" for _ in _COUNTER_TRIGGERS)})""",  # noqa: S608
+            _COUNTER_TRIGGERS,
+        ).fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        yield conn
+        _refresh_tag_counts(conn)
+        recompute_lesson_stats(conn)
+        for _, sql in triggers:
+            conn.execute(sql)
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    """Commit unless an enclosing transaction() owns the commit."""
+    if id(conn) not in _UNITS_OF_WORK:
+        conn.commit()
+
+
 def ensure_project(conn: sqlite3.Connection, project_id: str) -> str:
     """Ensure project row exists; return the id unchanged."""
     conn.execute(
         "INSERT OR IGNORE INTO projects (id) VALUES (?)", (project_id,)
     )
-    conn.commit()
+    _commit(conn)
     return project_id
 
 
@@ -176,33 +675,35 @@ def get_or_create_tag(
                 f"UPDATE tags SET {sets} WHERE id = ?",  # noqa: S608
                 [*updates.values(), tag_id],
             )
-            conn.commit()
+            _commit(conn)
         return tag_id
     cur = conn.execute(
         "INSERT INTO tags (name, keywords, description) VALUES (?, ?, ?)",
         (name, keywords, description),
     )
-    conn.commit()
+    _commit(conn)
     return cur.lastrowid  # type: ignore[return-value]
 
 
 def tag_lesson(
     conn: sqlite3.Connection, lesson_id: str, tag_ids: list[int]
 ) -> None:
-    """Attach tags to a lesson and update tag counts."""
-    for tag_id in tag_ids:
-        conn.execute(
-            "INSERT OR IGNORE INTO lesson_tags (lesson_id, tag_id) VALUES (?, ?)",
-            (lesson_id, tag_id),
-        )
-    conn.commit()
-    _refresh_tag_counts(conn, tag_ids)
+    """Attach tags to a lesson (lesson_count is kept by triggers)."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO lesson_tags (lesson_id, tag_id) VALUES (?, ?)",
+        [(lesson_id, tag_id) for tag_id in tag_ids],
+    )
+    _commit(conn)
 
 
 def _refresh_tag_counts(
     conn: sqlite3.Connection, tag_ids: list[int] | None = None
 ) -> None:
-    """Recompute lesson_count for given tags (or all if None)."""
+    """Recompute lesson_count for given tags (or all if None).
+
+    Triggers keep counts current on every write; this full recount is the
+    repair path behind `lessons reindex-counts`.
+    """
     if tag_ids:
         placeholders = ",".join("?" for _ in tag_ids)
         conn.execute(
@@ -221,7 +722,78 @@ def _refresh_tag_counts(
                 WHERE lt.tag_id = tags.id AND l.active = 1
             )"""
         )
-    conn.commit()
+    _commit(conn)
+
+
+def _recount_lesson_stats(conn: sqlite3.Connection) -> dict[str, int]:
+    """lesson_stats as a full recount of lessons and tags would give it."""
+    def sums(table: str, terms: dict[str, str]) -> str:
+        cols = ", ".join(f"COALESCE(SUM({term.format(r='r')}), 0)" for term in terms.values())
+        return f"SELECT {cols} FROM {table} r"  # noqa: S608
+
+    values = [*conn.execute(sums("lessons", LESSON_STATS_TERMS)).fetchone(),
+              *conn.execute(sums("tags", TAG_STATS_TERMS)).fetchone()]
+    return dict(zip(_STATS_COLUMNS, values))
+
+
+def _stored_lesson_stats(conn: sqlite3.Connection) -> dict[str, int] | None:
+    row = conn.execute(f"SELECT {', '.join(_STATS_COLUMNS)} FROM lesson_stats WHERE id = 1").fetchone()  # noqa: S608
+    return dict(zip(_STATS_COLUMNS, row)) if row else None
+
+
+def read_lesson_stats(conn: sqlite3.Connection) -> dict[str, int]:
+    """The materialized lesson_stats row: one primary-key read."""
+    stats = _stored_lesson_stats(conn)
+    if stats is None:  # row deleted by hand
+        recompute_lesson_stats(conn)
+        stats = _stored_lesson_stats(conn) or _recount_lesson_stats(conn)
+    return stats
+
+
+def lesson_stats_drift(conn: sqlite3.Connection) -> list[tuple[str, int | None, int]]:
+    """(column, stored, actual) for each lesson_stats column a recount disagrees with."""
+    stored = _stored_lesson_stats(conn) or {}
+    return [
+        (col, stored.get(col), actual)
+        for col, actual in _recount_lesson_stats(conn).items()
+        if stored.get(col) != actual
+    ]
+
+
+def recompute_lesson_stats(conn: sqlite3.Connection) -> list[tuple[str, int | None, int]]:
+    """Rebuild lesson_stats from lessons and tags (repair path behind
+    `health --recompute`). Returns the drift it corrected."""
+    with transaction(conn):
+        drift = lesson_stats_drift(conn)
+        actual = _recount_lesson_stats(conn)
+        conn.execute(
+            f"""INSERT OR REPLACE INTO lesson_stats (id, {', '.join(actual)})
+                VALUES (1, {', '.join('?' * len(actual))})""",  # noqa: S608
+            list(actual.values()),
+        )
+    return drift
+
+
+def allocate_lesson_id(conn: sqlite3.Connection, project_id: str, *, now: datetime | None = None) -> str:
+    """Next generated id, `<project>_<YYYYMMDDTHHMM>_<NNN>` (UTC minute).
+
+    One upsert on lesson_id_sequences, no scan of lessons. Call it inside the
+    transaction that inserts the lesson: the counter row stays write-locked
+    until commit, so concurrent writers serialize on it and never share an
+    id. Ids already taken by hand (add --id, migrate) are skipped.
+    """
+    prefix = f"{project_id}_{(now or datetime.now(timezone.utc)).strftime('%Y%m%dT%H%M')}"
+    while True:
+        # fetchall: a RETURNING statement must run to completion before commit.
+        [(seq,)] = conn.execute(
+            """INSERT INTO lesson_id_sequences (prefix, last_seq) VALUES (?, 1)
+               ON CONFLICT (prefix) DO UPDATE SET last_seq = last_seq + 1
+               RETURNING last_seq""",
+            (prefix,),
+        ).fetchall()
+        lesson_id = f"{prefix}_{seq:03d}"
+        if not conn.execute("SELECT 1 FROM lessons WHERE id = ?", (lesson_id,)).fetchone():
+            return lesson_id
 
 
 def insert_lesson(
@@ -241,32 +813,84 @@ def insert_lesson(
     scope: str = "global",
 ) -> str:
     """Insert a lesson with project and tags. Returns the lesson id."""
-    ensure_project(conn, project_id)
-    conn.execute(
-        """INSERT INTO lessons
-           (id, project_id, date, tier, active, scope, text, branch,
-            crystallized_from, promoted, archived)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (
-            lesson_id,
-            project_id,
-            date,
-            tier,
-            1 if active else 0,
-            scope,
-            text,
-            branch,
-            crystallized_from,
-            promoted,
-            archived,
-        ),
-    )
-    conn.commit()
+    insert_lessons_bulk(conn, [{
+        "lesson_id": lesson_id,
+        "project_id": project_id,
+        "date": date,
+        "text": text,
+        "tag_names": tag_names,
+        "tier": tier,
+        "active": active,
+        "branch": branch,
+        "crystallized_from": crystallized_from,
+        "promoted": promoted,
+        "archived": archived,
+        "scope": scope,
+    }])
+    return lesson_id
 
-    tag_ids = [get_or_create_tag(conn, name) for name in tag_names]
-    tag_lesson(conn, lesson_id, tag_ids)
 
-    return lesson_id
+def _chunks(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    it = iter(items)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def insert_lessons_bulk(
+    conn: sqlite3.Connection, lessons: Iterable[Mapping[str, Any]]
+) -> int:
+    """Insert many lessons in one transaction. Returns the number inserted.
+
+    Each item takes the same keys as insert_lesson's keyword arguments,
+    plus optional absorbed_into and created_at (default: now). Projects,
+    lessons and tag links go through executemany in chunks of
+    BULK_CHUNK_SIZE and the whole load commits once. Any failure rolls
+    every row back.
+    """
+    tag_ids: dict[str, int] = {}
+    inserted = 0
+    with transaction(conn):
+        for chunk in _chunks(lessons, BULK_CHUNK_SIZE):
+            conn.executemany(
+                "INSERT OR IGNORE INTO projects (id) VALUES (?)",
+                [(pid,) for pid in dict.fromkeys(item["project_id"] for item in chunk)],
+            )
+            conn.executemany(
+                """INSERT INTO lessons
+                   (id, project_id, date, tier, active, scope, text, branch,
+                    crystallized_from, absorbed_into, promoted, archived, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, datetime('now')))""",
+                [
+                    (
+                        item["lesson_id"],
+                        item["project_id"],
+                        item["date"],
+                        item.get("tier", "recent"),
+                        1 if item.get("active", True) else 0,
+                        item.get("scope", "global"),
+                        item["text"],
+                        item.get("branch"),
+                        item.get("crystallized_from"),
+                        item.get("absorbed_into"),
+                        item.get("promoted"),
+                        item.get("archived"),
+                        item.get("created_at"),
+                    )
+                    for item in chunk
+                ],
+            )
+            links: list[tuple[str, int]] = []
+            for item in chunk:
+                for name in item.get("tag_names", ()):
+                    if name not in tag_ids:
+                        tag_ids[name] = get_or_create_tag(conn, name)
+                    links.append((item["lesson_id"], tag_ids[name]))
+            conn.executemany(
+                "INSERT OR IGNORE INTO lesson_tags (lesson_id, tag_id) VALUES (?, ?)",
+                links,
+            )
+            inserted += len(chunk)
+    return inserted
 
 
 def update_lesson(
@@ -285,10 +909,7 @@ def update_lesson(
         f"UPDATE lessons SET {sets} WHERE id = ?",  # noqa: S608
         [*to_set.values(), lesson_id],
     )
-    conn.commit()
-    # Refresh tag counts if active status changed
-    if "active" in to_set:
-        _refresh_tag_counts(conn)
+    _commit(conn)
 
 
 def set_metadata(conn: sqlite3.Connection, key: str, value: str) -> None:
@@ -299,7 +920,7 @@ def set_metadata(conn: sqlite3.Connection, key: str, value: str) -> None:
            updated_at = excluded.updated_at""",
         (key, value, _now_iso()),
     )
-    conn.commit()
+    _commit(conn)
 
 
 def get_metadata(conn: sqlite3.Connection, key: str) -> str | None:
@@ -310,6 +931,585 @@ def get_metadata(conn: sqlite3.Connection, key: str) -> str | None:
     return row[0] if row else None
 
 
+# ---------------------------------------------------------------------------
+# Listing (index-friendly filters for cmd_list)
+# ---------------------------------------------------------------------------
+
+LIST_TAG_MODES = ("any", "all")
+
+
+def plan_list_query(
+    conn: sqlite3.Connection,
+    *,
+    tier: str | None = None,
+    active: bool = False,
+    tags: Iterable[str] = (),
+    tag_mode: str = "any",
+    project: str | None = None,
+    project_like: bool = False,
+    scope: str | None = None,
+    limit: int = 50,
+) -> tuple[str, list[Any]]:
+    """Build cmd_list's query in forms the indexes can serve. Returns (sql, params).
+
+    - project is an exact `project_id = ?` (idx_lessons_project_date);
+      the substring LIKE only runs with project_like, and has to scan.
+    - tag names are resolved to ids up front, so candidate lessons come
+      from idx_lesson_tags_tag_lesson alone: one `tag_id IN (...)` range
+      for "any", an INTERSECT of per-tag lookups for "all". An unknown tag
+      matches nothing under "all" and is ignored under "any".
+    - each row's tag names are a correlated lookup on the (lesson_id,
+      tag_id) unique index rather than a LEFT JOIN + GROUP BY over every
+      lesson.
+    """
+    if tag_mode not in LIST_TAG_MODES:
+        raise ValueError(f"tag_mode must be one of {LIST_TAG_MODES}, got {tag_mode!r}")
+    where: list[str] = []
+    params: list[Any] = []
+
+    if tier:
+        where.append("l.tier = ?")
+        params.append(tier)
+    if active:
+        where.append("l.active = 1")
+    if project:
+        where.append("l.project_id LIKE ?" if project_like else "l.project_id = ?")
+        params.append(f"%{project}%" if project_like else project)
+    names = list(dict.fromkeys(t.strip() for t in tags if t.strip()))
+    if names:
+        tag_ids = [tid for (tid,) in conn.execute(
+            f"SELECT id FROM tags WHERE name IN ({','.join('?' * len(names))})", names  # noqa: S608
+        )]
+        if not tag_ids or (tag_mode == "all" and len(tag_ids) < len(names)):
+            where.append("0")
+        elif tag_mode == "all":
+            where.append("l.id IN (" + " INTERSECT ".join(
+                "SELECT lesson_id FROM lesson_tags WHERE tag_id = ?" for _ in tag_ids
+            ) + ")")
+            params.extend(tag_ids)
+        else:
+            where.append(
+                f"l.id IN (SELECT lesson_id FROM lesson_tags WHERE tag_id IN ({','.join('?' * len(tag_ids))}))"
+            )
+            params.extend(tag_ids)
+    if scope:
+        where.append("l.scope = ?")
+        params.append(scope)
+
+    sql = """
+        SELECT l.id, l.date, l.tier, l.active, l.text, l.project_id,
+               (SELECT GROUP_CONCAT(t.name, ', ') FROM lesson_tags lt
+                JOIN tags t ON t.id = lt.tag_id WHERE lt.lesson_id = l.id) AS tags,
+               l.scope
+        FROM lessons l
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY l.date DESC LIMIT ?"
+    params.append(limit)
+    return sql, params
+
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str, params: Iterable[Any] = ()) -> list[dict[str, Any]]:
+    """EXPLAIN QUERY PLAN rows as {"id", "parent", "depth", "detail"}, in plan order."""
+    depth: dict[int, int] = {0: -1}
+    rows = []
+    for node_id, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}", list(params)):
+        depth[node_id] = depth.get(parent, -1) + 1
+        rows.append({"id": node_id, "parent": parent, "depth": depth[node_id], "detail": detail})
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Surfacing (tool-context → lessons)
+# ---------------------------------------------------------------------------
+
+SURFACE_LIMIT = 3
+MIN_TAG_HITS = 2
+MIN_WORD_LEN = 3
+
+# surface_lessons(): default payload budget, the bytes-per-token estimate for
+# --budget-tokens, and the score of a candidate lesson:
+#   hits * SURFACE_HIT_WEIGHT          distinct context words hitting its tags
+#   + SURFACE_TIER_BONUS[tier]
+#   + SURFACE_RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+#   + SURFACE_PROJECT_BONUS            project-scoped lesson of this project
+SURFACE_BUDGET_BYTES = 1200
+BYTES_PER_TOKEN = 4
+SURFACE_HIT_WEIGHT = 1.0
+SURFACE_TIER_BONUS = {"key": 2.0, "recent": 0.0, "historical": -1.0}
+SURFACE_RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE_DAYS = 30
+SURFACE_PROJECT_BONUS = 1.0
+SURFACE_LINE = "- {text}\n"
+
+_WORD_RE = re.compile(r"[a-z0-9_-]+")
+
+
+def _context_words(context: str) -> list[str]:
+    """Tokenize tool context the way surface-lessons does.
+
+    Lowercase alphanumeric+`_-` runs, at least MIN_WORD_LEN chars, deduped in
+    first-seen order so each word contributes at most one hit per tag.
+    """
+    words = (w for w in _WORD_RE.findall(context.lower()) if len(w) >= MIN_WORD_LEN)
+    return list(dict.fromkeys(words))
+
+
+def _word_forms(word: str) -> tuple[str, ...]:
+    """Return the forms a context word may match under (plural-stripped too)."""
+    if word.endswith("s") and len(word) > MIN_WORD_LEN:
+        return (word, word[:-1])
+    return (word,)
+
+
+def _keyword_tokens(keywords: str) -> set[str]:
+    """Split a comma-joined tags.keywords value into matchable tokens.
+
+    Each keyword is tokenized like tool context, so `Bash(` indexes as `bash`
+    and `make check` as `make` + `check`.
+    """
+    return {
+        token
+        for kw in keywords.split(",")
+        for token in _WORD_RE.findall(kw.lower())
+        if len(token) >= MIN_WORD_LEN
+    }
+
+
+def rebuild_keyword_index(conn: sqlite3.Connection) -> None:
+    """Rebuild tag_keywords from tags.keywords for every tag (repair path).
+
+    The tags_keywords_* triggers keep the index current; this recomputes it
+    with _keyword_tokens() for DBs that predate them or were edited with the
+    triggers dropped.
+    """
+    conn.execute("DELETE FROM tag_keywords")
+    conn.executemany(
+        "INSERT INTO tag_keywords (keyword, tag_id) VALUES (?, ?)",
+        [
+            (token, tag_id)
+            for tag_id, keywords in conn.execute(
+                "SELECT id, keywords FROM tags WHERE keywords IS NOT NULL"
+            ).fetchall()
+            for token in _keyword_tokens(keywords)
+        ],
+    )
+    _commit(conn)
+
+
+def match_lessons(
+    conn: sqlite3.Connection,
+    context: str,
+    *,
+    project: str | None = None,
+    exclude: list[str] | tuple[str, ...] = (),
+    limit: int = SURFACE_LIMIT,
+) -> list[tuple[str, str]]:
+    """Return (id, text) of active lessons relevant to a tool context.
+
+    The candidates are surface_candidates(); they come back key tier first,
+    then newest, capped at `limit`. The lessons server answers the same
+    question from memory (see cli/lessons/server.py).
+    """
+    rows = surface_candidates(conn, context, project=project, exclude=exclude)
+    rows.sort(key=lambda r: r[0])
+    rows.sort(key=lambda r: r[3], reverse=True)
+    rows.sort(key=lambda r: r[2] != "key")
+    return [(lid, text) for lid, text, *_ in rows[:limit]]
+
+
+def surface_candidates(
+    conn: sqlite3.Connection,
+    context: str,
+    *,
+    project: str | None = None,
+    exclude: list[str] | tuple[str, ...] = (),
+) -> list[tuple[str, str, str, str, str, str, int]]:
+    """Every active lesson relevant to a tool context, unranked and unlimited.
+
+    A tag is a candidate when at least MIN_TAG_HITS distinct context words hit
+    its keyword tokens (exact lookups in tag_keywords, so cost tracks the
+    number of context words, not the size of the tag registry). Lessons
+    carrying a candidate tag surface; project-scoped ones only for their own
+    project. Context words and `exclude` are bound as one JSON array each
+    (json_each), so no context is too large for SQLite's variable limit.
+
+    Rows are (id, text, tier, date, scope, project_id, hits), where
+    hits counts the distinct context words that hit the lesson's candidate
+    tags. The lessons server builds the same rows from memory
+    (LessonIndex.candidates).
+    """
+    import json
+
+    words = _context_words(context)
+    if len(words) < MIN_TAG_HITS:
+        return []
+
+    pairs = [(word, form) for word in words for form in _word_forms(word)]
+    sql = f"""
+        WITH ctx(word, form) AS (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+            FROM json_each(?)
+        ),
+        tag_hits AS (
+            SELECT DISTINCT tk.tag_id, ctx.word
+            FROM ctx JOIN tag_keywords tk ON tk.keyword = ctx.form
+        ),
+        hit_tags AS (
+            SELECT tag_id FROM tag_hits
+            GROUP BY tag_id HAVING COUNT(*) >= {MIN_TAG_HITS}
+        )
+        SELECT l.id, l.text, l.tier, l.date, l.scope, l.project_id,
+               COUNT(DISTINCT th.word) AS hits
+        FROM hit_tags h
+        JOIN tags t ON t.id = h.tag_id AND t.status = 'active'
+        JOIN tag_hits th ON th.tag_id = h.tag_id
+        JOIN lesson_tags lt ON lt.tag_id = h.tag_id
+        JOIN lessons l ON l.id = lt.lesson_id
+        WHERE l.active = 1
+          AND (l.scope = 'global' OR l.project_id = ?)
+    """  # noqa: S608
+    params: list[str | None] = [json.dumps(pairs), project]
+    if exclude:
+        sql += " AND l.id NOT IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(exclude)))
+    sql += " GROUP BY l.id"
+    return conn.execute(sql, params).fetchall()
+
+
+def _surface_score(
+    tier: str, date: str, scope: str, project_id: str, hits: int,
+    *, project: str | None, today: str,
+) -> float:
+    try:
+        age_days = max((datetime.fromisoformat(today) - datetime.fromisoformat(date[:10])).days, 0)
+    except ValueError:
+        age_days = None
+    score = hits * SURFACE_HIT_WEIGHT + SURFACE_TIER_BONUS.get(tier, 0.0)
+    if age_days is not None:
+        score += SURFACE_RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    if scope == "project" and project_id == project:
+        score += SURFACE_PROJECT_BONUS
+    return score
+
+
+def _pareto(states: list[tuple[int, float, tuple[str, ...]]]) -> list[tuple[int, float, tuple[str, ...]]]:
+    """Drop states that use at least as many bytes for no more score."""
+    states.sort(key=lambda st: (st[0], -st[1]))
+    frontier: list[tuple[int, float, tuple[str, ...]]] = []
+    for st in states:
+        if not frontier or st[1] > frontier[-1][1]:
+            frontier.append(st)
+    return frontier
+
+
+def _pack(items: list[tuple[str, int, float]], budget: int, limit: int) -> tuple[str, ...]:
+    """0/1 knapsack: the ids of (id, bytes, score) items with the highest total
+    score that fit in `budget` bytes and `limit` items.
+
+    frontiers[k] holds the Pareto-optimal (bytes, score, ids) states using
+    exactly k items, so the work stays small for a few dozen candidates and
+    budgets of any size.
+    """
+    frontiers: list[list[tuple[int, float, tuple[str, ...]]]] = [[(0, 0.0, ())]]
+    for lid, size, score in items:
+        if size > budget or score <= 0:
+            continue
+        for k in range(min(len(frontiers), limit) - 1, -1, -1):
+            extended = [(b + size, s + score, ids + (lid,)) for b, s, ids in frontiers[k] if b + size <= budget]
+            if not extended:
+                continue
+            if k + 1 == len(frontiers):
+                frontiers.append([])
+            frontiers[k + 1] = _pareto(frontiers[k + 1] + extended)
+    best = max((st for frontier in frontiers for st in frontier), key=lambda st: (st[1], -st[0]))
+    return best[2]
+
+
+def select_within_budget(
+    candidates: Iterable[tuple[str, str, str, str, str, str, int]],
+    *,
+    project: str | None = None,
+    budget_bytes: int = SURFACE_BUDGET_BYTES,
+    limit: int = SURFACE_LIMIT,
+    today: str | None = None,
+    seen: SeenSet | None = None,
+) -> list[dict[str, Any]]:
+    """Score surface_candidates() rows and pick the best set that fits the budget.
+
+    Each lesson costs the UTF-8 size of its SURFACE_LINE. With a session's
+    `seen` set, lessons it already surfaced are skipped and the chosen ones
+    are marked (a lesson another hook marked in the meantime is dropped).
+    Returns the chosen lessons best-first as {"id", "text", "score", "bytes"}.
+    """
+    today = today or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    scored = {}
+    for lid, text, tier, date, scope, project_id, hits in candidates:
+        if seen is not None and lid in seen:
+            continue
+        scored[lid] = {
+            "id": lid,
+            "text": text,
+            "score": round(_surface_score(tier, date, scope, project_id, hits, project=project, today=today), 4),
+            "bytes": len(SURFACE_LINE.format(text=text).encode()),
+            "date": date,
+        }
+    # Deterministic tie-breaks: higher score, then newer, then id.
+    ranked = sorted(scored.values(), key=lambda r: r["id"])
+    ranked.sort(key=lambda r: r["date"], reverse=True)
+    ranked.sort(key=lambda r: r["score"], reverse=True)
+    chosen = set(_pack([(r["id"], r["bytes"], r["score"]) for r in ranked], budget_bytes, limit))
+    picked = [r for r in ranked if r["id"] in chosen]
+    if seen is not None:
+        picked = [r for r in picked if not seen.check_and_set(r["id"])]
+    return [{k: r[k] for k in ("id", "text", "score", "bytes")} for r in picked]
+
+
+def surface_lessons(
+    conn: sqlite3.Connection,
+    context: str,
+    *,
+    project: str | None = None,
+    exclude: list[str] | tuple[str, ...] = (),
+    budget_bytes: int = SURFACE_BUDGET_BYTES,
+    limit: int = SURFACE_LIMIT,
+    today: str | None = None,
+    seen: SeenSet | None = None,
+) -> list[dict[str, Any]]:
+    """Relevance-ranked lessons for a tool context, packed into a byte budget.
+
+    Candidates are exactly match_lessons' (same tag-hit rule, scope and
+    exclude filters); scoring, packing and the per-session `seen` set
+    (cli.lessons.seen) are select_within_budget's.
+    """
+    return select_within_budget(
+        surface_candidates(conn, context, project=project, exclude=exclude),
+        project=project, budget_bytes=budget_bytes, limit=limit, today=today, seen=seen,
+    )
+
+
+def render_surface_payload(lessons: Iterable[Mapping[str, Any]]) -> str:
+    """The text to inject: one SURFACE_LINE per lesson, in rank order."""
+    return "".join(SURFACE_LINE.format(text=lesson["text"]) for lesson in lessons)
+
+
+# ---------------------------------------------------------------------------
+# Similarity (crystallization candidates)
+# ---------------------------------------------------------------------------
+
+CLUSTER_MIN_SIMILARITY = 0.5
+DUPLICATE_THRESHOLD = 0.8
+
+
+def _store_signature(conn: sqlite3.Connection, lesson_id: str, sig: tuple[int, ...]) -> None:
+    from cli.lessons.similarity import band_buckets, pack_signature
+
+    conn.execute(
+        "INSERT OR REPLACE INTO lesson_signatures (lesson_id, kind, signature) VALUES (?, 'text', ?)",
+        (lesson_id, pack_signature(sig)),
+    )
+    conn.execute("DELETE FROM lesson_lsh WHERE lesson_id = ? AND kind = 'text'", (lesson_id,))
+    conn.executemany(
+        "INSERT INTO lesson_lsh (kind, band, bucket, lesson_id) VALUES ('text', ?, ?, ?)",
+        [(band, bucket, lesson_id) for band, bucket in enumerate(band_buckets(sig))],
+    )
+
+
+def refresh_signatures(conn: sqlite3.Connection) -> int:
+    """Hash active lessons that have no text signature yet. Returns how many."""
+    from cli.lessons.similarity import text_signature
+
+    rows = conn.execute(
+        """SELECT l.id, l.text FROM lessons l
+           LEFT JOIN lesson_signatures s ON s.lesson_id = l.id AND s.kind = 'text'
+           WHERE l.active = 1 AND s.lesson_id IS NULL"""
+    ).fetchall()
+    for lesson_id, text in rows:
+        _store_signature(conn, lesson_id, text_signature(text))
+    if rows:
+        _commit(conn)
+    return len(rows)
+
+
+def find_near_duplicates(
+    conn: sqlite3.Connection,
+    text: str,
+    *,
+    threshold: float = DUPLICATE_THRESHOLD,
+    sig: tuple[int, ...] | None = None,
+) -> list[tuple[str, str, float]]:
+    """Active lessons at least `threshold` similar to `text`, best first.
+
+    Candidates come from one indexed lesson_lsh probe per band of the text's
+    signature; only those are verified — no scan over all lessons.
+    Returns (id, text, estimated similarity).
+    """
+    from cli.lessons.similarity import band_buckets, similarity, text_signature, unpack_signature
+
+    refresh_signatures(conn)
+    sig = sig or text_signature(text)
+    probes = list(enumerate(band_buckets(sig)))
+    values = ",".join("(?, ?)" for _ in probes)
+    rows = conn.execute(
+        f"""SELECT l.id, l.text, s.signature FROM lessons l
+            JOIN lesson_signatures s ON s.lesson_id = l.id AND s.kind = 'text'
+            WHERE l.active = 1 AND l.id IN (
+                SELECT lesson_id FROM lesson_lsh
+                WHERE kind = 'text' AND (band, bucket) IN (VALUES {values})
+            )""",
+        [v for probe in probes for v in probe],
+    ).fetchall()
+    scored = [(lid, ltext, similarity(sig, unpack_signature(blob))) for lid, ltext, blob in rows]
+    return sorted(
+        (row for row in scored if row[2] >= threshold), key=lambda row: (-row[2], row[0]),
+    )
+
+
+def find_duplicate_pairs(
+    conn: sqlite3.Connection, *, threshold: float = DUPLICATE_THRESHOLD,
+) -> list[tuple[str, str, float]]:
+    """All active lesson pairs at least `threshold` similar, best first.
+
+    Only pairs colliding in some LSH band are compared, so the pass is
+    near-linear in the number of lessons. Returns (id1, id2, similarity)
+    with id1 < id2.
+    """
+    import json
+
+    from cli.lessons.similarity import similarity
+
+    refresh_signatures(conn)
+    buckets = [
+        json.loads(ids) for (ids,) in conn.execute(
+            """SELECT json_group_array(b.lesson_id) FROM lesson_lsh b
+               JOIN lessons l ON l.id = b.lesson_id
+               WHERE b.kind = 'text' AND l.active = 1
+               GROUP BY b.band, b.bucket HAVING COUNT(*) > 1"""
+        )
+    ]
+    if not buckets:
+        return []
+    sigs = _text_signatures(conn, {lid for ids in buckets for lid in ids})
+    pairs: dict[tuple[str, str], float] = {}
+    for ids in buckets:
+        for a, b in combinations(sorted(ids), 2):
+            if (a, b) not in pairs:
+                pairs[(a, b)] = similarity(sigs[a], sigs[b])
+    return sorted(
+        ((a, b, score) for (a, b), score in pairs.items() if score >= threshold),
+        key=lambda row: (-row[2], row[0], row[1]),
+    )
+
+
+def _text_signatures(conn: sqlite3.Connection, lesson_ids: Iterable[str]) -> dict[str, tuple[int, ...]]:
+    from cli.lessons.similarity import unpack_signature
+
+    ids = list(lesson_ids)
+    placeholders = ",".join("?" for _ in ids)
+    return {
+        lid: unpack_signature(blob)
+        for lid, blob in conn.execute(
+            f"SELECT lesson_id, signature FROM lesson_signatures WHERE kind = 'text' AND lesson_id IN ({placeholders})",
+            ids,
+        )
+    }
+
+
+def find_clusters(
+    conn: sqlite3.Connection,
+    *,
+    min_shared: int = 2,
+    min_similarity: float = CLUSTER_MIN_SIMILARITY,
+    top: int | None = None,
+) -> list[dict[str, Any]]:
+    """Group active lessons into crystallization-candidate clusters.
+
+    Two lessons are linked when they share `min_shared`+ tags or their text
+    MinHash similarity is at least `min_similarity`; clusters are the
+    connected components. Tag links come from bucketing each lesson under
+    every `min_shared`-combination of its tag ids (lessons sharing k tags
+    share a k-combination), text links from LSH band collisions — both
+    linear in the number of lessons instead of a pairwise self-join. Only
+    lessons without a stored signature are hashed, so re-running after an
+    add re-scores just that lesson.
+
+    Returns the largest `top` clusters (all if None) as
+    {"size", "shared_tags", "lessons": [{"id", "text"}]}.
+    """
+    import json
+
+    from cli.lessons.similarity import UnionFind, similarity
+
+    refresh_signatures(conn)
+    uf = UnionFind()
+
+    lesson_tags: dict[str, list[int]] = {}
+    for lesson_id, tag_id in conn.execute(
+        """SELECT lt.lesson_id, lt.tag_id FROM lesson_tags lt
+           JOIN lessons l ON l.id = lt.lesson_id
+           WHERE l.active = 1 ORDER BY lt.tag_id"""
+    ):
+        lesson_tags.setdefault(lesson_id, []).append(tag_id)
+    first_by_key: dict[tuple[int, ...], str] = {}
+    for lesson_id, tag_ids in lesson_tags.items():
+        for key in combinations(tag_ids, max(min_shared, 1)):
+            first = first_by_key.setdefault(key, lesson_id)
+            if first != lesson_id:
+                uf.union(first, lesson_id)
+
+    buckets = [
+        json.loads(ids) for (ids,) in conn.execute(
+            """SELECT json_group_array(b.lesson_id) FROM lesson_lsh b
+               JOIN lessons l ON l.id = b.lesson_id
+               WHERE b.kind = 'text' AND l.active = 1
+               GROUP BY b.band, b.bucket HAVING COUNT(*) > 1"""
+        )
+    ]
+    if buckets:
+        sigs = _text_signatures(conn, {lid for ids in buckets for lid in ids})
+        for ids in buckets:
+            # Compare against one representative per already-linked group, so a
+            # bucket of mutually similar lessons costs O(n), not O(n²).
+            reps: list[str] = []
+            for lid in ids:
+                linked = False
+                for rep in reps:
+                    if uf.find(rep) != uf.find(lid) and similarity(sigs[rep], sigs[lid]) >= min_similarity:
+                        uf.union(rep, lid)
+                        linked = True
+                if not linked:
+                    reps.append(lid)
+
+    groups = uf.groups()
+    if not groups:
+        return []
+    members = [lid for group in groups for lid in group]
+    placeholders = ",".join("?" for _ in members)
+    texts = dict(conn.execute(
+        f"SELECT id, text FROM lessons WHERE id IN ({placeholders})", members,
+    ).fetchall())
+    tag_names = dict(conn.execute("SELECT id, name FROM tags").fetchall())
+
+    clusters = []
+    for group in groups:
+        tag_freq: dict[int, int] = {}
+        for lid in group:
+            for tag_id in lesson_tags.get(lid, ()):
+                tag_freq[tag_id] = tag_freq.get(tag_id, 0) + 1
+        shared = sorted(
+            (t for t, n in tag_freq.items() if n >= 2),
+            key=lambda t: (-tag_freq[t], tag_names[t]),
+        )
+        clusters.append({
+            "size": len(group),
+            "shared_tags": [tag_names[t] for t in shared],
+            "lessons": [{"id": lid, "text": texts[lid]} for lid in sorted(group)],
+        })
+    clusters.sort(key=lambda cl: (-cl["size"], -len(cl["shared_tags"]), cl["lessons"][0]["id"]))
+    return clusters[:top] if top else clusters
+
+
 # ---------------------------------------------------------------------------
 # Migration
 # ---------------------------------------------------------------------------
@@ -346,6 +1546,8 @@ def _infer_domain_tags(text: str) -> list[str]:
 
 def cmd_migrate(args: argparse.Namespace) -> None:
     """Migrate lessons from learned.json to lessons.db."""
+    import json
+
     json_path = Path(args.json_path)
     if not json_path.exists():
         print(f"Error: {json_path} not found", file=sys.stderr)
@@ -357,84 +1559,602 @@ def cmd_migrate(args: argparse.Namespace) -> None:
         print("No lessons to migrate.")
         return
 
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    migrated = 0
     skipped = 0
     tags_created: set[str] = set()
 
-    # Seed category tags
-    for cat, (name, keywords, desc) in CATEGORY_TAG_MAP.items():
-        get_or_create_tag(conn, name, keywords=keywords, description=desc)
-        tags_created.add(name)
-
-    # Seed domain tags
-    for tag, keywords in DOMAIN_TAG_KEYWORDS.items():
-        get_or_create_tag(
-            conn, tag,
-            keywords=",".join(keywords),
-            description=f"Domain: {tag}",
+    def pending() -> Iterator[dict[str, Any]]:
+        nonlocal skipped
+        seen: set[str] = set()
+        for lesson in lessons:
+            # Skip if this lesson ID already exists (idempotent per-lesson)
+            if lesson["id"] in seen or conn.execute(
+                "SELECT 1 FROM lessons WHERE id = ?", (lesson["id"],)
+            ).fetchone():
+                skipped += 1
+                continue
+            seen.add(lesson["id"])
+
+            # Build tag list: category + recurring flag + inferred domain tags
+            tag_names: list[str] = []
+
+            # Category -> tag
+            cat = lesson.get("category", "")
+            if cat in CATEGORY_TAG_MAP:
+                tag_names.append(CATEGORY_TAG_MAP[cat][0])
+
+            # Recurring flag -> tag
+            flags = lesson.get("flags", [])
+            if "recurring" in flags:
+                if "recurring" not in tags_created:
+                    get_or_create_tag(
+                        conn, "recurring",
+                        keywords="recurring,repeat,again",
+                        description="Lesson that keeps coming up",
+                    )
+                tag_names.append("recurring")
+                tags_created.add("recurring")
+
+            # Domain tags from text
+            tag_names.extend(_infer_domain_tags(lesson["text"]))
+
+            yield {
+                "lesson_id": lesson["id"],
+                "project_id": lesson["project"],
+                "date": lesson["date"],
+                "text": lesson["text"],
+                "tag_names": list(dict.fromkeys(tag_names)),
+                "tier": lesson["tier"],
+                "active": lesson["tier"] in ("recent", "key"),
+                "branch": lesson.get("branch"),
+                "promoted": lesson.get("promoted"),
+                "archived": lesson.get("archived"),
+            }
+
+    # One transaction for the whole import (seed tags, lessons, metadata),
+    # with FTS rebuilt once at the end instead of per inserted row
+    with fts_bulk_mode(conn):
+        # Seed category tags
+        for cat, (name, keywords, desc) in CATEGORY_TAG_MAP.items():
+            get_or_create_tag(conn, name, keywords=keywords, description=desc)
+            tags_created.add(name)
+
+        # Seed domain tags
+        for tag, keywords in DOMAIN_TAG_KEYWORDS.items():
+            get_or_create_tag(
+                conn, tag,
+                keywords=",".join(keywords),
+                description=f"Domain: {tag}",
+            )
+            tags_created.add(tag)
+
+        migrated = insert_lessons_bulk(conn, pending())
+        set_metadata(conn, "last_manage_run", _now_iso())
+
+    print(f"{c['green']}Migrated {migrated} lessons{c['reset']}", end="")
+    if skipped:
+        print(f" ({skipped} skipped — already in DB)")
+    else:
+        print()
+    print(f"Tags: {', '.join(sorted(tags_created))}")
+
+
+# ---------------------------------------------------------------------------
+# Lifecycle operations (shared by subcommands and batch)
+# ---------------------------------------------------------------------------
+#
+# These raise LookupError for unknown lessons instead of printing and
+# exiting, so one process can run many of them against one connection.
+
+
+def get_lesson(conn: sqlite3.Connection, lesson_id: str) -> dict[str, Any]:
+    """Full record of one lesson (tags as a list).
+
+    Falls back to the cold archive when it is attached (attach_archive);
+    `archive` says which database the record came from.
+    """
+    row = conn.execute(
+        """SELECT l.id, l.date, l.tier, l.active, l.scope, l.project_id, l.branch,
+                  GROUP_CONCAT(t.name, ', '), l.text, l.crystallized_from,
+                  l.absorbed_into, l.promoted, l.archived, l.created_at
+           FROM lessons l
+           LEFT JOIN lesson_tags lt ON lt.lesson_id = l.id
+           LEFT JOIN tags t ON t.id = lt.tag_id
+           WHERE l.id = ?
+           GROUP BY l.id""",
+        (lesson_id,),
+    ).fetchone()
+    in_archive = False
+    if not row and _archive_attached(conn):
+        row = conn.execute(
+            f"""SELECT id, date, tier, active, scope, project_id, branch, tags, text,
+                       crystallized_from, absorbed_into, promoted, archived, created_at
+                FROM {ARCHIVE_SCHEMA}.lessons WHERE id = ?""",  # noqa: S608
+            (lesson_id,),
+        ).fetchone()
+        in_archive = True
+    if not row:
+        raise LookupError(f"Lesson not found: {lesson_id}")
+    keys = ("id", "date", "tier", "active", "scope", "project", "branch", "tags", "text",
+            "crystallized_from", "absorbed_into", "promoted", "archived", "created_at")
+    lesson = dict(zip(keys, row))
+    lesson["active"] = bool(lesson["active"])
+    lesson["tags"] = _split_tags(lesson["tags"])
+    lesson["archive"] = in_archive
+    return lesson
+
+
+def _require_lesson(conn: sqlite3.Connection, lesson_id: str) -> str:
+    row = conn.execute("SELECT text FROM lessons WHERE id = ?", (lesson_id,)).fetchone()
+    if not row:
+        raise LookupError(f"Lesson not found: {lesson_id}")
+    return row[0]
+
+
+def promote_lesson(conn: sqlite3.Connection, lesson_id: str) -> str:
+    """Move a lesson to the key tier. Returns the promoted date."""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    with transaction(conn):
+        _require_lesson(conn, lesson_id)
+        update_lesson(conn, lesson_id, tier="key", promoted=today)
+    return today
+
+
+def deactivate_lesson(conn: sqlite3.Connection, lesson_id: str) -> None:
+    """Deactivate a lesson (still searchable, no longer surfaced)."""
+    with transaction(conn):
+        _require_lesson(conn, lesson_id)
+        update_lesson(conn, lesson_id, active=0)
+
+
+def absorb_lesson(conn: sqlite3.Connection, lesson_id: str, into: str) -> str:
+    """Mark a lesson absorbed into a resource and deactivate it. Returns its text."""
+    with transaction(conn):
+        text = _require_lesson(conn, lesson_id)
+        update_lesson(conn, lesson_id, absorbed_into=into, active=0)
+    return text
+
+
+# ---------------------------------------------------------------------------
+# Archive (cold storage for the inactive long tail)
+# ---------------------------------------------------------------------------
+
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_AFTER_DAYS = 90
+
+# The archive is its own file, ATTACHed as `archive`. Tag ids belong to the
+# hot database, so an archived lesson keeps its tag names in `tags` instead
+# of lesson_tags rows. Archived lessons are never edited, only moved in.
+ARCHIVE_SQL = """
+CREATE TABLE IF NOT EXISTS archive.lessons (
+    id                  TEXT PRIMARY KEY,
+    project_id          TEXT NOT NULL,
+    date                TEXT NOT NULL,
+    tier                TEXT NOT NULL,
+    active              INTEGER NOT NULL,
+    scope               TEXT NOT NULL,
+    text                TEXT NOT NULL,
+    branch              TEXT,
+    crystallized_from   TEXT,
+    absorbed_into       TEXT,
+    promoted            TEXT,
+    archived            TEXT,
+    created_at          TEXT NOT NULL,
+    tags                TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS archive.lessons_fts USING fts5(
+    text,
+    content=lessons,
+    content_rowid=rowid,
+    tokenize="unicode61 tokenchars '-_./~'"
+);
+CREATE TRIGGER IF NOT EXISTS archive.lessons_fts_ai AFTER INSERT ON lessons BEGIN
+    INSERT INTO lessons_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS archive.lessons_fts_ad AFTER DELETE ON lessons BEGIN
+    INSERT INTO lessons_fts(lessons_fts, rowid, text)
+    VALUES('delete', old.rowid, old.text);
+END;
+"""
+
+_ARCHIVE_COLUMNS = (
+    "id", "project_id", "date", "tier", "active", "scope", "text", "branch",
+    "crystallized_from", "absorbed_into", "promoted",
+)
+
+
+def archive_path(db_path: Path) -> Path:
+    """Cold archive for a lessons DB: `<stem>-archive.db` beside it."""
+    return Path(db_path).with_name(f"{Path(db_path).stem}-archive.db")
+
+
+def _archive_attached(conn: sqlite3.Connection) -> bool:
+    return any(name == ARCHIVE_SCHEMA for _, name, _ in conn.execute("PRAGMA database_list"))
+
+
+def archived_lesson_count(conn: sqlite3.Connection) -> int:
+    """Lessons in the attached archive (0 when none is attached).
+
+    Archived lessons have left the hot tables, so lesson_stats no longer
+    counts them; health and summary report this number beside it.
+    """
+    if not _archive_attached(conn):
+        return 0
+    return conn.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.lessons").fetchone()[0]  # noqa: S608
+
+
+def attach_archive(conn: sqlite3.Connection, path: Path, *, create: bool = False) -> bool:
+    """ATTACH the archive at path as `archive` (no-op if already attached).
+
+    Returns False, attaching nothing, when the file does not exist and
+    create is False — read paths never create an empty archive. Must run
+    outside a transaction (SQLite refuses ATTACH inside one).
+    """
+    if _archive_attached(conn):
+        return True
+    if not create and not path.exists():
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (str(path),))
+    if create:
+        conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+        with transaction(conn):
+            _run_script(conn, ARCHIVE_SQL)
+    return True
+
+
+def archive_lessons(
+    conn: sqlite3.Connection,
+    path: Path,
+    *,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    today: str | None = None,
+    dry_run: bool = False,
+) -> list[str]:
+    """Move inactive lessons dated more than older_than_days ago to the archive.
+
+    Returns the moved ids (or, with dry_run, the ids that would move). Under
+    WAL a commit spanning two database files is atomic per file, not across
+    both, so the move is two transactions: the archive copy is committed
+    first, then only hot rows whose id is now in archive.lessons are
+    deleted. Their FTS entries, tag links, signatures and lesson_stats
+    counts go with them through the usual triggers and cascades. A crash in
+    between leaves a lesson in both places, never in neither; the next run
+    re-copies it (replacing the archived copy) and deletes it, and
+    `search --all` prefers the hot row meanwhile.
+    """
+    import json
+
+    today = today or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    cutoff = datetime.fromisoformat(today).toordinal() - older_than_days
+    cutoff_date = datetime.fromordinal(cutoff).strftime("%Y-%m-%d")
+    where = "active = 0 AND date < ?"
+    select_ids = f"SELECT id FROM main.lessons WHERE {where} ORDER BY date, id"  # noqa: S608
+    if dry_run:
+        return [lid for (lid,) in conn.execute(select_ids, (cutoff_date,))]
+
+    attach_archive(conn, path, create=True)
+    cols = ", ".join(_ARCHIVE_COLUMNS)
+    with transaction(conn):
+        ids = [lid for (lid,) in conn.execute(select_ids, (cutoff_date,))]
+        if not ids:
+            return []
+        batch = json.dumps(ids)
+        conn.execute(
+            f"DELETE FROM {ARCHIVE_SCHEMA}.lessons WHERE id IN (SELECT value FROM json_each(?))",  # noqa: S608
+            (batch,),
+        )
+        conn.execute(
+            f"""INSERT INTO {ARCHIVE_SCHEMA}.lessons ({cols}, archived, created_at, tags)
+                SELECT {", ".join(f"l.{c}" for c in _ARCHIVE_COLUMNS)},
+                       COALESCE(l.archived, ?), l.created_at,
+                       (SELECT GROUP_CONCAT(t.name, ', ') FROM main.lesson_tags lt
+                        JOIN main.tags t ON t.id = lt.tag_id WHERE lt.lesson_id = l.id)
+                FROM main.lessons l WHERE l.id IN (SELECT value FROM json_each(?))""",  # noqa: S608
+            (today, batch),
         )
-        tags_created.add(tag)
+    with transaction(conn):
+        moved = {lid for (lid,) in conn.execute(
+            f"""DELETE FROM main.lessons WHERE {where}
+                AND id IN (SELECT value FROM json_each(?))
+                AND id IN (SELECT id FROM {ARCHIVE_SCHEMA}.lessons)
+                RETURNING id""",  # noqa: S608
+            (cutoff_date, batch),
+        )}
+        conn.execute("INSERT INTO main.lessons_fts(lessons_fts) VALUES ('optimize')")
+    return [lid for lid in ids if lid in moved]
 
-    for lesson in lessons:
-        # Build tag list: category + recurring flag + inferred domain tags
-        tag_names: list[str] = []
 
-        # Category -> tag
-        cat = lesson.get("category", "")
-        if cat in CATEGORY_TAG_MAP:
-            tag_names.append(CATEGORY_TAG_MAP[cat][0])
+# ---------------------------------------------------------------------------
+# Export / import (NDJSON)
+# ---------------------------------------------------------------------------
 
-        # Recurring flag -> tag
-        flags = lesson.get("flags", [])
-        if "recurring" in flags:
-            get_or_create_tag(
-                conn, "recurring",
-                keywords="recurring,repeat,again",
-                description="Lesson that keeps coming up",
-            )
-            tag_names.append("recurring")
-            tags_created.add("recurring")
+EXPORT_FORMAT = "claude-toolkit-lessons"
+EXPORT_VERSION = 1
+
+
+_LESSON_RECORD_KEYS = (
+    "id", "project", "date", "tier", "active", "scope", "text", "branch", "crystallized_from",
+    "absorbed_into", "promoted", "archived", "created_at",
+)
 
-        # Domain tags from text
-        tag_names.extend(_infer_domain_tags(lesson["text"]))
 
-        # Deduplicate
-        tag_names = list(dict.fromkeys(tag_names))
+def export_records(conn: sqlite3.Connection) -> Iterator[dict[str, Any]]:
+    """The whole database as NDJSON-ready records, streamed off cursors.
 
-        active = lesson["tier"] in ("recent", "key")
+    A header first, then tags, lessons (with their tag names) and metadata —
+    the order import_records relies on. When the cold archive is attached
+    (attach_archive), its lessons follow the hot ones flagged
+    `"archive": true`, and the header counts them. Derived state (FTS, tag
+    counts, keyword index, signatures, lesson_stats) is not exported;
+    import rebuilds it.
+    """
+    import json
+
+    yield {"kind": "header", "format": EXPORT_FORMAT, "version": EXPORT_VERSION,
+           "schema_version": SCHEMA_VERSION, "exported_at": _now_iso(),
+           "archived": archived_lesson_count(conn)}
+    for name, status, merged_into, keywords, description, created_at in conn.execute(
+        """SELECT t.name, t.status, m.name, t.keywords, t.description, t.created_at
+           FROM tags t LEFT JOIN tags m ON m.id = t.merged_into_id ORDER BY t.id"""
+    ):
+        yield {"kind": "tag", "name": name, "status": status, "merged_into": merged_into,
+               "keywords": keywords, "description": description, "created_at": created_at}
+    for *row, tags in conn.execute(
+        """SELECT l.id, l.project_id, l.date, l.tier, l.active, l.scope, l.text, l.branch,
+                  l.crystallized_from, l.absorbed_into, l.promoted, l.archived, l.created_at,
+                  (SELECT json_group_array(t.name) FROM lesson_tags lt
+                   JOIN tags t ON t.id = lt.tag_id WHERE lt.lesson_id = l.id)
+           FROM lessons l ORDER BY l.rowid"""
+    ):
+        lesson = dict(zip(_LESSON_RECORD_KEYS, row))
+        yield {"kind": "lesson", **lesson, "active": bool(lesson["active"]), "tags": json.loads(tags)}
+    if _archive_attached(conn):
+        for *row, tags in conn.execute(
+            f"""SELECT {", ".join(_ARCHIVE_COLUMNS)}, archived, created_at, tags
+                FROM {ARCHIVE_SCHEMA}.lessons ORDER BY rowid"""  # noqa: S608
+        ):
+            lesson = dict(zip(_LESSON_RECORD_KEYS, row))
+            yield {"kind": "lesson", **lesson, "active": bool(lesson["active"]),
+                   "tags": _split_tags(tags), "archive": True}
+    for key, value, updated_at in conn.execute("SELECT key, value, updated_at FROM metadata ORDER BY key"):
+        yield {"kind": "metadata", "key": key, "value": value, "updated_at": updated_at}
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """Parse NDJSON lazily, one record per non-blank line.
+
+    Raises ValueError naming the line for malformed JSON or a non-object.
+    """
+    import json
 
-        # Skip if this lesson ID already exists (idempotent per-lesson)
-        if conn.execute("SELECT 1 FROM lessons WHERE id = ?", (lesson["id"],)).fetchone():
-            skipped += 1
+    for n, line in enumerate(lines, start=1):
+        if not line.strip():
             continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f"line {n}: {exc}") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"line {n}: expected a JSON object")
+        yield record
 
-        insert_lesson(
-            conn,
-            lesson_id=lesson["id"],
-            project_id=lesson["project"],
-            date=lesson["date"],
-            text=lesson["text"],
-            tag_names=tag_names,
-            tier=lesson["tier"],
-            active=active,
-            branch=lesson.get("branch"),
-            promoted=lesson.get("promoted"),
-            archived=lesson.get("archived"),
+
+def import_records(
+    conn: sqlite3.Connection,
+    records: Iterable[Mapping[str, Any]],
+    *,
+    skip_existing: bool = False,
+    archive: Path | None = None,
+) -> dict[str, int]:
+    """Load export_records() output in one transaction. Returns counts.
+
+    Records are consumed as they arrive: tags and metadata are applied
+    inline, lessons flow through insert_lessons_bulk in chunks, so memory
+    stays flat however large the input. FTS, tag counts and lesson_stats
+    are rebuilt once at the end (bulk_load) instead of per row. An
+    existing lesson id raises sqlite3.IntegrityError, rolling everything
+    back, unless skip_existing. Tag merges are applied after the stream,
+    once every tag exists.
+
+    Lessons flagged `"archive": true` go to the cold archive at `archive`,
+    attached (and created) up front when the header counts any; without
+    an archive path they are rejected. As with archive_lessons, the commit
+    is atomic per database file, so a crash can commit one side only;
+    re-running with skip_existing completes it.
+    """
+    records = iter(records)
+    header = next(records, None)
+    if header is None:
+        raise ValueError(f"not a {EXPORT_FORMAT} export (empty input)")
+    if header.get("kind") != "header" or header.get("format") != EXPORT_FORMAT:
+        raise ValueError(f"not a {EXPORT_FORMAT} export (missing header)")
+    if header.get("version", 0) > EXPORT_VERSION:
+        raise ValueError(f"export version {header['version']} is newer than supported ({EXPORT_VERSION})")
+    if archive is not None and header.get("archived"):
+        attach_archive(conn, archive, create=True)
+
+    counts = {"tags": 0, "lessons": 0, "archived": 0, "skipped": 0, "metadata": 0}
+    merges: list[tuple[str, str]] = []
+    cols = ", ".join(_ARCHIVE_COLUMNS)
+
+    def lessons() -> Iterator[dict[str, Any]]:
+        for record in records:
+            kind = record.get("kind")
+            if kind == "tag":
+                tag_id = get_or_create_tag(conn, record["name"], keywords=record.get("keywords"),
+                                           description=record.get("description"))
+                conn.execute(
+                    "UPDATE tags SET status = ?, created_at = COALESCE(?, created_at) WHERE id = ?",
+                    (record.get("status", "active"), record.get("created_at"), tag_id),
+                )
+                if record.get("merged_into"):
+                    merges.append((record["name"], record["merged_into"]))
+                counts["tags"] += 1
+            elif kind == "lesson" and record.get("archive"):
+                if not _archive_attached(conn):
+                    raise ValueError(f"archived lesson {record['id']} but no archive DB to import into")
+                if skip_existing and conn.execute(
+                    f"SELECT 1 FROM {ARCHIVE_SCHEMA}.lessons WHERE id = ?", (record["id"],)  # noqa: S608
+                ).fetchone():
+                    counts["skipped"] += 1
+                    continue
+                conn.execute(
+                    f"""INSERT INTO {ARCHIVE_SCHEMA}.lessons ({cols}, archived, created_at, tags)
+                        VALUES ({", ".join("?" for _ in _ARCHIVE_COLUMNS)}, ?,
+                                COALESCE(?, datetime('now')), ?)""",  # noqa: S608
+                    (record["id"], record["project"], record["date"], record.get("tier", "recent"),
+                     int(record.get("active", False)), record.get("scope", "global"), record["text"],
+                     *(record.get(k) for k in _LESSON_RECORD_KEYS[7:]),
+                     ", ".join(record.get("tags", [])) or None),
+                )
+                counts["archived"] += 1
+            elif kind == "lesson":
+                if skip_existing and conn.execute(
+                    "SELECT 1 FROM lessons WHERE id = ?", (record["id"],)
+                ).fetchone():
+                    counts["skipped"] += 1
+                    continue
+                yield {
+                    "lesson_id": record["id"], "project_id": record["project"], "date": record["date"],
+                    "text": record["text"], "tag_names": record.get("tags", []),
+                    **{k: record[k] for k in (
+                        "tier", "active", "scope", "branch", "crystallized_from", "absorbed_into",
+                        "promoted", "archived", "created_at",
+                    ) if k in record},
+                }
+            elif kind == "metadata":
+                conn.execute(
+                    """INSERT INTO metadata (key, value, updated_at) VALUES (?, ?, COALESCE(?, datetime('now')))
+                       ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at""",
+                    (record["key"], record["value"], record.get("updated_at")),
+                )
+                counts["metadata"] += 1
+            else:
+                raise ValueError(f"unknown record kind: {kind!r}")
+
+    with bulk_load(conn):
+        counts["lessons"] = insert_lessons_bulk(conn, lessons())
+        conn.executemany(
+            "UPDATE tags SET merged_into_id = (SELECT id FROM tags WHERE name = ?) WHERE name = ?",
+            [(into, name) for name, into in merges],
         )
-        migrated += 1
+    return counts
+
+
+def _open_ndjson(path: str, mode: str) -> TextIO:
+    """path for reading or writing ("r"/"w"): "-" is stdin/stdout, *.gz is gzip."""
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    if path.endswith(".gz"):
+        import gzip
+
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+
+def _batch_get(conn: sqlite3.Connection, req: Mapping[str, Any]) -> dict[str, Any]:
+    return get_lesson(conn, req["id"])
+
+
+def _batch_promote(conn: sqlite3.Connection, req: Mapping[str, Any]) -> dict[str, Any]:
+    return {"id": req["id"], "tier": "key", "promoted": promote_lesson(conn, req["id"])}
+
+
+def _batch_deactivate(conn: sqlite3.Connection, req: Mapping[str, Any]) -> dict[str, Any]:
+    deactivate_lesson(conn, req["id"])
+    return {"id": req["id"], "active": False}
+
+
+def _batch_absorb(conn: sqlite3.Connection, req: Mapping[str, Any]) -> dict[str, Any]:
+    absorb_lesson(conn, req["id"], req["into"])
+    return {"id": req["id"], "absorbed_into": req["into"], "active": False}
+
+
+def _batch_set_meta(conn: sqlite3.Connection, req: Mapping[str, Any]) -> dict[str, Any]:
+    set_metadata(conn, req["key"], str(req["value"]))
+    return {"key": req["key"], "value": str(req["value"])}
+
+
+BATCH_OPS: dict[str, Callable[[sqlite3.Connection, Mapping[str, Any]], dict[str, Any]]] = {
+    "get": _batch_get,
+    "promote": _batch_promote,
+    "deactivate": _batch_deactivate,
+    "absorb": _batch_absorb,
+    "set-meta": _batch_set_meta,
+}
+
+
+def run_batch(
+    conn: sqlite3.Connection,
+    requests: Iterable[Mapping[str, Any] | str],
+    *,
+    savepoints: bool = False,
+) -> Iterator[dict[str, Any]]:
+    """Run lifecycle ops in one transaction, yielding one result per request.
+
+    Requests are dicts (or JSON strings) like {"op": "promote", "id": ...};
+    see BATCH_OPS. Results stream as {"i", "op", "ok", "result"|"error"}.
+    Without `savepoints` the first failure rolls back the whole batch and
+    stops; with them each op runs in its own SAVEPOINT, a failed op is rolled
+    back alone and the rest commit. The final record is
+    {"done": true, "committed", "ok", "failed"}.
+    """
+    ok = failed = 0
+    committed = False
+    try:
+        with transaction(conn):
+            for i, raw in enumerate(requests):
+                op = None
+                if savepoints:
+                    conn.execute("SAVEPOINT batch_op")
+                try:
+                    req = _parse_batch_request(raw)
+                    op = req.get("op")
+                    if not isinstance(op, str) or op not in BATCH_OPS:
+                        raise ValueError(f"unknown op: {op}")
+                    result = BATCH_OPS[op](conn, req)
+                except (LookupError, ValueError, sqlite3.IntegrityError) as exc:
+                    failed += 1
+                    # KeyError means a missing request field
+                    error = f"missing field: {exc.args[0]}" if isinstance(exc, KeyError) else str(exc)
+                    yield {"i": i, "op": op, "ok": False, "error": error}
+                    if not savepoints:
+                        raise _BatchAborted from exc
+                    conn.execute("ROLLBACK TO batch_op")
+                    conn.execute("RELEASE batch_op")
+                    continue
+                if savepoints:
+                    conn.execute("RELEASE batch_op")
+                ok += 1
+                yield {"i": i, "op": op, "ok": True, "result": result}
+        committed = True
+    except _BatchAborted:
+        pass
+    yield {"done": True, "committed": committed, "ok": ok, "failed": failed}
+
+
+def _parse_batch_request(raw: Mapping[str, Any] | str) -> Mapping[str, Any]:
+    import json
+
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"invalid JSON: {exc}") from None
+    if not isinstance(raw, Mapping):
+        raise ValueError("request must be a JSON object")
+    return raw
 
-    set_metadata(conn, "last_manage_run", _now_iso())
-    conn.close()
 
-    print(f"{c['green']}Migrated {migrated} lessons{c['reset']}", end="")
-    if skipped:
-        print(f" ({skipped} skipped — already in DB)")
-    else:
-        print()
-    print(f"Tags: {', '.join(sorted(tags_created))}")
+class _BatchAborted(Exception):
+    """First failure in a batch without savepoints — roll everything back."""
 
 
 # ---------------------------------------------------------------------------
@@ -442,23 +2162,31 @@ def cmd_migrate(args: argparse.Namespace) -> None:
 # ---------------------------------------------------------------------------
 
 
+def _output_format(args: argparse.Namespace) -> str:
+    """Requested --format; text unless a machine format was asked for."""
+    return getattr(args, "format", "text")
+
+
+def _stats_by_tier(stats: Mapping[str, int]) -> list[tuple[str, int, int]]:
+    """(tier, total, active) for tiers with lessons, from read_lesson_stats()."""
+    return [
+        (tier, stats[f"{tier}_total"], stats[f"{tier}_active"])
+        for tier in ("historical", "key", "recent") if stats[f"{tier}_total"]
+    ]
+
+
+def _split_tags(tags: str | None) -> list[str]:
+    """GROUP_CONCAT(t.name, ', ') → list of tag names."""
+    return tags.split(", ") if tags else []
+
+
 def cmd_add(args: argparse.Namespace) -> None:
     """Add a new lesson."""
-    conn = init_lessons_db(args.db_path)
-
-    # Generate ID if not provided
-    lesson_id = args.id
-    if not lesson_id:
-        project = args.project or _detect_project()
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M")
-        prefix = f"{project}_{timestamp}"
-        existing = conn.execute(
-            "SELECT COUNT(*) FROM lessons WHERE id LIKE ?",
-            (f"{prefix}%",),
-        ).fetchone()[0]
-        lesson_id = f"{prefix}_{existing + 1:03d}"
-
-    project = args.project or _detect_project()
+    from cli.lessons.similarity import text_signature
+
+    conn = get_connection(args.db_path)
+
+    project = args.project or resolve_project(args.db_path)
     date = args.date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
     branch = args.branch or _detect_branch()
     tag_names = [t.strip() for t in args.tags.split(",") if t.strip()] if args.tags else []
@@ -467,19 +2195,35 @@ def cmd_add(args: argparse.Namespace) -> None:
     inferred = _infer_domain_tags(args.text)
     tag_names = list(dict.fromkeys(tag_names + inferred))
 
-    insert_lesson(
-        conn,
-        lesson_id=lesson_id,
-        project_id=project,
-        date=date,
-        text=args.text,
-        tag_names=tag_names,
-        branch=branch,
-        scope=args.scope,
-    )
-    conn.close()
-
     c = _c()
+    sig = text_signature(args.text)
+    on_duplicate = getattr(args, "on_duplicate", "warn")
+    if on_duplicate != "ignore":
+        threshold = getattr(args, "dup_threshold", DUPLICATE_THRESHOLD)
+        dups = find_near_duplicates(conn, args.text, threshold=threshold, sig=sig)
+        if dups:
+            print(f"{c['yellow']}Near-duplicate of {len(dups)} active lesson(s):{c['reset']}", file=sys.stderr)
+            for lid, text, score in dups[:3]:
+                print(f"  {score:4.0%}  {lid}: {text[:100]}", file=sys.stderr)
+            if on_duplicate == "refuse":
+                print("Not added (--on-duplicate warn or ignore to add anyway)", file=sys.stderr)
+                sys.exit(1)
+
+    with transaction(conn):
+        # Generate ID if not provided
+        lesson_id = args.id or allocate_lesson_id(conn, project)
+        insert_lesson(
+            conn,
+            lesson_id=lesson_id,
+            project_id=project,
+            date=date,
+            text=args.text,
+            tag_names=tag_names,
+            branch=branch,
+            scope=args.scope,
+        )
+        _store_signature(conn, lesson_id, sig)
+
     print(f"{c['green']}Added:{c['reset']} {lesson_id}")
     if tag_names:
         print(f"  Tags: {', '.join(tag_names)}")
@@ -487,131 +2231,155 @@ def cmd_add(args: argparse.Namespace) -> None:
         print(f"  Scope: project ({project})")
 
 
+def _fts_query(query: str, *, prefix: bool = False) -> str:
+    """Quote each token as an FTS5 string (optionally as a prefix query)."""
+    star = "*" if prefix else ""
+    return " ".join('"' + t.replace('"', '""') + '"' + star for t in query.split() if t)
+
+
 def cmd_search(args: argparse.Namespace) -> None:
-    """Full-text search over lesson text."""
-    conn = init_lessons_db(args.db_path)
+    """Full-text search over lesson text, best BM25 match first."""
+    conn = get_connection(args.db_path)
     c = _c()
 
-    tokens = args.query.split()
-    safe_query = " ".join(
-        '"' + t.replace('"', '""') + '"' for t in tokens if t
-    )
-
-    sql = """
-        SELECT l.id, l.date, l.tier, l.active, l.project_id,
-               highlight(lessons_fts, 0, '>>>', '<<<') AS snippet
-        FROM lessons_fts
-        JOIN lessons l ON l.rowid = lessons_fts.rowid
+    safe_query = _fts_query(args.query, prefix=getattr(args, "prefix", False))
+    weights = ", ".join(str(w) for w in SEARCH_COLUMN_WEIGHTS)
+
+    def select(schema: str) -> str:
+        return f"""
+        SELECT l.id, l.date, l.tier, l.active, l.project_id, l.text,
+               snippet(lessons_fts, 0, ?, ?, '…', ?) AS snippet,
+               bm25(lessons_fts, {weights}) AS rank,
+               {int(schema == ARCHIVE_SCHEMA)} AS in_archive
+        FROM {schema}.lessons_fts
+        JOIN {schema}.lessons l ON l.rowid = lessons_fts.rowid
         WHERE lessons_fts MATCH ?
-        ORDER BY l.date DESC
-        LIMIT ?
-    """
-    rows = conn.execute(sql, (safe_query, args.limit)).fetchall()
-    conn.close()
+        """
+
+    fmt = _output_format(args)
+    marks = ("", "") if fmt != "text" else (c["bold"] or ">>>", c["reset"] or "<<<")
+    with_archive = getattr(args, "all", False)
+    sql = select("main")
+    params: list[Any] = [*marks, SNIPPET_TOKENS, safe_query]
+    if getattr(args, "active_only", False):
+        sql += " AND l.active = 1"
+    elif with_archive and attach_archive(conn, archive_path(args.db_path)):
+        # BM25 scores come from two separate indexes, so ranks across the
+        # halves are close but not exact. A lesson mid-move sits in both;
+        # the hot copy wins.
+        sql += f" UNION ALL {select(ARCHIVE_SCHEMA)} AND l.id NOT IN (SELECT id FROM main.lessons)"
+        params += [*marks, SNIPPET_TOKENS, safe_query]
+    sql += " ORDER BY rank, date DESC LIMIT ?"
+
+    cursor = conn.execute(sql, (*params, args.limit))
+    if fmt != "text":
+        write_records((
+            {"id": lid, "date": date, "tier": tier, "active": bool(active),
+             "project": project, "score": round(-rank, 4), "snippet": snippet, "text": text,
+             **({"archive": bool(in_archive)} if with_archive else {})}
+            for lid, date, tier, active, project, text, snippet, rank, in_archive in cursor
+        ), fmt)
+        return
 
-    print(f"\n{c['bold']}{c['cyan']}Search: '{args.query}' ({len(rows)} results){c['reset']}\n")
-    for lid, date, tier, active, project, snippet in rows:
+    print(f"\n{c['bold']}{c['cyan']}Search: '{args.query}'{c['reset']}\n")
+    n = 0
+    for n, (lid, date, tier, active, project, _, snippet, _, in_archive) in enumerate(cursor, start=1):
         status = f"{c['green']}active{c['reset']}" if active else f"{c['dim']}inactive{c['reset']}"
+        if in_archive:
+            status += f" {c['dim']}(archive){c['reset']}"
         print(f"  {c['dim']}{lid}{c['reset']}")
         print(f"    {c['dim']}{date}{c['reset']} [{tier}] {status} {c['yellow']}{project}{c['reset']}")
-        print(f"    {snippet[:100]}")
+        print(f"    {snippet}")
         print()
+    print(f"{c['dim']}{n} result(s){c['reset']}\n")
 
 
 def cmd_get(args: argparse.Namespace) -> None:
     """Get a single lesson by ID with full detail."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    sql = """
-        SELECT l.id, l.date, l.tier, l.active, l.scope, l.text, l.branch,
-               l.crystallized_from, l.absorbed_into, l.promoted, l.archived,
-               l.created_at, l.project_id AS project,
-               GROUP_CONCAT(t.name, ', ') AS tags
-        FROM lessons l
-        LEFT JOIN lesson_tags lt ON lt.lesson_id = l.id
-        LEFT JOIN tags t ON t.id = lt.tag_id
-        WHERE l.id = ?
-        GROUP BY l.id
-    """
-    row = conn.execute(sql, (args.id,)).fetchone()
-    conn.close()
+    try:
+        lesson = get_lesson(conn, args.id)
+    except LookupError as exc:
+        # Only a miss pays for opening the archive.
+        if _archive_attached(conn) or not attach_archive(conn, archive_path(args.db_path)):
+            print(exc.args[0], file=sys.stderr)
+            sys.exit(1)
+        try:
+            lesson = get_lesson(conn, args.id)
+        except LookupError:
+            print(exc.args[0], file=sys.stderr)
+            sys.exit(1)
 
-    if not row:
-        print(f"Lesson not found: {args.id}", file=sys.stderr)
-        sys.exit(1)
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_record(lesson, fmt)
+        return
 
-    lid, date, tier, active, scope, text, branch, crystal_from, absorbed, promoted, archived, created, project, tags = row
-    status = f"{c['green']}active{c['reset']}" if active else f"{c['dim']}inactive{c['reset']}"
+    status = f"{c['green']}active{c['reset']}" if lesson["active"] else f"{c['dim']}inactive{c['reset']}"
 
-    print(f"\n{c['bold']}{c['cyan']}Lesson: {lid}{c['reset']}\n")
-    print(f"  Date:      {date}")
-    print(f"  Tier:      {tier}")
+    print(f"\n{c['bold']}{c['cyan']}Lesson: {lesson['id']}{c['reset']}\n")
+    print(f"  Date:      {lesson['date']}")
+    print(f"  Tier:      {lesson['tier']}")
     print(f"  Status:    {status}")
-    print(f"  Scope:     {scope}")
-    print(f"  Project:   {c['yellow']}{project}{c['reset']}")
-    if branch:
-        print(f"  Branch:    {branch}")
-    if tags:
-        print(f"  Tags:      {tags}")
-    if promoted:
-        print(f"  Promoted:  {promoted}")
-    if archived:
-        print(f"  Archived:  {archived}")
-    if crystal_from:
-        print(f"  Crystallized from: {crystal_from}")
-    if absorbed:
-        print(f"  Absorbed into:     {absorbed}")
-    print(f"  Created:   {c['dim']}{created}{c['reset']}")
-    print(f"\n  {text}\n")
+    print(f"  Scope:     {lesson['scope']}")
+    print(f"  Project:   {c['yellow']}{lesson['project']}{c['reset']}")
+    if lesson["branch"]:
+        print(f"  Branch:    {lesson['branch']}")
+    if lesson["tags"]:
+        print(f"  Tags:      {', '.join(lesson['tags'])}")
+    if lesson["promoted"]:
+        print(f"  Promoted:  {lesson['promoted']}")
+    if lesson["archived"]:
+        where = f" {c['dim']}(in {archive_path(args.db_path).name}){c['reset']}" if lesson["archive"] else ""
+        print(f"  Archived:  {lesson['archived']}{where}")
+    if lesson["crystallized_from"]:
+        print(f"  Crystallized from: {lesson['crystallized_from']}")
+    if lesson["absorbed_into"]:
+        print(f"  Absorbed into:     {lesson['absorbed_into']}")
+    print(f"  Created:   {c['dim']}{lesson['created_at']}{c['reset']}")
+    print(f"\n  {lesson['text']}\n")
 
 
 def cmd_list(args: argparse.Namespace) -> None:
-    """List lessons with filters."""
-    conn = init_lessons_db(args.db_path)
+    """List lessons with filters (see plan_list_query for how they are planned)."""
+    conn = get_connection(args.db_path)
     c = _c()
 
-    sql = """
-        SELECT l.id, l.date, l.tier, l.active, l.text, l.project_id,
-               GROUP_CONCAT(t.name, ', ') AS tags, l.scope
-        FROM lessons l
-        LEFT JOIN lesson_tags lt ON lt.lesson_id = l.id
-        LEFT JOIN tags t ON t.id = lt.tag_id
-        WHERE 1=1
-    """
-    params: list = []
-
-    if args.tier:
-        sql += " AND l.tier = ?"
-        params.append(args.tier)
-    if args.active:
-        sql += " AND l.active = 1"
-    if args.project:
-        sql += " AND l.project_id LIKE ?"
-        params.append(f"%{args.project}%")
-    if args.tags:
-        filter_tags = [t.strip() for t in args.tags.split(",")]
-        placeholders = ",".join("?" for _ in filter_tags)
-        sql += f"""
-            AND l.id IN (
-                SELECT lt2.lesson_id FROM lesson_tags lt2
-                JOIN tags t2 ON t2.id = lt2.tag_id
-                WHERE t2.name IN ({placeholders})
-            )
-        """
-        params.extend(filter_tags)
-    if args.scope:
-        sql += " AND l.scope = ?"
-        params.append(args.scope)
-
-    sql += " GROUP BY l.id ORDER BY l.date DESC LIMIT ?"
-    params.append(args.limit)
+    sql, params = plan_list_query(
+        conn,
+        tier=args.tier,
+        active=args.active,
+        tags=args.tags.split(",") if args.tags else (),
+        tag_mode="all" if getattr(args, "all_tags", False) else "any",
+        project=args.project,
+        project_like=getattr(args, "project_like", False),
+        scope=args.scope,
+        limit=args.limit,
+    )
+    fmt = _output_format(args)
+    if getattr(args, "explain", False):
+        plan = explain_query_plan(conn, sql, params)
+        if fmt != "text":
+            write_records(plan, fmt)
+            return
+        for step in plan:
+            print(f"{'  ' * step['depth']}{step['detail']}")
+        return
 
-    rows = conn.execute(sql, params).fetchall()
-    conn.close()
+    cursor = conn.execute(sql, params)
+    if fmt != "text":
+        write_records((
+            {"id": lid, "date": date, "tier": tier, "active": bool(active), "scope": scope,
+             "project": project, "tags": _split_tags(tags), "text": text}
+            for lid, date, tier, active, text, project, tags, scope in cursor
+        ), fmt)
+        return
 
-    print(f"\n{c['bold']}{len(rows)} lesson(s){c['reset']}\n")
-    for lid, date, tier, active, text, project, tags, scope in rows:
+    print()
+    n = 0
+    for n, (lid, date, tier, active, text, project, tags, scope) in enumerate(cursor, start=1):
         active_mark = "" if active else f" {c['dim']}(inactive){c['reset']}"
         scope_mark = "[P]" if scope == "project" else ""
         tag_str = f" {c['dim']}[{tags}]{c['reset']}" if tags else ""
@@ -619,49 +2387,64 @@ def cmd_list(args: argparse.Namespace) -> None:
         print(f"    {c['dim']}{date}{c['reset']} [{tier}]{scope_mark}{active_mark}{tag_str}")
         print(f"    {text[:120]}")
         print()
+    print(f"{c['bold']}{n} lesson(s){c['reset']}\n")
 
 
 def cmd_summary(args: argparse.Namespace) -> None:
     """Show summary counts."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    total = conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0]
-    active = conn.execute("SELECT COUNT(*) FROM lessons WHERE active = 1").fetchone()[0]
+    if getattr(args, "recompute", False):
+        recompute_lesson_stats(conn)
+    stats = read_lesson_stats(conn)
+    total, active = stats["total"], stats["active"]
+    by_tier = _stats_by_tier(stats)
+    attach_archive(conn, archive_path(args.db_path))
+    archived = archived_lesson_count(conn)
+    by_tag = conn.execute(
+        """SELECT t.name, t.lesson_count
+           FROM tags t WHERE t.status = 'active' AND t.lesson_count > 0
+           ORDER BY t.lesson_count DESC"""
+    ).fetchall()
+    last_manage = get_metadata(conn, "last_manage_run")
+
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_record({
+            "total": total, "active": active, "inactive": total - active, "archived": archived,
+            "by_tier": [{"tier": t, "total": n, "active": a} for t, n, a in by_tier],
+            "by_tag": [{"tag": name, "active": n} for name, n in by_tag],
+            "last_manage_run": last_manage,
+        }, fmt)
+        return
 
     print(f"\n{c['bold']}Lessons Summary{c['reset']}\n")
     print(f"  Total: {total}  Active: {active}  Inactive: {total - active}")
+    if archived:
+        print(f"  Archived: {archived} {c['dim']}(not in Total; {archive_path(args.db_path).name}){c['reset']}")
 
     # By tier
     print(f"\n  {c['bold']}By tier:{c['reset']}")
-    for row in conn.execute(
-        "SELECT tier, COUNT(*), SUM(active) FROM lessons GROUP BY tier ORDER BY tier"
-    ).fetchall():
+    for row in by_tier:
         print(f"    {row[0]:12} {row[1]:3} total, {row[2]:3} active")
 
     # By tag (active lessons only)
     print(f"\n  {c['bold']}By tag (active lessons):{c['reset']}")
-    for row in conn.execute(
-        """SELECT t.name, t.lesson_count
-           FROM tags t WHERE t.status = 'active' AND t.lesson_count > 0
-           ORDER BY t.lesson_count DESC"""
-    ).fetchall():
+    for row in by_tag:
         print(f"    {row[0]:20} {row[1]:3}")
 
     # Metadata
-    last_manage = get_metadata(conn, "last_manage_run")
     if last_manage:
         print(f"\n  Last manage-lessons run: {last_manage}")
 
-    conn.close()
     print()
 
 
 def cmd_set_meta(args: argparse.Namespace) -> None:
     """Set a metadata key-value pair."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     set_metadata(conn, args.key, args.value)
-    conn.close()
     print(f"Set {args.key} = {args.value}")
 
 
@@ -672,20 +2455,29 @@ def cmd_set_meta(args: argparse.Namespace) -> None:
 
 def cmd_tags(args: argparse.Namespace) -> None:
     """Show tag registry with counts and status."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    rows = conn.execute(
+    cursor = conn.execute(
         """SELECT t.name, t.status, t.lesson_count, t.keywords, t.description,
                   m.name AS merged_into
            FROM tags t
            LEFT JOIN tags m ON t.merged_into_id = m.id
            ORDER BY t.lesson_count DESC, t.name"""
-    ).fetchall()
-    conn.close()
+    )
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_records((
+            {"name": name, "status": status, "lesson_count": count,
+             "keywords": [k.strip() for k in keywords.split(",") if k.strip()] if keywords else [],
+             "description": desc, "merged_into": merged_into}
+            for name, status, count, keywords, desc, merged_into in cursor
+        ), fmt)
+        return
 
-    print(f"\n{c['bold']}Tag Registry ({len(rows)} tags){c['reset']}\n")
-    for name, status, count, keywords, desc, merged_into in rows:
+    print(f"\n{c['bold']}Tag Registry{c['reset']}\n")
+    n = 0
+    for n, (name, status, count, keywords, desc, merged_into) in enumerate(cursor, start=1):
         status_fmt = (
             f"{c['green']}{status}{c['reset']}" if status == "active"
             else f"{c['dim']}{status}{c['reset']}"
@@ -695,47 +2487,69 @@ def cmd_tags(args: argparse.Namespace) -> None:
         print(f"  {name:20} {count:3} lessons  {status_fmt}{merged_note}{kw}")
         if desc:
             print(f"  {' ':20} {c['dim']}{desc}{c['reset']}")
-    print()
+    print(f"\n{c['dim']}{n} tag(s){c['reset']}\n")
 
 
 def cmd_clusters(args: argparse.Namespace) -> None:
-    """Find lessons sharing 2+ tags — crystallization candidates."""
-    conn = init_lessons_db(args.db_path)
+    """Group lessons sharing tags or near-identical text — crystallization candidates."""
+    conn = get_connection(args.db_path)
     c = _c()
 
-    # Find pairs of active lessons sharing tags
-    rows = conn.execute(
-        """SELECT l1.id, l1.text, l2.id, l2.text,
-                  GROUP_CONCAT(DISTINCT t.name) AS shared_tags,
-                  COUNT(DISTINCT t.id) AS shared_count
-           FROM lesson_tags lt1
-           JOIN lesson_tags lt2 ON lt1.tag_id = lt2.tag_id AND lt1.lesson_id < lt2.lesson_id
-           JOIN lessons l1 ON l1.id = lt1.lesson_id
-           JOIN lessons l2 ON l2.id = lt2.lesson_id
-           JOIN tags t ON t.id = lt1.tag_id
-           WHERE l1.active = 1 AND l2.active = 1
-           GROUP BY l1.id, l2.id
-           HAVING shared_count >= ?
-           ORDER BY shared_count DESC""",
-        (args.min_shared,),
-    ).fetchall()
-    conn.close()
+    clusters = find_clusters(conn, min_shared=args.min_shared, top=args.top)
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_records(clusters, fmt)
+        return
 
-    if not rows:
+    if not clusters:
         print(f"\n{c['dim']}No clusters found (min shared tags: {args.min_shared}){c['reset']}\n")
         return
 
-    print(f"\n{c['bold']}Crystallization Candidates ({len(rows)} pairs){c['reset']}\n")
-    for id1, text1, id2, text2, shared_tags, shared_count in rows:
-        print(f"  {c['yellow']}Shared tags ({shared_count}): {shared_tags}{c['reset']}")
-        print(f"    {c['dim']}{id1}{c['reset']}: {text1[:100]}")
-        print(f"    {c['dim']}{id2}{c['reset']}: {text2[:100]}")
+    print(f"\n{c['bold']}Crystallization Candidates{c['reset']}\n")
+    for n, cluster in enumerate(clusters, start=1):
+        shared = ", ".join(cluster["shared_tags"]) or "similar text"
+        print(f"  {c['yellow']}Cluster {n} ({cluster['size']} lessons) — {shared}{c['reset']}")
+        for lesson in cluster["lessons"]:
+            print(f"    {c['dim']}{lesson['id']}{c['reset']}: {lesson['text'][:100]}")
+        print()
+    print(f"{c['dim']}{len(clusters)} cluster(s){c['reset']}\n")
+
+
+def cmd_dedupe(args: argparse.Namespace) -> None:
+    """Report near-duplicate active lesson pairs (text similarity)."""
+    conn = get_connection(args.db_path)
+    c = _c()
+
+    pairs = find_duplicate_pairs(conn, threshold=args.threshold)
+    texts = {}
+    if pairs:
+        ids = sorted({lid for a, b, _ in pairs for lid in (a, b)})
+        placeholders = ",".join("?" for _ in ids)
+        texts = dict(conn.execute(f"SELECT id, text FROM lessons WHERE id IN ({placeholders})", ids))
+
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_records((
+            {"similarity": round(score, 3), "id1": a, "text1": texts[a], "id2": b, "text2": texts[b]}
+            for a, b, score in pairs
+        ), fmt)
+        return
+
+    if not pairs:
+        print(f"\n{c['dim']}No near-duplicates (threshold: {args.threshold}){c['reset']}\n")
+        return
+    print(f"\n{c['bold']}Near-duplicate lessons{c['reset']}\n")
+    for a, b, score in pairs:
+        print(f"  {c['yellow']}{score:.0%} similar{c['reset']}")
+        print(f"    {c['dim']}{a}{c['reset']}: {texts[a][:100]}")
+        print(f"    {c['dim']}{b}{c['reset']}: {texts[b][:100]}")
         print()
+    print(f"{c['dim']}{len(pairs)} pair(s) — crystallize or deactivate one side{c['reset']}\n")
 
 
 def cmd_crystallize(args: argparse.Namespace) -> None:
     """Crystallize multiple lessons into one, deactivating the sources."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
     source_ids = [s.strip() for s in args.ids.split(",")]
@@ -772,34 +2586,27 @@ def cmd_crystallize(args: argparse.Namespace) -> None:
     inferred = _infer_domain_tags(args.text)
     tag_names = list(dict.fromkeys(tag_names + inferred))
 
-    # Generate ID
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M")
-    prefix = f"{project_id}_{timestamp}"
-    existing = conn.execute(
-        "SELECT COUNT(*) FROM lessons WHERE id LIKE ?", (f"{prefix}%",)
-    ).fetchone()[0]
-    new_id = f"{prefix}_{existing + 1:03d}"
-
-    # Insert crystallized lesson
-    insert_lesson(
-        conn,
-        lesson_id=new_id,
-        project_id=project_id,
-        date=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-        text=args.text,
-        tag_names=tag_names,
-        tier="key",
-        branch=_detect_branch(),
-        crystallized_from=",".join(source_ids),
-        promoted=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-        scope=crystallized_scope,
-    )
-
-    # Deactivate sources
-    for sid in source_ids:
-        update_lesson(conn, sid, active=0)
+    branch = _detect_branch()
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
-    conn.close()
+    # Insert crystallized lesson and deactivate sources as one unit
+    with transaction(conn):
+        new_id = allocate_lesson_id(conn, project_id)
+        insert_lesson(
+            conn,
+            lesson_id=new_id,
+            project_id=project_id,
+            date=today,
+            text=args.text,
+            tag_names=tag_names,
+            tier="key",
+            branch=branch,
+            crystallized_from=",".join(source_ids),
+            promoted=today,
+            scope=crystallized_scope,
+        )
+        for sid in source_ids:
+            update_lesson(conn, sid, active=0)
 
     print(f"{c['green']}Crystallized:{c['reset']} {new_id}")
     print(f"  From: {', '.join(source_ids)}")
@@ -809,58 +2616,71 @@ def cmd_crystallize(args: argparse.Namespace) -> None:
 
 def cmd_promote(args: argparse.Namespace) -> None:
     """Promote a lesson to key tier."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    row = conn.execute("SELECT text FROM lessons WHERE id = ?", (args.id,)).fetchone()
-    if not row:
-        print(f"Lesson not found: {args.id}", file=sys.stderr)
+    try:
+        today = promote_lesson(conn, args.id)
+    except LookupError as exc:
+        print(exc.args[0], file=sys.stderr)
         sys.exit(1)
 
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    update_lesson(conn, args.id, tier="key", promoted=today)
-    conn.close()
-
     print(f"{c['green']}Promoted:{c['reset']} {args.id} → key (promoted={today})")
 
 
 def cmd_deactivate(args: argparse.Namespace) -> None:
     """Deactivate a lesson (searchable but not surfaced)."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    row = conn.execute("SELECT text FROM lessons WHERE id = ?", (args.id,)).fetchone()
-    if not row:
-        print(f"Lesson not found: {args.id}", file=sys.stderr)
+    try:
+        deactivate_lesson(conn, args.id)
+    except LookupError as exc:
+        print(exc.args[0], file=sys.stderr)
         sys.exit(1)
 
-    update_lesson(conn, args.id, active=0)
-    conn.close()
-
     print(f"{c['green']}Deactivated:{c['reset']} {args.id}")
 
 
 def cmd_absorb(args: argparse.Namespace) -> None:
     """Mark a lesson as absorbed into a resource, deactivating it."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
-    row = conn.execute("SELECT text, active FROM lessons WHERE id = ?", (args.id,)).fetchone()
-    if not row:
-        print(f"Lesson not found: {args.id}", file=sys.stderr)
+    try:
+        text = absorb_lesson(conn, args.id, args.into)
+    except LookupError as exc:
+        print(exc.args[0], file=sys.stderr)
         sys.exit(1)
 
-    update_lesson(conn, args.id, absorbed_into=args.into, active=0)
-    conn.close()
-
     print(f"{c['green']}Absorbed:{c['reset']} {args.id}")
     print(f"  Into: {args.into}")
-    print(f"  Text: {row[0][:100]}")
+    print(f"  Text: {text[:100]}")
+
+
+def cmd_batch(args: argparse.Namespace) -> None:
+    """Run JSONL lifecycle ops from stdin in one transaction, streaming JSONL results.
+
+    Exits 1 when the batch was rolled back; with --savepoints, failed ops
+    are reported in the stream and the rest still commit.
+    """
+    import json
+
+    conn = get_connection(args.db_path)
+    requests = (line for line in sys.stdin if line.strip())
+    committed = True
+    for result in run_batch(conn, requests, savepoints=args.savepoints):
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+        if result.get("done"):
+            committed = result["committed"]
+    if not committed:
+        sys.exit(1)
 
 
 def cmd_tag_hygiene(args: argparse.Namespace) -> None:
     """Report tag quality issues: orphaned, near-duplicates, keyword gaps."""
-    conn = init_lessons_db(args.db_path)
+    conn = get_connection(args.db_path)
     c = _c()
 
     issues: list[str] = []
@@ -901,7 +2721,11 @@ def cmd_tag_hygiene(args: argparse.Namespace) -> None:
         for name, count in deprecated_used:
             issues.append(f"Deprecated tag '{name}' still on {count} active lesson(s)")
 
-    conn.close()
+    # Materialized health/summary counters out of step with the tables
+    drift = lesson_stats_drift(conn)
+    if drift:
+        cols = ", ".join(f"{col} {stored} → {actual}" for col, stored, actual in drift)
+        issues.append(f"lesson_stats drift ({cols}) — run `lessons health --recompute`")
 
     print(f"\n{c['bold']}Tag Hygiene Report{c['reset']}\n")
     if issues:
@@ -912,49 +2736,122 @@ def cmd_tag_hygiene(args: argparse.Namespace) -> None:
     print()
 
 
-def cmd_health(args: argparse.Namespace) -> None:
-    """Overall health report for the lessons system."""
-    conn = init_lessons_db(args.db_path)
+def cmd_reindex_counts(args: argparse.Namespace) -> None:
+    """Recompute tag lesson_counts and the tag_keywords index (repair path)."""
+    conn = get_connection(args.db_path)
     c = _c()
 
-    total = conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0]
-    active = conn.execute("SELECT COUNT(*) FROM lessons WHERE active = 1").fetchone()[0]
-    by_tier = conn.execute(
-        "SELECT tier, COUNT(*), SUM(active) FROM lessons GROUP BY tier ORDER BY tier"
+    drift = conn.execute(
+        """SELECT t.name, t.lesson_count, (
+               SELECT COUNT(*) FROM lesson_tags lt
+               JOIN lessons l ON lt.lesson_id = l.id
+               WHERE lt.tag_id = t.id AND l.active = 1
+           ) AS actual
+           FROM tags t
+           WHERE t.lesson_count != actual
+           ORDER BY t.name"""
     ).fetchall()
-    tag_count = conn.execute("SELECT COUNT(*) FROM tags WHERE status = 'active'").fetchone()[0]
-    absorbed = conn.execute(
-        "SELECT COUNT(*) FROM lessons WHERE absorbed_into IS NOT NULL"
-    ).fetchone()[0]
-    crystallized = conn.execute(
-        "SELECT COUNT(*) FROM lessons WHERE crystallized_from IS NOT NULL"
-    ).fetchone()[0]
+    with transaction(conn):
+        _refresh_tag_counts(conn)
+        rebuild_keyword_index(conn)
 
-    last_manage = get_metadata(conn, "last_manage_run")
-    threshold = get_metadata(conn, "nudge_threshold_days") or "7"
+    if not drift:
+        print(f"{c['green']}Tag counts consistent{c['reset']}")
+        return
+    print(f"{c['green']}Reindexed {len(drift)} tag count(s):{c['reset']}")
+    for name, stored, actual in drift:
+        print(f"  {name:20} {stored:3} → {actual}")
 
-    print(f"\n{c['bold']}Lessons Health Report{c['reset']}\n")
-    print(f"  Total: {total}  Active: {active}  Inactive: {total - active}")
-    print(f"  Absorbed: {absorbed}  Crystallized: {crystallized}")
-    print(f"  Active tags: {tag_count}")
 
-    print(f"\n  {c['bold']}By tier:{c['reset']}")
-    for tier, count, active_count in by_tier:
-        print(f"    {tier:12} {count:3} total, {int(active_count or 0):3} active")
+def cmd_archive(args: argparse.Namespace) -> None:
+    """Move old inactive lessons to the cold archive DB."""
+    conn = get_connection(args.db_path)
+    c = _c()
 
-    # Top tags
+    path = archive_path(args.db_path)
+    ids = archive_lessons(conn, path, older_than_days=args.older_than, dry_run=args.dry_run)
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_record({"archived": len(ids), "dry_run": args.dry_run, "path": str(path), "ids": ids}, fmt)
+        return
+
+    if not ids:
+        print(f"{c['dim']}No inactive lessons older than {args.older_than} days{c['reset']}")
+        return
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"{c['green']}{verb} {len(ids)} lesson(s) → {path}{c['reset']}")
+    for lid in ids:
+        print(f"  {c['dim']}{lid}{c['reset']}")
+
+
+def cmd_export(args: argparse.Namespace) -> None:
+    """Stream the whole lessons DB, archive included, as NDJSON (gzip when the path ends in .gz)."""
+    conn = get_connection(args.db_path)
+    attach_archive(conn, archive_path(args.db_path))
+
+    out = _open_ndjson(args.output, "w")
+    try:
+        n = write_records(export_records(conn), "jsonl", out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.output != "-":
+        c = _c()
+        print(f"{c['green']}Exported {n - 1} record(s) → {args.output}{c['reset']}")
+
+
+def cmd_import(args: argparse.Namespace) -> None:
+    """Restore an `export` NDJSON stream in one transaction."""
+    conn = get_connection(args.db_path)
+    c = _c()
+
+    try:
+        src = _open_ndjson(args.path, "r")
+    except OSError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        counts = import_records(conn, read_ndjson(src), skip_existing=args.skip_existing,
+                                archive=archive_path(args.db_path))
+    except (ValueError, KeyError, sqlite3.IntegrityError) as exc:
+        print(f"Error: import failed, nothing written: {exc}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_record(counts, fmt)
+        return
+    archived = f" + {counts['archived']} archived" if counts["archived"] else ""
+    print(f"{c['green']}Imported {counts['lessons']} lesson(s){archived}, {counts['tags']} tag(s), "
+          f"{counts['metadata']} metadata key(s){c['reset']}", end="")
+    print(f" ({counts['skipped']} skipped — already in DB)" if counts["skipped"] else "")
+
+
+def cmd_health(args: argparse.Namespace) -> None:
+    """Overall health report for the lessons system."""
+    conn = get_connection(args.db_path)
+    c = _c()
+
+    if getattr(args, "recompute", False):
+        recompute_lesson_stats(conn)
+    stats = read_lesson_stats(conn)
+    total, active = stats["total"], stats["active"]
+    by_tier = _stats_by_tier(stats)
+    tag_count = stats["active_tags"]
+    absorbed, crystallized = stats["absorbed"], stats["crystallized"]
+    attach_archive(conn, archive_path(args.db_path))
+    archived = archived_lesson_count(conn)
     top_tags = conn.execute(
         """SELECT t.name, t.lesson_count FROM tags t
            WHERE t.status = 'active' AND t.lesson_count > 0
            ORDER BY t.lesson_count DESC LIMIT 5"""
     ).fetchall()
-    if top_tags:
-        print(f"\n  {c['bold']}Top tags:{c['reset']}")
-        for name, count in top_tags:
-            print(f"    {name:20} {count:3}")
 
-    print(f"\n  Last manage-lessons: {last_manage or 'never'}")
-    print(f"  Nudge threshold: {threshold} days")
+    last_manage = get_metadata(conn, "last_manage_run")
+    threshold = get_metadata(conn, "nudge_threshold_days") or "7"
 
     # Health warnings
     warnings: list[str] = []
@@ -970,21 +2867,48 @@ def cmd_health(args: argparse.Namespace) -> None:
         except ValueError:
             pass
 
-    orphaned = conn.execute(
-        "SELECT COUNT(*) FROM tags WHERE status = 'active' AND lesson_count = 0"
-    ).fetchone()[0]
+    orphaned = stats["orphaned_tags"]
     if orphaned:
         warnings.append(f"{orphaned} orphaned tag(s)")
 
-    hist_active = conn.execute(
-        "SELECT COUNT(*) FROM lessons WHERE tier = 'historical' AND active = 1"
-    ).fetchone()[0]
+    hist_active = stats["historical_active"]
     if hist_active:
         warnings.append(
             f"{hist_active} historical lesson(s) still active — deactivate or change tier"
         )
 
-    conn.close()
+    fmt = _output_format(args)
+    if fmt != "text":
+        write_record({
+            "total": total, "active": active, "inactive": total - active, "archived": archived,
+            "absorbed": absorbed, "crystallized": crystallized, "active_tags": tag_count,
+            "by_tier": [{"tier": t, "total": n, "active": a} for t, n, a in by_tier],
+            "top_tags": [{"tag": name, "active": n} for name, n in top_tags],
+            "last_manage_run": last_manage,
+            "nudge_threshold_days": int(threshold) if threshold.isdigit() else threshold,
+            "warnings": warnings,
+        }, fmt)
+        return
+
+    print(f"\n{c['bold']}Lessons Health Report{c['reset']}\n")
+    print(f"  Total: {total}  Active: {active}  Inactive: {total - active}")
+    if archived:
+        print(f"  Archived: {archived} {c['dim']}(not in Total; {archive_path(args.db_path).name}){c['reset']}")
+    print(f"  Absorbed: {absorbed}  Crystallized: {crystallized}")
+    print(f"  Active tags: {tag_count}")
+
+    print(f"\n  {c['bold']}By tier:{c['reset']}")
+    for tier, count, active_count in by_tier:
+        print(f"    {tier:12} {count:3} total, {active_count:3} active")
+
+    # Top tags
+    if top_tags:
+        print(f"\n  {c['bold']}Top tags:{c['reset']}")
+        for name, count in top_tags:
+            print(f"    {name:20} {count:3}")
+
+    print(f"\n  Last manage-lessons: {last_manage or 'never'}")
+    print(f"  Nudge threshold: {threshold} days")
 
     if warnings:
         print(f"\n  {c['bold']}Warnings:{c['reset']}")
@@ -993,6 +2917,98 @@ def cmd_health(args: argparse.Namespace) -> None:
     print()
 
 
+# ---------------------------------------------------------------------------
+# Surfacing subcommands
+# ---------------------------------------------------------------------------
+
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    """Run the lessons query server on a Unix socket (foreground)."""
+    from cli.lessons.server import serve
+
+    print(f"Serving {args.db_path} on {args.socket}", file=sys.stderr)
+    try:
+        serve(args.db_path, args.socket)
+    except RuntimeError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_match(args: argparse.Namespace) -> None:
+    """Print lessons matching a tool context — server first, SQL fallback."""
+    from cli.lessons.server import query
+
+    exclude = [s.strip() for s in args.exclude.split(",") if s.strip()] if args.exclude else []
+    response = query(args.socket, {
+        "op": "match",
+        "context": args.context,
+        "project": args.project,
+        "exclude": exclude,
+        "limit": args.limit,
+    })
+    if response and response.get("ok"):
+        rows = [(r["id"], r["text"]) for r in response["lessons"]]
+    else:
+        conn = get_connection(args.db_path)
+        rows = match_lessons(
+            conn, args.context, project=args.project, exclude=exclude, limit=args.limit,
+        )
+
+    for lid, text in rows:
+        print(f"{lid}\t{text}")
+
+
+def cmd_surface(args: argparse.Namespace) -> None:
+    """Print the budgeted surfacing payload for a tool context — server first, SQL fallback."""
+    from cli.lessons.server import query
+
+    exclude = [s.strip() for s in args.exclude.split(",") if s.strip()] if args.exclude else []
+    budget = args.budget_tokens * BYTES_PER_TOKEN if args.budget_tokens is not None else args.budget_bytes
+    session = getattr(args, "session", None)
+    response = query(args.socket, {
+        "op": "surface",
+        "context": args.context,
+        "project": args.project,
+        "exclude": exclude,
+        "budget_bytes": budget,
+        "limit": args.limit,
+        "session": session,
+    })
+    if response and response.get("ok"):
+        lessons = response["lessons"]
+    else:
+        from cli.lessons.seen import SeenSet
+
+        seen = SeenSet(session) if session else None
+        try:
+            lessons = surface_lessons(
+                get_connection(args.db_path), args.context, project=args.project,
+                exclude=exclude, budget_bytes=budget, limit=args.limit, seen=seen,
+            )
+        finally:
+            if seen is not None:
+                seen.close()
+
+    payload = render_surface_payload(lessons)
+    fmt = _output_format(args)
+    if fmt == "text":
+        sys.stdout.write(payload)
+    elif fmt == "json":
+        write_record({"bytes": len(payload.encode()), "budget_bytes": budget,
+                      "payload": payload, "lessons": lessons}, fmt)
+    else:
+        write_records(lessons, fmt)
+
+
+def cmd_snapshot(args: argparse.Namespace) -> None:
+    """Write the bash-sourceable snapshot used by hooks (see cli.lessons.snapshot)."""
+    from cli.lessons.snapshot import snapshot_path, write_snapshot
+
+    conn = get_connection(args.db_path)
+    path = write_snapshot(conn, args.path or snapshot_path(args.db_path))
+    print(f"Wrote {path}")
+
+
 # ---------------------------------------------------------------------------
 # Utilities
 # ---------------------------------------------------------------------------
@@ -1003,7 +3019,24 @@ def _encoded_dir(path: Path) -> str:
     return "-" + str(path).lstrip("/").replace("/", "-")
 
 
-def _detect_project() -> str:
+def _find_repo(start: Path) -> tuple[Path, Path] | None:
+    """(worktree root, git dir) containing start, found by walking up to `.git`.
+
+    Reads the filesystem instead of forking `git rev-parse`. A `.git` file
+    (linked worktree, submodule) points at the real git dir.
+    """
+    for root in (start, *start.parents):
+        dot_git = root / ".git"
+        if dot_git.is_dir():
+            return root, dot_git
+        if dot_git.is_file():
+            text = dot_git.read_text().strip()
+            if text.startswith("gitdir:"):
+                return root, root / text[len("gitdir:"):].strip()
+    return None
+
+
+def _detect_project(root: Path | None = None) -> str:
     """Resolve canonical project_id via sessions.db.project_paths.
 
     When sessions.db is present, defer to it as source of truth — error if the
@@ -1013,15 +3046,9 @@ def _detect_project() -> str:
     Only when sessions.db is absent entirely do we fall back to basename
     (standalone toolkit deployment with no claude-sessions).
     """
-    import subprocess
-
-    try:
-        root = Path(subprocess.run(
-            ["git", "rev-parse", "--show-toplevel"],
-            capture_output=True, text=True, check=True,
-        ).stdout.strip())
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        root = Path.cwd()
+    if root is None:
+        repo = _find_repo(Path.cwd())
+        root = repo[0] if repo else Path.cwd()
 
     if not SESSIONS_DB_PATH.exists():
         return root.name
@@ -1050,17 +3077,80 @@ def _detect_project() -> str:
 
 
 def _detect_branch() -> str | None:
-    """Detect current git branch."""
-    import subprocess
-
+    """Detect current git branch from .git/HEAD (None when detached or not a repo)."""
+    repo = _find_repo(Path.cwd())
+    if repo is None:
+        return None
     try:
-        result = subprocess.run(
-            ["git", "branch", "--show-current"],
-            capture_output=True, text=True, check=True,
-        )
-        return result.stdout.strip() or None
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        head = (repo[1] / "HEAD").read_text().strip()
+    except OSError:
         return None
+    prefix = "ref: refs/heads/"
+    return head[len(prefix):] if head.startswith(prefix) else None
+
+
+def project_cache_path(db_path: Path) -> Path:
+    """Project-resolution cache for a lessons DB: `<stem>-projects.json` beside it."""
+    return db_path.with_name(f"{db_path.stem}-projects.json")
+
+
+# Most directories kept in the project cache; the least recently resolved go first.
+PROJECT_CACHE_MAX_ENTRIES = 256
+
+# In-process memo of resolve_project(), keyed like the on-disk cache entries.
+_RESOLVED_PROJECTS: dict[tuple[str, str, int | None], str] = {}
+
+
+def resolve_project(db_path: Path = LESSONS_DB_PATH) -> str:
+    """_detect_project() for the cwd, cached per directory next to db_path.
+
+    An entry is reused while the cwd resolves to the same repo root and
+    sessions.db is unchanged (same mtime, or still absent), so repeated adds
+    from one repo skip the sessions.db open. Failed resolutions exit as
+    _detect_project() does and are never cached. Each rewrite drops entries
+    whose repo root is gone and keeps the PROJECT_CACHE_MAX_ENTRIES most
+    recently resolved directories.
+    """
+    import json
+
+    from cli.lessons.snapshot import write_text_atomic
+
+    cwd = Path.cwd()
+    repo = _find_repo(cwd)
+    root = repo[0] if repo else cwd
+    try:
+        sessions_mtime: int | None = SESSIONS_DB_PATH.stat().st_mtime_ns
+    except OSError:
+        sessions_mtime = None
+    key = (str(cwd), str(root), sessions_mtime)
+    if key in _RESOLVED_PROJECTS:
+        return _RESOLVED_PROJECTS[key]
+
+    cache_path = project_cache_path(db_path)
+    try:
+        entries = json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        entries = {}
+    if not isinstance(entries, dict):
+        entries = {}
+    entry = entries.get(str(cwd))
+    if isinstance(entry, dict) and (entry.get("root"), entry.get("sessions_mtime")) == (str(root), sessions_mtime):
+        project = entry["project"]
+    else:
+        project = _detect_project(root)
+        entries.pop(str(cwd), None)
+        entries[str(cwd)] = {"root": str(root), "sessions_mtime": sessions_mtime, "project": project}
+        live = [
+            (d, e) for d, e in entries.items()
+            if isinstance(e, dict) and Path(e.get("root") or "").is_dir()
+        ]
+        entries = dict(live[-PROJECT_CACHE_MAX_ENTRIES:])
+        try:
+            write_text_atomic(cache_path, json.dumps(entries, indent=2) + "\n")
+        except OSError:
+            pass  # read-only location: resolution still works, just uncached
+    _RESOLVED_PROJECTS[key] = project
+    return project
 
 
 # ---------------------------------------------------------------------------
@@ -1069,6 +3159,8 @@ def _detect_branch() -> str | None:
 
 
 def build_parser() -> argparse.ArgumentParser:
+    import argparse
+
     parser = argparse.ArgumentParser(
         description=(
             "Lessons database — manage cross-project actionable rules. "
@@ -1079,6 +3171,13 @@ def build_parser() -> argparse.ArgumentParser:
         "--db", type=Path, default=LESSONS_DB_PATH, dest="db_path",
         help=f"Database path (default: {LESSONS_DB_PATH})",
     )
+    parser.add_argument(
+        "--format", choices=OUTPUT_FORMATS, default="text",
+        help="Output format for read subcommands (default: text)",
+    )
+    # Also accept --format after the subcommand; SUPPRESS keeps the global value.
+    fmt = argparse.ArgumentParser(add_help=False)
+    fmt.add_argument("--format", choices=OUTPUT_FORMATS, default=argparse.SUPPRESS, help=argparse.SUPPRESS)
     sub = parser.add_subparsers(dest="command", help="Subcommand")
 
     # migrate
@@ -1098,27 +3197,38 @@ def build_parser() -> argparse.ArgumentParser:
     add.add_argument("--branch", default=None, help="Git branch (auto-detected)")
     add.add_argument("--scope", choices=["global", "project"], default="global",
                      help="Scope: global (all projects) or project (this project only)")
+    add.add_argument("--on-duplicate", choices=["warn", "refuse", "ignore"], default="warn",
+                     help="When the text is a near-duplicate of an active lesson (default: warn)")
+    add.add_argument("--dup-threshold", type=float, default=DUPLICATE_THRESHOLD,
+                     help=f"Similarity that counts as a near-duplicate (default: {DUPLICATE_THRESHOLD})")
 
     # search
-    srch = sub.add_parser("search", help="Full-text search")
+    srch = sub.add_parser("search", parents=[fmt], help="Full-text search")
     srch.add_argument("query", help="Search query")
     srch.add_argument("--limit", type=int, default=20, help="Max results")
+    srch.add_argument("--prefix", action="store_true", help="Match tokens as prefixes (rebas → rebase)")
+    srch.add_argument("--active-only", action="store_true", help="Only active lessons")
+    srch.add_argument("--all", action="store_true", help="Also search the archive DB (see `archive`)")
 
     # get
-    gt = sub.add_parser("get", help="Get a lesson by ID (full detail)")
+    gt = sub.add_parser("get", parents=[fmt], help="Get a lesson by ID (full detail)")
     gt.add_argument("id", help="Lesson ID")
 
     # list
-    lst = sub.add_parser("list", help="List lessons with filters")
+    lst = sub.add_parser("list", parents=[fmt], help="List lessons with filters")
     lst.add_argument("--tier", help="Filter by tier (recent/key/historical)")
     lst.add_argument("--active", action="store_true", help="Active lessons only")
     lst.add_argument("--tags", help="Comma-separated tags to filter by")
-    lst.add_argument("--project", help="Filter by project name")
+    lst.add_argument("--all-tags", action="store_true", help="Require every tag in --tags (default: any)")
+    lst.add_argument("--project", help="Filter by project id (exact match)")
+    lst.add_argument("--project-like", action="store_true", help="Match --project as a substring (full scan)")
     lst.add_argument("--scope", choices=["global", "project"], help="Filter by scope")
     lst.add_argument("--limit", type=int, default=50, help="Max results")
+    lst.add_argument("--explain", action="store_true", help="Print the EXPLAIN QUERY PLAN instead of results")
 
     # summary
-    sub.add_parser("summary", help="Show summary counts")
+    summ = sub.add_parser("summary", parents=[fmt], help="Show summary counts")
+    summ.add_argument("--recompute", action="store_true", help="Rebuild lesson_stats from the tables first")
 
     # set-meta
     sm = sub.add_parser("set-meta", help="Set metadata key-value")
@@ -1126,11 +3236,17 @@ def build_parser() -> argparse.ArgumentParser:
     sm.add_argument("value", help="Metadata value")
 
     # tags
-    sub.add_parser("tags", help="Show tag registry")
+    sub.add_parser("tags", parents=[fmt], help="Show tag registry")
 
     # clusters
-    cl = sub.add_parser("clusters", help="Find crystallization candidates")
+    cl = sub.add_parser("clusters", parents=[fmt], help="Find crystallization candidates")
     cl.add_argument("--min-shared", type=int, default=2, help="Min shared tags (default: 2)")
+    cl.add_argument("--top", type=int, default=None, help="Show only the K largest clusters")
+
+    # dedupe
+    dd = sub.add_parser("dedupe", parents=[fmt], help="Report near-duplicate active lessons")
+    dd.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD,
+                    help=f"Min text similarity (default: {DUPLICATE_THRESHOLD})")
 
     # crystallize
     cr = sub.add_parser("crystallize", help="Merge lessons into one")
@@ -1151,22 +3267,165 @@ def build_parser() -> argparse.ArgumentParser:
     de = sub.add_parser("deactivate", help="Deactivate a lesson (searchable but not surfaced)")
     de.add_argument("--id", required=True, help="Lesson ID")
 
+    # batch
+    bt = sub.add_parser("batch", help="Run JSONL ops from stdin in one transaction")
+    bt.add_argument("--savepoints", action="store_true",
+                    help="Roll back only the failing op instead of the whole batch")
+
     # tag-hygiene
     sub.add_parser("tag-hygiene", help="Report tag quality issues")
 
     # health
-    sub.add_parser("health", help="Overall health report")
+    hl = sub.add_parser("health", parents=[fmt], help="Overall health report")
+    hl.add_argument("--recompute", action="store_true", help="Rebuild lesson_stats from the tables first")
+
+    # archive
+    ar = sub.add_parser("archive", parents=[fmt], help="Move old inactive lessons to the archive DB (then counted as Archived; get and search --all still find them)")
+    ar.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_DAYS, metavar="DAYS",
+                    help=f"Only lessons dated more than DAYS ago (default: {ARCHIVE_AFTER_DAYS})")
+    ar.add_argument("--dry-run", action="store_true", help="List what would move, change nothing")
+
+    # export / import
+    ex = sub.add_parser("export", help="Dump the DB and its archive as NDJSON (streamed)")
+    ex.add_argument("--output", "-o", default="-", help="File to write, .gz to compress (default: stdout)")
+    im = sub.add_parser("import", parents=[fmt], help="Restore an export in one transaction")
+    im.add_argument("path", help="Export file (.gz ok) or - for stdin")
+    im.add_argument("--skip-existing", action="store_true", help="Skip lessons whose id already exists")
+
+    # reindex-counts
+    sub.add_parser("reindex-counts", help="Recompute tag lesson counts and keyword index (repair)")
+
+    # serve
+    sv = sub.add_parser("serve", help="Run the lessons query server (Unix socket)")
+    sv.add_argument(
+        "--socket", type=Path, default=LESSONS_SOCKET_PATH,
+        help=f"Socket path (default: {LESSONS_SOCKET_PATH})",
+    )
+
+    # match
+    mt = sub.add_parser("match", help="Lessons matching a tool context (server, else SQL)")
+    mt.add_argument("--context", required=True, help="Tool input (command or file path)")
+    mt.add_argument("--project", default=None, help="Current project id (for project-scoped lessons)")
+    mt.add_argument("--exclude", default="", help="Comma-separated lesson IDs to skip")
+    mt.add_argument("--limit", type=int, default=SURFACE_LIMIT, help=f"Max results (default: {SURFACE_LIMIT})")
+    mt.add_argument(
+        "--socket", type=Path, default=LESSONS_SOCKET_PATH,
+        help=f"Server socket path (default: {LESSONS_SOCKET_PATH})",
+    )
+
+    # surface
+    sf = sub.add_parser("surface", parents=[fmt], help="Best lessons for a tool context within a byte budget")
+    sf.add_argument("--context", required=True, help="Tool input (command or file path)")
+    sf.add_argument("--project", default=None, help="Current project id (for project-scoped lessons)")
+    sf.add_argument("--exclude", default="", help="Comma-separated lesson IDs to skip")
+    budget = sf.add_mutually_exclusive_group()
+    budget.add_argument("--budget-bytes", type=int, default=SURFACE_BUDGET_BYTES,
+                        help=f"Max payload size in bytes (default: {SURFACE_BUDGET_BYTES})")
+    budget.add_argument("--budget-tokens", type=int, default=None,
+                        help=f"Max payload size in tokens (~{BYTES_PER_TOKEN} bytes each)")
+    sf.add_argument("--limit", type=int, default=SURFACE_LIMIT, help=f"Max lessons (default: {SURFACE_LIMIT})")
+    sf.add_argument("--session", default=None,
+                    help="Session id: skip lessons already surfaced in it, remember the ones returned")
+    sf.add_argument(
+        "--socket", type=Path, default=LESSONS_SOCKET_PATH,
+        help=f"Server socket path (default: {LESSONS_SOCKET_PATH})",
+    )
+
+    # snapshot
+    snap = sub.add_parser("snapshot", help="Write the bash-sourceable snapshot for hooks")
+    snap.add_argument(
+        "--path", type=Path, default=None,
+        help="Output path (default: lessons-snapshot.sh next to the DB)",
+    )
 
     return parser
 
 
-def main() -> None:
-    parser = build_parser()
-    args = parser.parse_args()
+# Hot read subcommands (the ones hooks call) that main() parses without
+# building the argparse tree: positional dests, then option → (dest, type,
+# default). Defaults and choices must mirror build_parser();
+# tests/test_lesson_db.py::TestStartup checks both parsers agree.
+_FAST_COMMANDS: dict[str, tuple[tuple[str, ...], dict[str, tuple[str, type, Any]]]] = {
+    "get": (("id",), {}),
+    "search": (("query",), {
+        "--limit": ("limit", int, 20),
+        "--prefix": ("prefix", bool, False),
+        "--active-only": ("active_only", bool, False),
+        "--all": ("all", bool, False),
+    }),
+    "list": ((), {
+        "--tier": ("tier", str, None),
+        "--active": ("active", bool, False),
+        "--tags": ("tags", str, None),
+        "--all-tags": ("all_tags", bool, False),
+        "--project": ("project", str, None),
+        "--project-like": ("project_like", bool, False),
+        "--scope": ("scope", str, None),
+        "--limit": ("limit", int, 50),
+        "--explain": ("explain", bool, False),
+    }),
+}
+_FAST_CHOICES = {"format": OUTPUT_FORMATS, "scope": ("global", "project")}
+
 
-    if not args.command:
-        parser.print_help()
-        sys.exit(1)
+def _fast_args(argv: list[str]) -> SimpleNamespace | None:
+    """Parse argv for a hot subcommand in its plain form, else None.
+
+    Anything unusual — another subcommand, --help, `--opt=value`, a value that
+    looks like an option, a bad int or choice — returns None so build_parser()
+    handles it (and owns every usage error).
+    """
+    values: dict[str, Any] = {"db_path": LESSONS_DB_PATH, "format": "text"}
+    args = iter(argv)
+    spec = None
+    positionals: list[str] = []
+    for arg in args:
+        if arg in ("--db", "--format") and (spec is None or arg == "--format"):
+            value = next(args, None)
+            if value is None or value.startswith("-"):
+                return None
+            values["db_path" if arg == "--db" else "format"] = Path(value) if arg == "--db" else value
+        elif spec is None:
+            if arg not in _FAST_COMMANDS:
+                return None
+            spec = _FAST_COMMANDS[arg]
+            values["command"] = arg
+            values.update({dest: default for dest, _, default in spec[1].values()})
+        elif arg in spec[1]:
+            dest, kind, _ = spec[1][arg]
+            if kind is bool:
+                values[dest] = True
+                continue
+            value = next(args, None)
+            if value is None or value.startswith("-"):
+                return None
+            try:
+                values[dest] = kind(value)
+            except ValueError:
+                return None
+        elif arg.startswith("-"):
+            return None
+        else:
+            positionals.append(arg)
+    if spec is None or len(positionals) != len(spec[0]):
+        return None
+    values.update(zip(spec[0], positionals))
+    for dest, choices in _FAST_CHOICES.items():
+        if values.get(dest) is not None and values[dest] not in choices:
+            return None
+    return SimpleNamespace(**values)
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    args = _fast_args(argv)
+    if args is None:
+        parser = build_parser()
+        args = parser.parse_args(argv)
+
+        if not args.command:
+            parser.print_help()
+            sys.exit(1)
 
     commands = {
         "migrate": cmd_migrate,
@@ -1178,14 +3437,41 @@ def main() -> None:
         "set-meta": cmd_set_meta,
         "tags": cmd_tags,
         "clusters": cmd_clusters,
+        "dedupe": cmd_dedupe,
         "crystallize": cmd_crystallize,
         "absorb": cmd_absorb,
         "promote": cmd_promote,
         "deactivate": cmd_deactivate,
+        "batch": cmd_batch,
         "tag-hygiene": cmd_tag_hygiene,
         "health": cmd_health,
+        "archive": cmd_archive,
+        "export": cmd_export,
+        "import": cmd_import,
+        "reindex-counts": cmd_reindex_counts,
+        "serve": cmd_serve,
+        "match": cmd_match,
+        "surface": cmd_surface,
+        "snapshot": cmd_snapshot,
     }
-    commands[args.command](args)
+    try:
+        commands[args.command](args)
+        # Flush inside the try so a closed pipe surfaces here, not at exit.
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Downstream closed early (`| head`): silence the exit-time flush.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+    if args.command in SNAPSHOT_COMMANDS:
+        from cli.lessons.snapshot import render_snapshot, snapshot_path, write_text_atomic
+
+        text = render_snapshot(get_connection(args.db_path))
+        # Closing checkpoints the WAL into lessons.db; do it first so the
+        # snapshot ends up newer than both files.
+        close_connections()
+        write_text_atomic(snapshot_path(args.db_path), text)
 
 
 if __name__ == "__main__":
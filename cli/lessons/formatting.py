@@ -4,6 +4,11 @@ from __future__ import annotations
 
 import os
 import sys
+from collections.abc import Iterable
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import TextIO
 
 COLORS = {
     "bold": "\033[1m",
@@ -31,3 +36,65 @@ def _fmt_tokens(n: int) -> str:
     if n >= 1_000:
         return f"{n / 1_000:.1f}K"
     return str(n)
+
+
+# ---------------------------------------------------------------------------
+# Machine-readable output
+# ---------------------------------------------------------------------------
+
+OUTPUT_FORMATS = ("text", "json", "jsonl", "tsv")
+
+
+def _tsv_cell(value: object) -> str:
+    """One TSV field: None → empty, flat lists comma-joined, nested values as JSON, escapes for \\t \\n \\\\."""
+    import json
+
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = int(value)
+    elif isinstance(value, (list, tuple)) and not any(isinstance(v, (dict, list)) for v in value):
+        value = ",".join(str(v) for v in value)
+    elif isinstance(value, (dict, list, tuple)):
+        value = json.dumps(value)
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t")
+        .replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def write_records(records: Iterable[dict], fmt: str, out: TextIO | None = None) -> int:
+    """Stream records as a JSON array, JSON lines or TSV (header from the first record).
+
+    Each record is written as soon as it is produced — nothing is buffered
+    beyond the current row. Returns the number of records written.
+    """
+    import json
+
+    out = out or sys.stdout
+    n = 0
+    for record in records:
+        if fmt == "json":
+            out.write(("[\n" if n == 0 else ",\n") + json.dumps(record))
+        elif fmt == "jsonl":
+            out.write(json.dumps(record) + "\n")
+        elif fmt == "tsv":
+            if n == 0:
+                out.write("\t".join(record) + "\n")
+            out.write("\t".join(_tsv_cell(v) for v in record.values()) + "\n")
+        else:
+            raise ValueError(f"unknown output format: {fmt}")
+        n += 1
+    if fmt == "json":
+        out.write("\n]\n" if n else "[]\n")
+    return n
+
+
+def write_record(record: dict, fmt: str, out: TextIO | None = None) -> None:
+    """Write a single record: a JSON object for json, otherwise as write_records."""
+    if fmt == "json":
+        import json
+
+        (out or sys.stdout).write(json.dumps(record, indent=2) + "\n")
+    else:
+        write_records([record], fmt, out)
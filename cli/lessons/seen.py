@@ -0,0 +1,127 @@
+"""Per-session "already surfaced" set for lessons — no database round-trip.
+
+surface-lessons must not repeat a lesson within one session. Instead of a
+query against a log database per fire, each session gets a bitmap file of
+SEEN_BITS bits keyed by a hash of the lesson id: bit (h % 8) of byte
+(h // 8). Lesson ids are stable across archive moves and imports, unlike
+rowids, which SQLite reuses after deletes. The file is sparse, so only
+the pages holding set bits take space. Checking and setting a lesson is
+one pread + at most one pwrite under a one-byte lockf() range lock, so
+concurrent hooks of the same session never lose a bit and the cost does
+not grow with the number of lessons seen. Two ids sharing a bit would
+suppress each other; with SEEN_BITS = 2**23 that chance is about one in
+80,000 per lesson after 100 lessons surfaced in a session.
+
+Files live under $XDG_RUNTIME_DIR/claude-toolkit/lessons-seen/ (cleared at
+logout), falling back to a per-user directory in the system temp dir. A
+file untouched for SEEN_TTL_S is treated as expired: expire_seen() removes
+it, and it runs whenever a new session file is created.
+
+Usage:
+    claude-toolkit lessons surface --context TEXT --session SESSION_ID
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+SEEN_TTL_S = 24 * 60 * 60
+SEEN_BITS = 1 << 23  # 1 MiB file at most, sparse
+
+_SESSION_RE = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+
+def seen_dir() -> Path:
+    """Directory holding the per-session bitmaps (created 0700 on demand)."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    base = Path(runtime) / "claude-toolkit" if runtime else Path(tempfile.gettempdir()) / f"claude-toolkit-{os.getuid()}"
+    return base / "lessons-seen"
+
+
+def _file_name(session_id: str) -> str:
+    if _SESSION_RE.match(session_id) and session_id not in (".", ".."):
+        return f"{session_id}.bits"
+    return hashlib.blake2b(session_id.encode(), digest_size=16).hexdigest() + ".bits"
+
+
+def _bit(lesson_id: str) -> int:
+    digest = hashlib.blake2b(lesson_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % SEEN_BITS
+
+
+def expire_seen(directory: Path | None = None, *, max_age_s: float = SEEN_TTL_S) -> int:
+    """Remove session bitmaps not written for max_age_s. Returns how many."""
+    directory = directory or seen_dir()
+    cutoff = time.time() - max_age_s
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.name.endswith(".bits"):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class SeenSet:
+    """The set of lesson ids already surfaced in one session."""
+
+    def __init__(self, session_id: str, directory: Path | None = None) -> None:
+        directory = directory or seen_dir()
+        # mkdir(parents=True) applies `mode` to the leaf only; the per-user
+        # parent (claude-toolkit-<uid> in the shared temp dir) needs it too.
+        directory.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        directory.mkdir(exist_ok=True, mode=0o700)
+        self.path = directory / _file_name(session_id)
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            self._fd = os.open(self.path, os.O_RDWR)
+        else:
+            expire_seen(directory)
+
+    def __contains__(self, lesson_id: str) -> bool:
+        bit = _bit(lesson_id)
+        byte = os.pread(self._fd, 1, bit >> 3)
+        return bool(byte and byte[0] & (1 << (bit & 7)))
+
+    def check_and_set(self, lesson_id: str) -> bool:
+        """Mark lesson_id as surfaced. Returns True if it already was."""
+        bit = _bit(lesson_id)
+        offset, mask = bit >> 3, 1 << (bit & 7)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+        try:
+            byte = os.pread(self._fd, 1, offset)
+            current = byte[0] if byte else 0
+            if not current & mask:
+                os.pwrite(self._fd, bytes([current | mask]), offset)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+        return bool(current & mask)
+
+    def clear(self) -> None:
+        os.ftruncate(self._fd, 0)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> SeenSet:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
@@ -0,0 +1,306 @@
+"""Lessons query server — keeps lessons.db warm behind a Unix socket.
+
+surface-lessons fires on every Bash/Read/Write/Edit PreToolUse. Forking
+sqlite3 per call is the hook's long pole (~10ms), so this server holds the
+keyword → tag inverted index and active lesson rows in memory and answers
+"which lessons match this tool context" without touching disk, in time
+proportional to the number of context words.
+
+Protocol: one JSON object per line in, one JSON object per line out, then
+the server closes the connection.
+
+    → {"op": "match", "context": "git rebase HEAD~3", "project": "p", "exclude": [], "limit": 3}
+    ← {"ok": true, "lessons": [{"id": "...", "text": "..."}]}
+    → {"op": "surface", "context": "...", "project": "p", "exclude": [], "budget_bytes": 1200, "limit": 3,
+       "session": "<id>"}
+    ← {"ok": true, "lessons": [{"id": "...", "text": "...", "score": 4.5, "bytes": 42}]}
+    → {"op": "ping"}
+    ← {"ok": true}
+
+The in-memory state reloads when lessons.db or its WAL changes (mtime/size),
+so writes from `claude-toolkit lessons ...` are picked up on the next request.
+Callers use `query()`, which returns None when the socket is absent so they
+can fall back to `cli.lessons.db.match_lessons` / `surface_lessons` (the
+SQL path).
+
+Usage:
+    claude-toolkit lessons serve [--socket PATH]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sqlite3
+import threading
+from pathlib import Path
+
+from cli.lessons.db import (
+    MIN_TAG_HITS,
+    SURFACE_BUDGET_BYTES,
+    SURFACE_LIMIT,
+    _context_words,
+    _word_forms,
+    select_within_budget,
+)
+from cli.lessons.seen import SeenSet
+
+QUERY_TIMEOUT_S = 0.5
+
+
+# ---------------------------------------------------------------------------
+# In-memory index
+# ---------------------------------------------------------------------------
+
+
+def _file_sig(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class LessonIndex:
+    """Active lessons + tag keywords of one lessons.db, reloaded on change."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self._wal_path = db_path.with_name(db_path.name + "-wal")
+        self._lock = threading.Lock()
+        self._sig: tuple | None = None
+        self._conn: sqlite3.Connection | None = None
+        # keyword token -> active tag ids (from tag_keywords)
+        self.keyword_tags: dict[str, list[int]] = {}
+        # tag_id -> active lesson ids carrying it
+        self.tag_lessons: dict[int, list[str]] = {}
+        # lesson id -> (text, tier, date, scope, project_id)
+        self.lessons: dict[str, tuple[str, str, str, str, str]] = {}
+
+    def _signature(self) -> tuple:
+        return (_file_sig(self.db_path), _file_sig(self._wal_path))
+
+    def refresh(self) -> bool:
+        """Reload if lessons.db or its WAL changed since the last load."""
+        with self._lock:
+            self._connection()
+            sig = self._signature()
+            if sig == self._sig:
+                return False
+            self._load()
+            self._sig = sig
+            return True
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False,
+            )
+            # First read materializes -wal/-shm; do it before taking a signature.
+            self._conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        return self._conn
+
+    def _load(self) -> None:
+        conn = self._connection()
+        keyword_tags: dict[str, list[int]] = {}
+        for keyword, tag_id in conn.execute(
+            """SELECT tk.keyword, tk.tag_id FROM tag_keywords tk
+               JOIN tags t ON t.id = tk.tag_id WHERE t.status = 'active'"""
+        ):
+            keyword_tags.setdefault(keyword, []).append(tag_id)
+        lessons = {
+            lid: (text, tier, date, scope, project_id)
+            for lid, text, tier, date, scope, project_id in conn.execute(
+                """SELECT id, text, tier, date, scope, project_id
+                   FROM lessons WHERE active = 1"""
+            )
+        }
+        tag_lessons: dict[int, list[str]] = {}
+        for lesson_id, tag_id in conn.execute(
+            "SELECT lesson_id, tag_id FROM lesson_tags"
+        ):
+            if lesson_id in lessons:
+                tag_lessons.setdefault(tag_id, []).append(lesson_id)
+        self.keyword_tags, self.lessons, self.tag_lessons = keyword_tags, lessons, tag_lessons
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def candidates(
+        self,
+        context: str,
+        *,
+        project: str | None = None,
+        exclude: list[str] | tuple[str, ...] = (),
+    ) -> list[tuple[str, str, str, str, str, str, int]]:
+        """Same contract as cli.lessons.db.surface_candidates, answered from memory."""
+        words = _context_words(context)
+        if len(words) < MIN_TAG_HITS:
+            return []
+        skip = set(exclude)
+        with self._lock:
+            tag_words: dict[int, set[str]] = {}
+            for word in words:
+                for tag_id in {t for f in _word_forms(word) for t in self.keyword_tags.get(f, ())}:
+                    tag_words.setdefault(tag_id, set()).add(word)
+            lesson_words: dict[str, set[str]] = {}
+            for tag_id, hit in tag_words.items():
+                if len(hit) >= MIN_TAG_HITS:
+                    for lid in self.tag_lessons.get(tag_id, ()):
+                        lesson_words.setdefault(lid, set()).update(hit)
+            rows = []
+            for lid, hit in lesson_words.items():
+                if lid in skip:
+                    continue
+                text, tier, date, scope, project_id = self.lessons[lid]
+                if scope != "global" and project_id != project:
+                    continue
+                rows.append((lid, text, tier, date, scope, project_id, len(hit)))
+        return rows
+
+    def match(
+        self,
+        context: str,
+        *,
+        project: str | None = None,
+        exclude: list[str] | tuple[str, ...] = (),
+        limit: int = SURFACE_LIMIT,
+    ) -> list[tuple[str, str]]:
+        """Same contract as cli.lessons.db.match_lessons, answered from memory."""
+        rows = self.candidates(context, project=project, exclude=exclude)
+        # Mirror ORDER BY tier = 'key' DESC, date DESC, id
+        rows.sort(key=lambda r: r[0])
+        rows.sort(key=lambda r: r[3], reverse=True)
+        rows.sort(key=lambda r: r[2] != "key")
+        return [(r[0], r[1]) for r in rows[:limit]]
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: LessonServer
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+            response = self.server.dispatch(request)
+        except Exception as exc:  # noqa: BLE001 — report, never kill the server
+            response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class LessonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, index: LessonIndex) -> None:
+        self.index = index
+        super().__init__(str(socket_path), _Handler)
+
+    def dispatch(self, request: dict) -> dict:
+        op = request.get("op", "match")
+        if op == "ping":
+            return {"ok": True}
+        if op == "match":
+            self.index.refresh()
+            rows = self.index.match(
+                request.get("context", ""),
+                project=request.get("project"),
+                exclude=request.get("exclude") or (),
+                limit=int(request.get("limit", SURFACE_LIMIT)),
+            )
+            return {"ok": True, "lessons": [{"id": i, "text": t} for i, t in rows]}
+        if op == "surface":
+            self.index.refresh()
+            project = request.get("project")
+            seen = SeenSet(request["session"]) if request.get("session") else None
+            try:
+                lessons = select_within_budget(
+                    self.index.candidates(
+                        request.get("context", ""), project=project, exclude=request.get("exclude") or (),
+                    ),
+                    project=project,
+                    budget_bytes=int(request.get("budget_bytes", SURFACE_BUDGET_BYTES)),
+                    limit=int(request.get("limit", SURFACE_LIMIT)),
+                    today=request.get("today"),
+                    seen=seen,
+                )
+            finally:
+                if seen is not None:
+                    seen.close()
+            return {"ok": True, "lessons": lessons}
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+
+def _socket_alive(socket_path: Path) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def make_server(db_path: Path, socket_path: Path) -> LessonServer:
+    """Bind a LessonServer, replacing a stale socket file left by a dead one."""
+    if socket_path.exists():
+        if _socket_alive(socket_path):
+            raise RuntimeError(f"lessons server already running on {socket_path}")
+        socket_path.unlink()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    index = LessonIndex(db_path)
+    index.refresh()
+    old_umask = os.umask(0o177)
+    try:
+        return LessonServer(socket_path, index)
+    finally:
+        os.umask(old_umask)
+
+
+def serve(db_path: Path, socket_path: Path) -> None:
+    """Run the server until SIGINT/SIGTERM, then remove the socket."""
+    server = make_server(db_path, socket_path)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.index.close()
+        socket_path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+
+def query(socket_path: Path, request: dict, timeout: float = QUERY_TIMEOUT_S) -> dict | None:
+    """Send one request, return the decoded response — None if no server."""
+    if not socket_path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    if not line:
+        return None
+    return json.loads(line)
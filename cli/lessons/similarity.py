@@ -0,0 +1,112 @@
+"""Lesson similarity primitives — MinHash signatures, LSH banding, union-find.
+
+Pure functions with no database access; cli.lessons.db persists signatures
+in lesson_signatures / lesson_lsh and drives clustering and near-duplicate
+detection from them.
+
+MinHash: each lesson text becomes a set of character shingles; a signature
+of NUM_PERM minimum hashes estimates Jaccard similarity between two sets as
+the fraction of equal positions. LSH splits the signature into LSH_BANDS
+bands of LSH_ROWS values; lessons sharing any band bucket are candidates
+(with 16×4 banding, pairs at Jaccard ≥ ~0.5 collide with probability ≥ 0.6,
+at ≥ 0.8 with ≥ 0.99), so candidate lookup is an index probe, not a scan.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+import struct
+from collections.abc import Hashable, Iterable, Sequence
+
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 5
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(0x1E55035)  # fixed: signatures are persisted across runs
+_PERMS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """Character shingles of whitespace-normalized, lowercased text."""
+    norm = _SPACE_RE.sub(" ", text.lower()).strip()
+    if len(norm) <= size:
+        return {norm} if norm else set()
+    return {norm[i:i + size] for i in range(len(norm) - size + 1)}
+
+
+def minhash(features: Iterable[str]) -> tuple[int, ...]:
+    """NUM_PERM-value MinHash signature of a feature set (empty set → all-max)."""
+    hashes = [_hash64(f.encode()) for f in set(features)]
+    if not hashes:
+        return (_MERSENNE,) * NUM_PERM
+    return tuple(min([(a * h + b) % _MERSENNE for h in hashes]) for a, b in _PERMS)
+
+
+def text_signature(text: str) -> tuple[int, ...]:
+    return minhash(shingles(text))
+
+
+def similarity(sig1: Sequence[int], sig2: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(sig1, sig2)) / NUM_PERM
+
+
+def band_buckets(sig: Sequence[int]) -> list[int]:
+    """One signed 64-bit bucket per LSH band (fits an SQLite INTEGER)."""
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = sig[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<{LSH_ROWS}Q", *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def pack_signature(sig: Sequence[int]) -> bytes:
+    return struct.pack(f"<{NUM_PERM}Q", *sig)
+
+
+def unpack_signature(blob: bytes) -> tuple[int, ...]:
+    return struct.unpack(f"<{NUM_PERM}Q", blob)
+
+
+class UnionFind:
+    """Disjoint sets over hashable items (path halving, union by size)."""
+
+    def __init__(self) -> None:
+        self._parent: dict[Hashable, Hashable] = {}
+        self._size: dict[Hashable, int] = {}
+
+    def find(self, x: Hashable) -> Hashable:
+        parent = self._parent
+        if x not in parent:
+            parent[x] = x
+            self._size[x] = 1
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: Hashable, b: Hashable) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size[rb]
+
+    def groups(self) -> list[list[Hashable]]:
+        """Sets with 2+ members."""
+        out: dict[Hashable, list[Hashable]] = {}
+        for x in self._parent:
+            out.setdefault(self.find(x), []).append(x)
+        return [members for members in out.values() if len(members) > 1]
@@ -0,0 +1,107 @@
+"""Lessons snapshot — a bash-sourceable copy of what surfacing needs.
+
+Hooks on the PreToolUse hot path cannot afford to fork sqlite3 on every
+fire. After every write subcommand, `claude-toolkit lessons` regenerates
+this file next to lessons.db (`lessons-snapshot.sh` for the default DB). A
+hook sources it once and resolves matches with bash builtins only:
+
+    LESSON_IDS      indexed array of active lesson ids in surfacing order
+                    (tier = 'key' first, then newest date, then id)
+    LESSON_TEXT     [lesson id] -> text
+    LESSON_SCOPE    [lesson id] -> global | project
+    LESSON_PROJECT  [lesson id] -> project id
+    LESSON_TAGS     [lesson id] -> space-separated tag ids
+    TAG_NAME        [tag id] -> name (active tags only)
+    KEYWORD_TAGS    [keyword token] -> space-separated active tag ids
+
+Freshness check: the snapshot is current when it is newer than both
+lessons.db and lessons.db-wal (writes land in the WAL first):
+
+    [[ $snap -nt $db && ( ! -e $db-wal || $snap -nt $db-wal ) ]]
+
+Otherwise fall back to `claude-toolkit lessons match` or sqlite3.
+
+Usage:
+    claude-toolkit lessons snapshot [--path PATH]
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+import sqlite3
+import tempfile
+from pathlib import Path
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_path(db_path: Path) -> Path:
+    """Default snapshot location for a lessons DB: `<stem>-snapshot.sh` beside it."""
+    return db_path.with_name(f"{db_path.stem}-snapshot.sh")
+
+
+def _assoc(name: str, items: dict) -> str:
+    body = " ".join(f"[{shlex.quote(str(k))}]={shlex.quote(str(v))}" for k, v in items.items())
+    return f"declare -gA {name}=({body})\n"
+
+
+def render_snapshot(conn: sqlite3.Connection) -> str:
+    """Render the snapshot of active lessons and tag keywords as bash source."""
+    lessons = conn.execute(
+        """SELECT id, text, scope, project_id FROM lessons WHERE active = 1
+           ORDER BY tier = 'key' DESC, date DESC, id"""
+    ).fetchall()
+    lesson_tags: dict[str, list[str]] = {}
+    for lesson_id, tag_id in conn.execute(
+        """SELECT lt.lesson_id, lt.tag_id FROM lesson_tags lt
+           JOIN lessons l ON l.id = lt.lesson_id
+           WHERE l.active = 1 ORDER BY lt.tag_id"""
+    ):
+        lesson_tags.setdefault(lesson_id, []).append(str(tag_id))
+    tag_names = dict(conn.execute(
+        "SELECT id, name FROM tags WHERE status = 'active' ORDER BY id"
+    ).fetchall())
+    keyword_tags: dict[str, list[str]] = {}
+    for keyword, tag_id in conn.execute(
+        """SELECT tk.keyword, tk.tag_id FROM tag_keywords tk
+           JOIN tags t ON t.id = tk.tag_id
+           WHERE t.status = 'active' ORDER BY tk.keyword, tk.tag_id"""
+    ):
+        keyword_tags.setdefault(keyword, []).append(str(tag_id))
+
+    ids = " ".join(shlex.quote(row[0]) for row in lessons)
+    return "".join([
+        "# Generated by `claude-toolkit lessons` — do not edit.\n",
+        f"LESSONS_SNAPSHOT_VERSION={SNAPSHOT_VERSION}\n",
+        f"declare -ga LESSON_IDS=({ids})\n",
+        _assoc("LESSON_TEXT", {r[0]: r[1] for r in lessons}),
+        _assoc("LESSON_SCOPE", {r[0]: r[2] for r in lessons}),
+        _assoc("LESSON_PROJECT", {r[0]: r[3] for r in lessons}),
+        _assoc("LESSON_TAGS", {k: " ".join(v) for k, v in lesson_tags.items()}),
+        _assoc("TAG_NAME", tag_names),
+        _assoc("KEYWORD_TAGS", {k: " ".join(v) for k, v in keyword_tags.items()}),
+    ])
+
+
+def write_text_atomic(path: Path, content: str) -> Path:
+    """Atomically (re)write a text file: temp file in the same dir, then rename.
+
+    Readers see the old or the new content, never a partial write. Shared by
+    the snapshot and the lessons DB's project-resolution cache.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def write_snapshot(conn: sqlite3.Connection, path: Path) -> Path:
+    """Render and atomically write the snapshot."""
+    return write_text_atomic(path, render_snapshot(conn))
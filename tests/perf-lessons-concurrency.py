@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Stress harness for concurrent lessons.db writers and readers.
+
+Spawns N writer and M reader processes against one lessons.db (a seeded
+temp copy by default) for a fixed duration. Writers add lessons the way
+`lessons add` does (BEGIN IMMEDIATE, allocate_lesson_id, insert_lesson);
+readers run the surfacing and FTS queries hooks run. Reports throughput,
+lock-wait latency (time to acquire the write lock) and read latency, plus
+any "database is locked" failures that survived the busy timeout and
+retries.
+
+Usage:
+    uv run python tests/perf-lessons-concurrency.py                  # 4 writers, 4 readers, 5 s
+    uv run python tests/perf-lessons-concurrency.py -w 16 -r 8 -d 10
+    uv run python tests/perf-lessons-concurrency.py --db /tmp/copy.db
+    uv run python tests/perf-lessons-concurrency.py --json           # machine-readable report
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cli.lessons.db import (  # noqa: E402
+    allocate_lesson_id,
+    get_or_create_tag,
+    init_lessons_db,
+    insert_lesson,
+    insert_lessons_bulk,
+    match_lessons,
+    transaction,
+)
+
+TAGS = {"git": "rebase,commit,branch", "bash": "grep,sed,pipe", "python": "pytest,import,venv"}
+READ_CONTEXTS = ["git rebase --onto main", "grep -rn pattern | sed", "pytest -q tests/"]
+
+
+def seed(path: Path, lessons: int) -> None:
+    conn = init_lessons_db(path)
+    for name, keywords in TAGS.items():
+        get_or_create_tag(conn, name, keywords=keywords)
+    names = list(TAGS)
+    insert_lessons_bulk(conn, (
+        {"lesson_id": f"seed_{n:05d}", "project_id": "bench", "date": "2026-03-24",
+         "text": f"seed lesson {n} about {names[n % 3]} workflows", "tag_names": [names[n % 3]]}
+        for n in range(lessons)
+    ))
+    conn.close()
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ms = sorted(s * 1000 for s in samples)
+    cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {"p50": round(cuts[49], 2), "p95": round(cuts[94], 2), "p99": round(cuts[98], 2), "max": round(ms[-1], 2)}
+
+
+def writer(path: str, worker: int, start: float, duration: float) -> dict:
+    conn = init_lessons_db(Path(path))
+    waits: list[float] = []
+    errors = 0
+    time.sleep(max(0.0, start - time.time()))
+    n = 0
+    while time.time() < start + duration:
+        t0 = time.perf_counter()
+        try:
+            with transaction(conn):
+                waits.append(time.perf_counter() - t0)
+                lesson_id = allocate_lesson_id(conn, f"bench-w{worker}")
+                insert_lesson(conn, lesson_id=lesson_id, project_id="bench", date="2026-03-24",
+                              text=f"writer {worker} lesson {n} about git rebase", tag_names=["git"])
+        except sqlite3.OperationalError:
+            errors += 1
+        n += 1
+    conn.close()
+    return {"role": "writer", "ops": len(waits), "errors": errors, "samples": waits}
+
+
+def reader(path: str, worker: int, start: float, duration: float) -> dict:
+    conn = init_lessons_db(Path(path))
+    latencies: list[float] = []
+    errors = 0
+    time.sleep(max(0.0, start - time.time()))
+    n = 0
+    while time.time() < start + duration:
+        t0 = time.perf_counter()
+        try:
+            match_lessons(conn, READ_CONTEXTS[n % len(READ_CONTEXTS)], project="bench")
+            conn.execute("SELECT rowid FROM lessons_fts WHERE lessons_fts MATCH 'rebase' LIMIT 20").fetchall()
+            latencies.append(time.perf_counter() - t0)
+        except sqlite3.OperationalError:
+            errors += 1
+        n += 1
+    conn.close()
+    return {"role": "reader", "ops": len(latencies), "errors": errors, "samples": latencies}
+
+
+def run(path: Path, writers: int, readers: int, duration: float) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    start = time.time() + 1.0  # let every process import and connect first
+    jobs = [(writer, w) for w in range(writers)] + [(reader, r) for r in range(readers)]
+    with ctx.Pool(len(jobs)) as pool:
+        pending = [pool.apply_async(fn, (str(path), i, start, duration)) for fn, i in jobs]
+        results = [p.get() for p in pending]
+
+    report: dict = {"writers": writers, "readers": readers, "duration_s": duration}
+    for role, metric in (("writer", "lock_wait_ms"), ("reader", "latency_ms")):
+        rows = [r for r in results if r["role"] == role]
+        ops = sum(r["ops"] for r in rows)
+        report[f"{role}s_total"] = {
+            "ops": ops,
+            "ops_per_s": round(ops / duration, 1),
+            "errors": sum(r["errors"] for r in rows),
+            metric: _percentiles([s for r in rows for s in r["samples"]]),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-w", "--writers", type=int, default=4)
+    parser.add_argument("-r", "--readers", type=int, default=4)
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="Seconds (default: 5)")
+    parser.add_argument("--seed-lessons", type=int, default=500, help="Lessons in the seeded temp DB")
+    parser.add_argument("--db", type=Path, default=None, help="Existing DB to hammer (writes into it!)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="lessons-bench-") as tmp:
+        path = args.db
+        if path is None:
+            path = Path(tmp) / "lessons.db"
+            seed(path, args.seed_lessons)
+        report = run(path, args.writers, args.readers, args.duration)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    w, r = report["writers_total"], report["readers_total"]
+    print(f"{args.writers} writers / {args.readers} readers, {args.duration:g}s")
+    print(f"  writes: {w['ops']} ({w['ops_per_s']}/s), errors: {w['errors']}")
+    print("    lock wait ms  " + "  ".join(f"{k}={v}" for k, v in w["lock_wait_ms"].items()))
+    print(f"  reads:  {r['ops']} ({r['ops_per_s']}/s), errors: {r['errors']}")
+    print("    latency ms    " + "  ".join(f"{k}={v}" for k, v in r["latency_ms"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Scaling benchmark for lessons.db over synthetic corpora of 10²–10⁵ lessons.
+
+The live DB holds a handful of active lessons, so nothing there shows how
+queries grow with the corpus. This generates a deterministic synthetic
+lessons.db per size (lesson count, tag count, tags per lesson and keyword
+density are configurable), then times each operation a few times at every
+size:
+
+    insert       insert_lesson (one new lesson per round)
+    update       update_lesson (text of a random existing lesson)
+    search       cmd_search (FTS5, json output)
+    list_tags    cmd_list --tags (two tags, json output)
+    clusters     cmd_clusters (json output)
+    health       cmd_health (json output)
+    surface      surface_lessons (tag-keyword context, project bonus)
+
+Every operation runs once untimed before the timed rounds, so one-off work
+(connection warm-up, MinHash signatures for clusters) is not counted. The
+report gives the median and minimum per size and a log-log growth exponent
+per operation (1.0 = linear). Write it with -o and diff two runs with
+--compare to catch regressions: an operation fails when it got slower than
+--max-ratio at any size (timings under --min-ms are too noisy to compare)
+or its exponent grew by more than --max-exponent-delta.
+
+Usage:
+    uv run python tests/perf-lessons-scaling.py                       # 10², 10³, 10⁴
+    uv run python tests/perf-lessons-scaling.py --sizes 100,1000,10000,100000
+    uv run python tests/perf-lessons-scaling.py -o before.json
+    uv run python tests/perf-lessons-scaling.py -o after.json --compare before.json
+    uv run python tests/perf-lessons-scaling.py --ops search,surface --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cli.lessons.db import (  # noqa: E402
+    build_parser,
+    close_connections,
+    cmd_clusters,
+    cmd_health,
+    cmd_list,
+    cmd_search,
+    get_or_create_tag,
+    init_lessons_db,
+    insert_lesson,
+    insert_lessons_bulk,
+    surface_lessons,
+    update_lesson,
+)
+
+DEFAULT_SIZES = (100, 1_000, 10_000)
+OPS = ("insert", "update", "search", "list_tags", "clusters", "health", "surface")
+PROJECTS = ("alpha", "beta", "gamma", "delta")
+TIERS = ("recent", "recent", "recent", "key", "historical")
+KEYWORDS_PER_TAG = 3
+WORDS_PER_LESSON = 24
+FILLER = (
+    "check", "before", "after", "always", "never", "output", "config", "file", "path",
+    "error", "value", "run", "instead", "use", "avoid", "when", "the", "with", "from",
+    "state", "cache", "retry", "order", "flag", "default", "quote", "escape", "parse",
+)
+
+
+def generate_corpus(
+    path: Path,
+    lessons: int,
+    *,
+    tags: int = 40,
+    tags_per_lesson: int = 3,
+    keyword_density: float = 0.2,
+    seed: int = 0,
+) -> dict[str, list[str]]:
+    """Write a synthetic lessons.db at path. Returns {tag name: keywords}.
+
+    Each tag gets KEYWORDS_PER_TAG keywords; each lesson gets tags_per_lesson
+    distinct tags (skewed towards low-numbered tags, like real usage) and a
+    WORDS_PER_LESSON-word text in which keyword_density of the words are
+    keywords of its own tags and the rest are filler.
+    """
+    rng = random.Random(seed)
+    vocab = {f"tag{t:03d}": [f"kw{t:03d}{k}" for k in "abc"[:KEYWORDS_PER_TAG]] for t in range(tags)}
+    names = list(vocab)
+    weights = [1 / (rank + 1) for rank in range(tags)]
+
+    conn = init_lessons_db(path)
+    for name, keywords in vocab.items():
+        get_or_create_tag(conn, name, keywords=",".join(keywords))
+
+    def lesson(n: int) -> dict:
+        chosen: list[str] = []
+        while len(chosen) < min(tags_per_lesson, tags):
+            name = rng.choices(names, weights)[0]
+            if name not in chosen:
+                chosen.append(name)
+        pool = [kw for name in chosen for kw in vocab[name]]
+        words = [
+            rng.choice(pool) if rng.random() < keyword_density else rng.choice(FILLER)
+            for _ in range(WORDS_PER_LESSON)
+        ]
+        return {
+            "lesson_id": f"syn_{n:06d}",
+            "project_id": PROJECTS[n % len(PROJECTS)],
+            "date": f"2026-{1 + n % 12:02d}-{1 + n % 28:02d}",
+            "text": f"lesson {n}: " + " ".join(words),
+            "tag_names": chosen,
+            "tier": TIERS[n % len(TIERS)],
+            "active": n % 10 != 0,
+            "scope": "project" if n % 7 == 0 else "global",
+        }
+
+    insert_lessons_bulk(conn, (lesson(n) for n in range(lessons)))
+    conn.execute("ANALYZE")
+    conn.close()
+    return vocab
+
+
+def _cli(fn: Callable[[argparse.Namespace], None], db_path: Path, *argv: str) -> Callable[[], None]:
+    args = build_parser().parse_args(["--db", str(db_path), "--format", "json", *argv])
+
+    def run() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(args)
+
+    return run
+
+
+def _operations(
+    db_path: Path, vocab: dict[str, list[str]], lessons: int, seed: int
+) -> tuple[dict[str, Callable[[], None]], sqlite3.Connection]:
+    rng = random.Random(seed + 1)
+    conn = init_lessons_db(db_path)
+    names = list(vocab)
+    counter = iter(range(10**9))
+
+    def insert() -> None:
+        name = rng.choice(names)
+        insert_lesson(conn, lesson_id=f"bench_{next(counter):06d}", project_id="alpha",
+                      date="2026-06-01", text=f"bench lesson {' '.join(vocab[name])}", tag_names=[name])
+
+    def update() -> None:
+        n = rng.randrange(lessons)
+        update_lesson(conn, f"syn_{n:06d}", text=f"lesson {n}: updated {rng.random():.6f}")
+
+    context = " ".join(vocab[names[0]][:1] + vocab[names[1]][:1] + ["git", "status"])
+
+    def surface() -> None:
+        surface_lessons(conn, context, project="alpha")
+
+    return {
+        "insert": insert,
+        "update": update,
+        "search": _cli(cmd_search, db_path, "search", f"{vocab[names[0]][0]} {FILLER[0]}", "--limit", "20"),
+        "list_tags": _cli(cmd_list, db_path, "list", "--tags", f"{names[0]},{names[1]}"),
+        "clusters": _cli(cmd_clusters, db_path, "clusters", "--top", "10"),
+        "health": _cli(cmd_health, db_path, "health"),
+        "surface": surface,
+    }, conn
+
+
+def _time(fn: Callable[[], None], rounds: int) -> dict[str, float]:
+    fn()  # warm-up, not counted
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {"median_ms": round(statistics.median(samples) * 1000, 3),
+            "min_ms": round(min(samples) * 1000, 3)}
+
+
+def growth_exponent(points: list[tuple[int, float]]) -> float | None:
+    """Least-squares slope of log(time) over log(size); 1.0 is linear."""
+    pts = [(math.log(n), math.log(t)) for n, t in points if n > 0 and t > 0]
+    if len(pts) < 2:
+        return None
+    mx = statistics.fmean(x for x, _ in pts)
+    my = statistics.fmean(y for _, y in pts)
+    denom = sum((x - mx) ** 2 for x, _ in pts)
+    if not denom:
+        return None
+    return round(sum((x - mx) * (y - my) for x, y in pts) / denom, 3)
+
+
+def run(sizes: list[int], ops: list[str], *, rounds: int, tags: int, tags_per_lesson: int,
+        keyword_density: float, seed: int) -> dict:
+    results: dict[str, dict[str, dict[str, float]]] = {op: {} for op in ops}
+    with tempfile.TemporaryDirectory(prefix="lessons-scaling-") as tmp:
+        for size in sizes:
+            db_path = Path(tmp) / f"lessons-{size}.db"
+            t0 = time.perf_counter()
+            vocab = generate_corpus(db_path, size, tags=tags, tags_per_lesson=tags_per_lesson,
+                                    keyword_density=keyword_density, seed=seed)
+            print(f"  {size:>7} lessons: generated in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+            operations, conn = _operations(db_path, vocab, size, seed)
+            for op in ops:
+                results[op][str(size)] = _time(operations[op], rounds)
+            conn.close()
+            close_connections()
+
+    return {
+        "params": {"sizes": sizes, "rounds": rounds, "tags": tags, "tags_per_lesson": tags_per_lesson,
+                   "keyword_density": keyword_density, "seed": seed},
+        "ops": {
+            op: {
+                "sizes": by_size,
+                "exponent": growth_exponent([(int(n), r["median_ms"]) for n, r in by_size.items()]),
+            }
+            for op, by_size in results.items()
+        },
+    }
+
+
+def compare(
+    report: dict, baseline: dict, *, max_ratio: float, max_exponent_delta: float, min_ms: float = 1.0
+) -> list[str]:
+    """Regressions of report against baseline, one human-readable line each.
+
+    Per-size ratios only count where the baseline median is at least min_ms;
+    below that, scheduler noise alone swings timings by 1.5x.
+    """
+    problems = []
+    for op, current in report["ops"].items():
+        before = baseline.get("ops", {}).get(op)
+        if before is None:
+            continue
+        for size, result in current["sizes"].items():
+            old = before["sizes"].get(size)
+            if old and old["median_ms"] >= min_ms:
+                ratio = result["median_ms"] / old["median_ms"]
+                if ratio > max_ratio:
+                    problems.append(f"{op} @ {size}: {old['median_ms']}ms → {result['median_ms']}ms ({ratio:.2f}x)")
+        if current["exponent"] is not None and before.get("exponent") is not None:
+            delta = current["exponent"] - before["exponent"]
+            if delta > max_exponent_delta:
+                problems.append(f"{op}: growth exponent {before['exponent']} → {current['exponent']}")
+    return problems
+
+
+def _csv(kind: Callable[[str], object]) -> Callable[[str], list]:
+    return lambda value: [kind(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=_csv(int), default=list(DEFAULT_SIZES),
+                        help="Comma-separated lesson counts (default: 100,1000,10000)")
+    parser.add_argument("--ops", type=_csv(str), default=list(OPS), help=f"Subset of: {','.join(OPS)}")
+    parser.add_argument("-n", "--rounds", type=int, default=5, help="Timed rounds per op and size (default: 5)")
+    parser.add_argument("--tags", type=int, default=40, help="Distinct tags (default: 40)")
+    parser.add_argument("--tags-per-lesson", type=int, default=3, help="Tags per lesson (default: 3)")
+    parser.add_argument("--keyword-density", type=float, default=0.2,
+                        help="Fraction of lesson words that are tag keywords (default: 0.2)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=Path, help="Write the JSON report here")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON report; exit 1 on regression")
+    parser.add_argument("--max-ratio", type=float, default=1.5, help="Allowed slowdown per size (default: 1.5)")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="Ignore per-size ratios below this baseline median (default: 1.0)")
+    parser.add_argument("--max-exponent-delta", type=float, default=0.25,
+                        help="Allowed growth-exponent increase (default: 0.25)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.ops) - set(OPS))
+    if unknown:
+        parser.error(f"unknown op(s): {', '.join(unknown)}")
+
+    report = run(sorted(set(args.sizes)), args.ops, rounds=args.rounds, tags=args.tags,
+                 tags_per_lesson=args.tags_per_lesson, keyword_density=args.keyword_density, seed=args.seed)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        sizes = [str(s) for s in report["params"]["sizes"]]
+        print(f"{'op':<10}" + "".join(f"{s:>12}" for s in sizes) + f"{'exponent':>10}")
+        for op, result in report["ops"].items():
+            cells = "".join(f"{result['sizes'][s]['median_ms']:>10.2f}ms" for s in sizes)
+            exponent = "—" if result["exponent"] is None else f"{result['exponent']:.2f}"
+            print(f"{op:<10}{cells}{exponent:>10}")
+
+    if args.compare:
+        problems = compare(report, json.loads(args.compare.read_text()),
+                           max_ratio=args.max_ratio, max_exponent_delta=args.max_exponent_delta,
+                           min_ms=args.min_ms)
+        for line in problems:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,14 @@
 from __future__ import annotations
 
 import argparse
+import json
+import os
+import random
 import sqlite3
+import subprocess
+import sys
+import threading
+import time
 from pathlib import Path
 
 import pytest
@@ -11,18 +18,51 @@ import pytest
 from datetime import datetime, timezone
 
 from cli.lessons.db import (
+    SCHEMA_VERSION,
+    allocate_lesson_id,
+    archive_lessons,
+    archive_path,
+    attach_archive,
+    build_parser,
+    cmd_add,
+    cmd_crystallize,
     cmd_deactivate,
     cmd_get,
+    cmd_health,
+    cmd_list,
+    cmd_migrate,
     cmd_promote,
+    cmd_reindex_counts,
+    cmd_search,
+    close_connections,
     ensure_project,
+    find_clusters,
+    find_duplicate_pairs,
+    find_near_duplicates,
+    fts_bulk_mode,
+    get_connection,
     get_metadata,
     get_or_create_tag,
+    export_records,
+    import_records,
     init_lessons_db,
+    lesson_stats_drift,
+    plan_list_query,
+    read_lesson_stats,
+    recompute_lesson_stats,
     insert_lesson,
+    insert_lessons_bulk,
+    match_lessons,
+    rebuild_keyword_index,
+    refresh_signatures,
+    run_batch,
     set_metadata,
+    surface_lessons,
     tag_lesson,
+    transaction,
     update_lesson,
 )
+import cli.lessons.db as lessons_db
 
 
 @pytest.fixture
@@ -96,6 +136,99 @@ class TestInitDb:
         conn2.close()
 
 
+class TestSchemaVersion:
+    def test_fresh_db_at_current_version(self, db: sqlite3.Connection) -> None:
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+    def test_warm_open_skips_migrations(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        path = tmp_path / "warm.db"
+        init_lessons_db(path).close()
+
+        def _fail(conn: sqlite3.Connection) -> None:
+            raise AssertionError("warm open ran migrations")
+
+        monkeypatch.setattr(lessons_db, "_migrate", _fail)
+        conn = init_lessons_db(path)
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        conn.close()
+
+    def test_warm_open_executes_no_ddl(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        path = tmp_path / "warm.db"
+        init_lessons_db(path).close()
+        statements: list[str] = []
+        real_connect = sqlite3.connect
+
+        def _connect(*args, **kwargs):
+            conn = real_connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(sqlite3, "connect", _connect)
+        init_lessons_db(path).close()
+        assert not any("CREATE" in s for s in statements)
+
+    def test_pending_migrations_applied_in_order(self, tmp_path: Path) -> None:
+        path = tmp_path / "legacy.db"
+        conn = init_lessons_db(path)
+        conn.execute("DROP TABLE tag_keywords")
+        conn.execute("DROP TRIGGER lesson_tags_count_ai")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        conn = init_lessons_db(path)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+        assert {"tag_keywords", "lesson_tags_count_ai"} <= names
+        conn.close()
+
+    def test_failed_migration_rolls_back(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        def _boom(conn: sqlite3.Connection) -> None:
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(lessons_db, "MIGRATIONS", [*lessons_db.MIGRATIONS, _boom])
+        monkeypatch.setattr(lessons_db, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+        path = tmp_path / "fresh.db"
+        with pytest.raises(RuntimeError):
+            init_lessons_db(path)
+        conn = sqlite3.connect(path)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'lessons'").fetchone()
+        conn.close()
+
+
+class TestConnectionCache:
+    def test_reused_and_tuned(self, tmp_path: Path) -> None:
+        path = tmp_path / "cached.db"
+        conn = get_connection(path)
+        try:
+            assert get_connection(path) is conn
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == lessons_db.BUSY_TIMEOUT_MS
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        finally:
+            close_connections()
+
+    def test_replaced_file_reopens(self, tmp_path: Path) -> None:
+        path = tmp_path / "cached.db"
+        first = get_connection(path)
+        for p in tmp_path.glob("cached.db*"):
+            p.unlink()
+        second = get_connection(path)
+        try:
+            assert second is not first
+            assert second.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        finally:
+            close_connections()
+
+    def test_close_connections(self, tmp_path: Path) -> None:
+        conn = get_connection(tmp_path / "cached.db")
+        close_connections()
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
 # ---------------------------------------------------------------------------
 # Project helpers
 # ---------------------------------------------------------------------------
@@ -371,6 +504,317 @@ class TestLessons:
             )
 
 
+# ---------------------------------------------------------------------------
+# Unit of work / bulk insert
+# ---------------------------------------------------------------------------
+
+
+def _bulk_item(n: int, **overrides: object) -> dict:
+    item = {
+        "lesson_id": f"proj_20260324T1200_{n:03d}",
+        "project_id": "proj",
+        "date": "2026-03-24",
+        "text": f"Lesson {n}",
+        "tag_names": ["shared"],
+    }
+    item.update(overrides)
+    return item
+
+
+class TestAllocateLessonId:
+    NOW = datetime(2026, 3, 24, 12, 0, tzinfo=timezone.utc)
+
+    def _add(self, conn: sqlite3.Connection, lesson_id: str) -> None:
+        insert_lesson(conn, lesson_id=lesson_id, project_id="proj", date="2026-03-24",
+                      text=f"text of {lesson_id}", tag_names=["x"])
+
+    def test_sequential_per_minute(self, db: sqlite3.Connection) -> None:
+        later = datetime(2026, 3, 24, 12, 1, tzinfo=timezone.utc)
+        assert [allocate_lesson_id(db, "proj", now=self.NOW) for _ in range(2)] == [
+            "proj_20260324T1200_001", "proj_20260324T1200_002",
+        ]
+        assert allocate_lesson_id(db, "proj", now=later) == "proj_20260324T1201_001"
+        assert allocate_lesson_id(db, "other", now=self.NOW) == "other_20260324T1200_001"
+
+    def test_skips_ids_taken_by_hand(self, db: sqlite3.Connection) -> None:
+        self._add(db, "proj_20260324T1200_001")
+        assert allocate_lesson_id(db, "proj", now=self.NOW) == "proj_20260324T1200_002"
+
+    def test_migration_seeds_from_existing_ids(self, tmp_path: Path) -> None:
+        path = tmp_path / "legacy.db"
+        conn = init_lessons_db(path)
+        for lesson_id in ("proj_20260324T1200_001", "proj_20260324T1200_007", "hand-made"):
+            self._add(conn, lesson_id)
+        conn.execute("DROP TABLE lesson_id_sequences")
+        conn.execute("PRAGMA user_version = 5")
+        conn.commit()
+        conn.close()
+
+        conn = init_lessons_db(path)
+        assert conn.execute("SELECT * FROM lesson_id_sequences").fetchall() == [("proj_20260324T1200", 7)]
+        assert allocate_lesson_id(conn, "proj", now=self.NOW) == "proj_20260324T1200_008"
+        conn.close()
+
+    def test_crystallize_allocates(self, db: sqlite3.Connection, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = self.NOW
+
+        class _FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz: object = None) -> datetime:  # type: ignore[override]
+                return now
+
+        monkeypatch.setattr(lessons_db, "datetime", _FrozenDatetime)
+        for lesson_id in ("a", "b", "c", "d"):
+            self._add(db, lesson_id)
+        db.close()
+        for ids in ("a,b", "c,d"):
+            cmd_crystallize(argparse.Namespace(
+                db_path=tmp_path / "test-lessons.db", ids=ids, text=f"merged {ids}", tags="",
+            ))
+        rows = get_connection(tmp_path / "test-lessons.db").execute(
+            "SELECT id FROM lessons WHERE crystallized_from IS NOT NULL ORDER BY id"
+        ).fetchall()
+        assert [r[0] for r in rows] == ["proj_20260324T1200_001", "proj_20260324T1200_002"]
+
+    def test_concurrent_writers_never_collide(self, db: sqlite3.Connection, tmp_path: Path) -> None:
+        db.close()
+        path = tmp_path / "test-lessons.db"
+        ids: list[str] = []
+
+        def writer() -> None:
+            conn = init_lessons_db(path)
+            for _ in range(15):
+                with transaction(conn):
+                    lesson_id = allocate_lesson_id(conn, "proj", now=self.NOW)
+                    self._add(conn, lesson_id)
+                ids.append(lesson_id)
+            conn.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(set(ids)) == 60
+        assert max(ids) == "proj_20260324T1200_060"
+
+
+class TestTransaction:
+    @pytest.fixture
+    def db(self, _wipe_db: sqlite3.Connection) -> sqlite3.Connection:
+        return _wipe_db
+
+    def test_single_commit_for_many_helpers(self, db: sqlite3.Connection) -> None:
+        statements: list[str] = []
+        db.set_trace_callback(statements.append)
+        try:
+            with transaction(db):
+                for n in range(1, 4):
+                    insert_lesson(db, **_bulk_item(n))
+                update_lesson(db, "proj_20260324T1200_001", tier="key")
+                set_metadata(db, "k", "v")
+        finally:
+            db.set_trace_callback(None)
+        assert statements.count("COMMIT") == 1
+
+    def test_rollback_on_error(self, db: sqlite3.Connection) -> None:
+        with pytest.raises(RuntimeError):
+            with transaction(db):
+                insert_lesson(db, **_bulk_item(1))
+                raise RuntimeError("boom")
+        assert db.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 0
+        assert db.execute("SELECT COUNT(*) FROM projects").fetchone()[0] == 0
+
+    def test_nested_blocks_join_outer(self, db: sqlite3.Connection) -> None:
+        with pytest.raises(RuntimeError):
+            with transaction(db):
+                with transaction(db):
+                    insert_lesson(db, **_bulk_item(1))
+                raise RuntimeError("boom")
+        assert db.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 0
+
+
+class TestBusyHandling:
+    @pytest.fixture
+    def path(self, db: sqlite3.Connection, tmp_path: Path) -> Path:
+        db.close()
+        return tmp_path / "test-lessons.db"
+
+    def _holder(self, path: Path) -> sqlite3.Connection:
+        conn = init_lessons_db(path)
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def test_write_paths_begin_immediate(self, path: Path) -> None:
+        conn = init_lessons_db(path)
+        insert_lesson(conn, lesson_id="l1", project_id="proj", date="2026-03-24", text="t", tag_names=[])
+        statements: list[str] = []
+        conn.set_trace_callback(statements.append)
+        lessons_db.promote_lesson(conn, "l1")
+        lessons_db.deactivate_lesson(conn, "l1")
+        lessons_db.absorb_lesson(conn, "l1", "CLAUDE.md")
+        conn.close()
+        assert statements.count("BEGIN IMMEDIATE") == 3
+        assert "BEGIN" not in statements
+
+    def test_retries_until_lock_released(self, path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(lessons_db, "BUSY_BACKOFF_MS", 100)
+        monkeypatch.setattr(random, "uniform", lambda low, high: high)  # first retry after 100 ms
+        locked = threading.Event()
+
+        def hold_briefly() -> None:
+            holder = self._holder(path)
+            locked.set()
+            time.sleep(0.05)
+            holder.close()
+
+        thread = threading.Thread(target=hold_briefly)
+        thread.start()
+        locked.wait()
+        waiter = init_lessons_db(path)
+        waiter.execute("PRAGMA busy_timeout = 0")
+        try:
+            with transaction(waiter):
+                set_metadata(waiter, "k", "v")
+        finally:
+            thread.join()
+        assert get_metadata(waiter, "k") == "v"
+        waiter.close()
+
+    def test_gives_up_after_bounded_retries(self, path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        sleeps: list[float] = []
+        monkeypatch.setattr(time, "sleep", sleeps.append)
+        holder = self._holder(path)
+        waiter = init_lessons_db(path)
+        waiter.execute("PRAGMA busy_timeout = 0")
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            with transaction(waiter):
+                pass
+        holder.close()
+        waiter.close()
+        assert len(sleeps) == lessons_db.BUSY_RETRIES
+        assert all(0 <= d <= lessons_db.BUSY_BACKOFF_MS * 2**i / 1000 for i, d in enumerate(sleeps))
+
+    def test_busy_timeout_from_env(self, path: Path) -> None:
+        code = "import cli.lessons.db as m; print(m.init_lessons_db(m.Path(__import__('sys').argv[1])).execute('PRAGMA busy_timeout').fetchone()[0])"
+        env = {**os.environ, "CLAUDE_ANALYTICS_LESSONS_BUSY_TIMEOUT_MS": "1234"}
+        out = subprocess.run([sys.executable, "-c", code, str(path)], capture_output=True, text=True,
+                             env=env, check=True, cwd=Path(__file__).resolve().parent.parent).stdout
+        assert out.strip() == "1234"
+
+
+class TestInsertLessonsBulk:
+    @pytest.fixture
+    def db(self, _wipe_db: sqlite3.Connection) -> sqlite3.Connection:
+        return _wipe_db
+
+    def test_inserts_all_with_tags_and_counts(self, db: sqlite3.Connection) -> None:
+        items = [_bulk_item(n) for n in range(1, 1201)]
+        items[0] = _bulk_item(1, tag_names=["shared", "solo"], active=False, project_id="other")
+        assert insert_lessons_bulk(db, iter(items)) == 1200
+        assert db.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 1200
+        assert db.execute("SELECT COUNT(*) FROM lesson_tags").fetchone()[0] == 1201
+        counts = dict(db.execute("SELECT name, lesson_count FROM tags").fetchall())
+        assert counts == {"shared": 1199, "solo": 0}
+        assert {r[0] for r in db.execute("SELECT id FROM projects")} == {"proj", "other"}
+
+    def test_duplicate_rolls_back_whole_batch(self, db: sqlite3.Connection) -> None:
+        with pytest.raises(sqlite3.IntegrityError):
+            insert_lessons_bulk(db, [_bulk_item(1), _bulk_item(2), _bulk_item(1)])
+        assert db.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 0
+
+
+class TestCmdMigrate:
+    def test_migrates_and_skips_existing(self, db: sqlite3.Connection, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        insert_lesson(db, **_bulk_item(1))
+        db.close()
+        learned = tmp_path / "learned.json"
+        learned.write_text(json.dumps({"lessons": [
+            {"id": "proj_20260324T1200_001", "project": "proj", "date": "2026-03-24",
+             "tier": "recent", "text": "already there", "category": "gotcha"},
+            {"id": "proj_20260324T1200_002", "project": "proj", "date": "2026-03-24",
+             "tier": "key", "text": "run pytest before push", "category": "pattern",
+             "flags": ["recurring"]},
+            {"id": "proj_20260324T1200_003", "project": "proj", "date": "2026-03-24",
+             "tier": "historical", "text": "old hook note", "category": "gotcha"},
+        ]}))
+        cmd_migrate(argparse.Namespace(db_path=tmp_path / "test-lessons.db", json_path=str(learned)))
+        assert "Migrated 2 lessons" in capsys.readouterr().out
+
+        conn = init_lessons_db(tmp_path / "test-lessons.db")
+        rows = dict(conn.execute("SELECT id, active FROM lessons").fetchall())
+        tags = {
+            r[0] for r in conn.execute(
+                "SELECT t.name FROM tags t JOIN lesson_tags lt ON lt.tag_id = t.id "
+                "WHERE lt.lesson_id = 'proj_20260324T1200_002'"
+            )
+        }
+        conn.close()
+        assert rows == {
+            "proj_20260324T1200_001": 1,
+            "proj_20260324T1200_002": 1,
+            "proj_20260324T1200_003": 0,
+        }
+        assert tags == {"pattern", "recurring", "testing"}
+
+
+# ---------------------------------------------------------------------------
+# Incremental tag counts (triggers)
+# ---------------------------------------------------------------------------
+
+
+class TestTagCountTriggers:
+    @pytest.fixture
+    def db(self, _wipe_db: sqlite3.Connection) -> sqlite3.Connection:
+        insert_lesson(_wipe_db, **_bulk_item(1, tag_names=["a", "b"]))
+        insert_lesson(_wipe_db, **_bulk_item(2, tag_names=["a"]))
+        insert_lesson(_wipe_db, **_bulk_item(3, tag_names=["a"], active=False))
+        return _wipe_db
+
+    @staticmethod
+    def _counts(db: sqlite3.Connection) -> dict[str, int]:
+        return dict(db.execute("SELECT name, lesson_count FROM tags").fetchall())
+
+    def test_insert_counts_active_only(self, db: sqlite3.Connection) -> None:
+        assert self._counts(db) == {"a": 2, "b": 1}
+
+    def test_deactivate_and_reactivate(self, db: sqlite3.Connection) -> None:
+        update_lesson(db, "proj_20260324T1200_001", active=0)
+        assert self._counts(db) == {"a": 1, "b": 0}
+        update_lesson(db, "proj_20260324T1200_001", active=0)
+        assert self._counts(db) == {"a": 1, "b": 0}
+        update_lesson(db, "proj_20260324T1200_003", active=1)
+        assert self._counts(db) == {"a": 2, "b": 0}
+
+    def test_delete_lesson_and_link(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM lessons WHERE id = 'proj_20260324T1200_001'")
+        assert self._counts(db) == {"a": 1, "b": 0}
+        db.execute("DELETE FROM lesson_tags WHERE lesson_id = 'proj_20260324T1200_002'")
+        assert self._counts(db) == {"a": 0, "b": 0}
+
+    def test_deactivate_touches_only_own_tags(self, db: sqlite3.Connection) -> None:
+        statements: list[str] = []
+        db.set_trace_callback(statements.append)
+        try:
+            update_lesson(db, "proj_20260324T1200_002", active=0)
+        finally:
+            db.set_trace_callback(None)
+        assert not any("COUNT(*)" in st for st in statements)
+
+    def test_reindex_counts_repairs_drift(self, db: sqlite3.Connection, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        path = tmp_path / "reindex.db"
+        conn = init_lessons_db(path)
+        insert_lesson(conn, **_bulk_item(1, tag_names=["a"]))
+        conn.execute("UPDATE tags SET lesson_count = 7")
+        conn.commit()
+        conn.close()
+        cmd_reindex_counts(argparse.Namespace(db_path=path))
+        assert "a" in capsys.readouterr().out
+        conn = init_lessons_db(path)
+        assert self._counts(conn) == {"a": 1}
+        conn.close()
+
+
 # ---------------------------------------------------------------------------
 # Tag lesson junction
 # ---------------------------------------------------------------------------
@@ -507,6 +951,47 @@ class TestFTS:
         assert len(rows) == 0
 
 
+class TestFtsMaintenance:
+    def _fts_blocks(self, db: sqlite3.Connection) -> tuple:
+        return db.execute("SELECT COUNT(*), SUM(length(block)) FROM lessons_fts_data").fetchone()
+
+    def _match(self, db: sqlite3.Connection, term: str) -> list[str]:
+        return [r[0] for r in db.execute(
+            "SELECT l.id FROM lessons_fts JOIN lessons l ON l.rowid = lessons_fts.rowid "
+            "WHERE lessons_fts MATCH ?", (term,),
+        )]
+
+    def test_non_text_update_leaves_fts_alone(self, db: sqlite3.Connection) -> None:
+        insert_lesson(db, lesson_id="a", project_id="p", date="2026-03-24", text="hello world", tag_names=["x"])
+        before = self._fts_blocks(db)
+        update_lesson(db, "a", active=0, tier="key")
+        assert self._fts_blocks(db) == before
+        update_lesson(db, "a", text="goodbye world")
+        assert self._match(db, "goodbye") == ["a"] and self._match(db, "hello") == []
+
+    def test_bulk_mode_rebuilds_once_and_restores_triggers(self, db: sqlite3.Connection) -> None:
+        def triggers() -> set[str]:
+            return {r[0] for r in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'lessons_fts_%'"
+            )}
+
+        expected = triggers()
+        with fts_bulk_mode(db):
+            assert triggers() == set()
+            insert_lessons_bulk(db, (_bulk_item(n, text=f"bulk lesson {n}") for n in range(5)))
+        assert triggers() == expected
+        assert len(self._match(db, "bulk")) == 5
+
+    def test_bulk_mode_failure_keeps_triggers(self, db: sqlite3.Connection) -> None:
+        with pytest.raises(RuntimeError):
+            with fts_bulk_mode(db):
+                insert_lessons_bulk(db, [_bulk_item(1)])
+                raise RuntimeError("boom")
+        assert db.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 0
+        insert_lesson(db, lesson_id="after", project_id="p", date="2026-03-24", text="still indexed", tag_names=["x"])
+        assert self._match(db, "indexed") == ["after"]
+
+
 # ---------------------------------------------------------------------------
 # Foreign key constraints
 # ---------------------------------------------------------------------------
@@ -581,6 +1066,400 @@ class TestCmdGet:
             cmd_get(args)
 
 
+# ---------------------------------------------------------------------------
+# Clusters (crystallization candidates)
+# ---------------------------------------------------------------------------
+
+
+class TestFindClusters:
+    def _add(self, db: sqlite3.Connection, lid: str, text: str, tags: list[str]) -> None:
+        insert_lesson(db, lesson_id=lid, project_id="proj", date="2026-03-24", text=text, tag_names=tags)
+
+    def test_chained_tag_overlap_forms_one_cluster(self, db: sqlite3.Connection) -> None:
+        self._add(db, "l1", "first lesson about rebasing", ["git", "rebase", "history"])
+        self._add(db, "l2", "second lesson on pushing", ["git", "rebase"])
+        self._add(db, "l3", "third lesson, unrelated text", ["history", "rebase"])
+        self._add(db, "l4", "only one shared tag here", ["git", "docs"])
+        clusters = find_clusters(db)
+        assert len(clusters) == 1
+        assert [entry["id"] for entry in clusters[0]["lessons"]] == ["l1", "l2", "l3"]
+        assert clusters[0]["shared_tags"][0] == "rebase"
+
+    def test_min_shared_one_groups_by_any_tag(self, db: sqlite3.Connection) -> None:
+        self._add(db, "l1", "alpha text", ["git"])
+        self._add(db, "l2", "beta text", ["git"])
+        self._add(db, "l3", "gamma text", ["docs"])
+        assert [c["size"] for c in find_clusters(db, min_shared=1)] == [2]
+
+    def test_near_identical_text_clusters_without_shared_tags(self, db: sqlite3.Connection) -> None:
+        text = "Always run the full test suite before pushing a rebased shared branch"
+        self._add(db, "l1", text, ["git"])
+        self._add(db, "l2", text + ".", ["ci"])
+        self._add(db, "l3", "Prefer pathlib over os.path in new helpers", ["python"])
+        clusters = find_clusters(db)
+        assert [[e["id"] for e in c["lessons"]] for c in clusters] == [["l1", "l2"]]
+        assert clusters[0]["shared_tags"] == []
+
+    def test_inactive_lessons_excluded_and_top(self, db: sqlite3.Connection) -> None:
+        for n in range(3):
+            self._add(db, f"a{n}", f"group a lesson {n} xyz", ["a1", "a2"])
+        for n in range(2):
+            self._add(db, f"b{n}", f"group b lesson {n} qrs", ["b1", "b2"])
+        update_lesson(db, "a2", active=0)
+        assert [c["size"] for c in find_clusters(db)] == [2, 2]
+        assert len(find_clusters(db, top=1)) == 1
+
+    def test_signatures_incremental(self, db: sqlite3.Connection) -> None:
+        self._add(db, "l1", "first lesson", ["git"])
+        self._add(db, "l2", "second lesson", ["git"])
+        assert refresh_signatures(db) == 2
+        assert refresh_signatures(db) == 0
+        self._add(db, "l3", "third lesson", ["git"])
+        update_lesson(db, "l1", text="first lesson, edited")
+        assert refresh_signatures(db) == 2
+        db.execute("DELETE FROM lessons WHERE id = 'l2'")
+        assert not db.execute("SELECT 1 FROM lesson_lsh WHERE lesson_id = 'l2'").fetchone()
+
+
+class TestNearDuplicates:
+    TEXT = "Always run the full test suite before pushing a rebased shared branch"
+
+    def _add_args(self, tmp_path: Path, text: str, **overrides: object) -> argparse.Namespace:
+        args = argparse.Namespace(
+            db_path=tmp_path / "test-lessons.db", id=None, project="proj", date="2026-03-24",
+            text=text, tags="git", branch="main", scope="global",
+            on_duplicate="warn", dup_threshold=0.8,
+        )
+        vars(args).update(overrides)
+        return args
+
+    def test_find_near_duplicates(self, db: sqlite3.Connection) -> None:
+        insert_lesson(db, lesson_id="l1", project_id="proj", date="2026-03-24", text=self.TEXT, tag_names=["git"])
+        insert_lesson(db, lesson_id="l2", project_id="proj", date="2026-03-24", text="Unrelated pathlib advice", tag_names=["py"])
+        dups = find_near_duplicates(db, self.TEXT + "!")
+        assert [d[0] for d in dups] == ["l1"] and dups[0][2] >= 0.8
+        update_lesson(db, "l1", active=0)
+        assert find_near_duplicates(db, self.TEXT) == []
+
+    def test_add_warns_then_refuses(self, db: sqlite3.Connection, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        db.close()
+        cmd_add(self._add_args(tmp_path, self.TEXT, id="l1"))
+        cmd_add(self._add_args(tmp_path, self.TEXT + ".", id="l2"))
+        assert "Near-duplicate of 1" in capsys.readouterr().err
+        with pytest.raises(SystemExit, match="1"):
+            cmd_add(self._add_args(tmp_path, self.TEXT + "..", id="l3", on_duplicate="refuse"))
+        assert "Not added" in capsys.readouterr().err
+        cmd_add(self._add_args(tmp_path, self.TEXT + "...", id="l4", on_duplicate="ignore"))
+        assert "Near-duplicate" not in capsys.readouterr().err
+        conn = init_lessons_db(tmp_path / "test-lessons.db")
+        ids = [r[0] for r in conn.execute("SELECT id FROM lessons ORDER BY id")]
+        assert ids == ["l1", "l2", "l4"]
+        # add stores the signature itself; nothing left to hash
+        assert refresh_signatures(conn) == 0
+        conn.close()
+
+    def test_duplicate_pairs(self, db: sqlite3.Connection) -> None:
+        for lid, text in [("a", self.TEXT), ("b", self.TEXT + "."), ("c", "Prefer pathlib over os.path")]:
+            insert_lesson(db, lesson_id=lid, project_id="proj", date="2026-03-24", text=text, tag_names=["x"])
+        pairs = find_duplicate_pairs(db)
+        assert [(a, b) for a, b, _ in pairs] == [("a", "b")]
+
+
+class TestCmdSearch:
+    @pytest.fixture
+    def db_path(self, db: sqlite3.Connection, tmp_path: Path) -> Path:
+        rows = [
+            ("old_best", "2026-01-01", "rebase rebase rebase before pushing"),
+            ("new_weak", "2026-03-01", "A long lesson that mentions rebase once among many other words about "
+                                       "deployment, configuration, hooks, settings and unrelated topics"),
+            ("inactive", "2026-03-02", "rebase rebase rebase rebase"),
+        ]
+        for lid, date, text in rows:
+            insert_lesson(db, lesson_id=lid, project_id="proj", date=date, text=text, tag_names=["git"])
+        update_lesson(db, "inactive", active=0)
+        db.close()
+        return tmp_path / "test-lessons.db"
+
+    def _search(self, db_path: Path, capsys: pytest.CaptureFixture[str], query: str, **kw: object) -> list[dict]:
+        args = argparse.Namespace(db_path=db_path, format="jsonl", query=query, limit=10,
+                                  prefix=False, active_only=False)
+        vars(args).update(kw)
+        cmd_search(args)
+        return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    def test_bm25_beats_recency(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        ids = [r["id"] for r in self._search(db_path, capsys, "rebase")]
+        assert ids.index("old_best") < ids.index("new_weak")
+
+    def test_active_only(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        ids = [r["id"] for r in self._search(db_path, capsys, "rebase", active_only=True)]
+        assert ids == ["old_best", "new_weak"]
+
+    def test_prefix(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        assert self._search(db_path, capsys, "rebas") == []
+        assert len(self._search(db_path, capsys, "rebas", prefix=True)) == 3
+
+    def test_snippet_window(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        row = next(r for r in self._search(db_path, capsys, "rebase") if r["id"] == "new_weak")
+        assert "rebase" in row["snippet"] and len(row["snippet"]) < len(row["text"])
+        assert row["snippet"].endswith("…")
+
+
+# ---------------------------------------------------------------------------
+# --format json / jsonl / tsv
+# ---------------------------------------------------------------------------
+
+
+class TestOutputFormat:
+    @pytest.fixture
+    def db_path(self, db: sqlite3.Connection, tmp_path: Path) -> Path:
+        for n, text in enumerate(["tab\there", "second lesson"], start=1):
+            insert_lesson(
+                db, lesson_id=f"proj_{n}", project_id="proj", date=f"2026-03-2{n}",
+                text=text, tag_names=["git", "pattern"],
+            )
+        db.close()
+        return tmp_path / "test-lessons.db"
+
+    def _list_args(self, db_path: Path, fmt: str) -> argparse.Namespace:
+        return argparse.Namespace(
+            db_path=db_path, format=fmt, tier=None, active=False, project=None,
+            tags=None, scope=None, limit=20,
+        )
+
+    def test_list_jsonl(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_list(self._list_args(db_path, "jsonl"))
+        rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert [r["id"] for r in rows] == ["proj_2", "proj_1"]
+        assert rows[1]["text"] == "tab\there"
+        assert rows[1]["tags"] == ["git", "pattern"]
+        assert rows[1]["active"] is True
+
+    def test_list_json_is_one_array(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_list(self._list_args(db_path, "json"))
+        assert len(json.loads(capsys.readouterr().out)) == 2
+
+    def test_list_tsv_escapes_tabs(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_list(self._list_args(db_path, "tsv"))
+        header, *lines = capsys.readouterr().out.splitlines()
+        assert header.split("\t") == ["id", "date", "tier", "active", "scope", "project", "tags", "text"]
+        assert lines[1].split("\t")[-2:] == ["git,pattern", "tab\\there"]
+
+    def test_empty_json_result(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_search(argparse.Namespace(db_path=db_path, format="json", query="nomatch", limit=5))
+        assert json.loads(capsys.readouterr().out) == []
+
+    def test_get_and_health_objects(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_get(argparse.Namespace(db_path=db_path, format="json", id="proj_1"))
+        assert json.loads(capsys.readouterr().out)["tags"] == ["git", "pattern"]
+        cmd_health(argparse.Namespace(db_path=db_path, format="json"))
+        health = json.loads(capsys.readouterr().out)
+        assert (health["active"], health["active_tags"]) == (2, 2)
+
+    def test_text_list_streams_with_count_footer(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_list(self._list_args(db_path, "text"))
+        out = capsys.readouterr().out
+        assert out.index("proj_2") < out.index("proj_1") < out.index("2 lesson(s)")
+
+    def test_closed_pipe_exits_quietly(self, db: sqlite3.Connection, tmp_path: Path) -> None:
+        insert_lessons_bulk(db, (_bulk_item(n, text="x" * 200) for n in range(2000)))
+        db.close()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "cli.lessons.db", "--db", str(tmp_path / "test-lessons.db"),
+             "list", "--limit", "2000"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        assert proc.stdout is not None and proc.stderr is not None
+        proc.stdout.readline()
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode()
+        proc.wait()
+        assert "Traceback" not in stderr and "BrokenPipe" not in stderr
+
+    def test_format_accepted_after_subcommand(self) -> None:
+        parser = build_parser()
+        assert parser.parse_args(["list", "--format", "tsv"]).format == "tsv"
+        assert parser.parse_args(["--format", "jsonl", "list"]).format == "jsonl"
+        assert parser.parse_args(["list"]).format == "text"
+
+
+# ---------------------------------------------------------------------------
+# Startup: lazy imports and the argv fast path
+# ---------------------------------------------------------------------------
+
+# Modules cli.lessons.db must not pull in at import time (see its imports).
+DEFERRED_MODULES = {"argparse", "json", "typing", "hashlib", "random", "cli.lessons.similarity"}
+# Import + run of a cold `ct-lessons get <id>` (interpreter start excluded), best of 7;
+# a tripwire for gross regressions — DEFERRED_MODULES is the precise guard.
+GET_STARTUP_BUDGET_MS = 50
+
+
+def _run_python(code: str, *args: str, pycache: Path) -> subprocess.CompletedProcess[str]:
+    env = {**os.environ, "PYTHONPYCACHEPREFIX": str(pycache)}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        capture_output=True, text=True, env=env, check=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+
+
+class TestStartup:
+    @pytest.mark.parametrize("argv", [
+        ["get", "lesson_1"],
+        ["--db", "/tmp/x.db", "--format", "json", "get", "lesson_1"],
+        ["get", "lesson_1", "--format", "tsv"],
+        ["search", "git rebase"],
+        ["search", "rebas", "--prefix", "--active-only", "--limit", "5"],
+        ["list"],
+        ["list", "--active"],
+        ["--format", "jsonl", "list", "--tier", "key", "--tags", "git,bash", "--project", "p",
+         "--scope", "project", "--limit", "7"],
+        ["list", "--tags", "git,bash", "--all-tags", "--project", "p", "--project-like", "--explain"],
+    ])
+    def test_fast_path_matches_parser(self, argv: list[str]) -> None:
+        fast = lessons_db._fast_args(argv)
+        assert fast is not None
+        assert vars(fast) == vars(build_parser().parse_args(argv))
+
+    @pytest.mark.parametrize("argv", [
+        [],
+        ["add", "--text", "x"],
+        ["get"],
+        ["get", "--help"],
+        ["get", "a", "b"],
+        ["get", "lesson_1", "--db", "/tmp/x.db"],
+        ["search", "q", "--limit=3"],
+        ["list", "--limit", "many"],
+        ["list", "--scope", "team"],
+        ["list", "--format", "xml"],
+        ["list", "--act"],
+    ])
+    def test_unusual_argv_falls_back(self, argv: list[str]) -> None:
+        assert lessons_db._fast_args(argv) is None
+
+    def test_import_defers_heavy_modules(self, tmp_path: Path) -> None:
+        proc = _run_python("import cli.lessons.db", pycache=tmp_path)
+        imported = {line.split("|")[-1].strip() for line in proc.stderr.splitlines()}
+        assert "cli.lessons.db" in imported
+        assert not imported & DEFERRED_MODULES
+
+    def test_cold_get_within_budget(self, db: sqlite3.Connection, tmp_path: Path) -> None:
+        insert_lesson(db, lesson_id="lesson_1", project_id="proj", date="2026-03-24",
+                      text="startup budget", tag_names=["git"])
+        db.close()
+        db_path = str(tmp_path / "test-lessons.db")
+        get = "import time, sys; t = time.perf_counter(); from cli.lessons.db import main; main(sys.argv[1:]); " \
+              "print(time.perf_counter() - t, file=sys.stderr)"
+
+        def best(code: str, *args: str) -> float:
+            runs = [_run_python(code, *args, pycache=tmp_path) for _ in range(7)]
+            return min(float(r.stderr.splitlines()[-1]) for r in runs)
+
+        _run_python(get, "--db", db_path, "get", "lesson_1", pycache=tmp_path)  # write .pyc
+        elapsed_ms = best(get, "--db", db_path, "get", "lesson_1") * 1000
+        assert elapsed_ms < GET_STARTUP_BUDGET_MS
+
+
+# ---------------------------------------------------------------------------
+# Project / branch resolution
+# ---------------------------------------------------------------------------
+
+
+class TestProjectResolution:
+    @pytest.fixture
+    def repo(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+        root = tmp_path / "my-repo"
+        (root / ".git").mkdir(parents=True)
+        (root / ".git" / "HEAD").write_text("ref: refs/heads/feat/x\n")
+        (root / "src").mkdir()
+        monkeypatch.chdir(root / "src")
+        monkeypatch.setattr(lessons_db, "SESSIONS_DB_PATH", tmp_path / "sessions.db")
+        monkeypatch.setattr(lessons_db, "_RESOLVED_PROJECTS", {})
+        return root
+
+    def _register(self, tmp_path: Path, root: Path, project_id: str) -> None:
+        conn = sqlite3.connect(tmp_path / "sessions.db")
+        conn.execute("CREATE TABLE IF NOT EXISTS project_paths (dir_name TEXT PRIMARY KEY, project_id TEXT)")
+        conn.execute("INSERT OR REPLACE INTO project_paths VALUES (?, ?)",
+                     (lessons_db._encoded_dir(root), project_id))
+        conn.commit()
+        conn.close()
+
+    def test_branch_from_head(self, repo: Path) -> None:
+        assert lessons_db._detect_branch() == "feat/x"
+        (repo / ".git" / "HEAD").write_text("0123456789abcdef0123456789abcdef01234567\n")
+        assert lessons_db._detect_branch() is None
+
+    def test_linked_worktree(self, repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        git_dir = repo / ".git" / "worktrees" / "wt"
+        git_dir.mkdir(parents=True)
+        (git_dir / "HEAD").write_text("ref: refs/heads/wt-branch\n")
+        wt = tmp_path / "wt"
+        wt.mkdir()
+        (wt / ".git").write_text(f"gitdir: {git_dir}\n")
+        monkeypatch.chdir(wt)
+        assert lessons_db._detect_branch() == "wt-branch"
+        assert lessons_db.resolve_project(tmp_path / "lessons.db") == "wt"
+
+    def test_not_a_repo(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(lessons_db, "SESSIONS_DB_PATH", tmp_path / "sessions.db")
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(lessons_db, "_find_repo", lambda start: None)
+        assert lessons_db._detect_branch() is None
+        assert lessons_db._detect_project() == tmp_path.name
+
+    def test_basename_without_sessions_db(self, repo: Path, tmp_path: Path) -> None:
+        assert lessons_db.resolve_project(tmp_path / "lessons.db") == "my-repo"
+        cache = json.loads(lessons_db.project_cache_path(tmp_path / "lessons.db").read_text())
+        assert cache[str(repo / "src")]["project"] == "my-repo"
+
+    def test_cached_across_processes(self, repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        self._register(tmp_path, repo, "canonical-id")
+        db_path = tmp_path / "lessons.db"
+        assert lessons_db.resolve_project(db_path) == "canonical-id"
+
+        calls: list[Path | None] = []
+        monkeypatch.setattr(lessons_db, "_detect_project", lambda root=None: calls.append(root) or "fresh")
+        monkeypatch.setattr(lessons_db, "_RESOLVED_PROJECTS", {})  # as a new process would
+        assert lessons_db.resolve_project(db_path) == "canonical-id"
+        assert calls == []
+
+        # Re-indexing sessions.db invalidates the entry.
+        self._register(tmp_path, repo, "renamed-id")
+        os.utime(tmp_path / "sessions.db", ns=(0, 0))
+        assert lessons_db.resolve_project(db_path) == "fresh"
+        assert calls == [repo]
+
+    def test_cache_pruned_and_capped(self, repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        cache_path = lessons_db.project_cache_path(tmp_path / "lessons.db")
+        stale = {"root": str(tmp_path / "deleted-repo"), "sessions_mtime": None, "project": "gone"}
+        kept = {"root": str(repo), "sessions_mtime": None, "project": "my-repo"}
+        cache_path.write_text(json.dumps({"/old/gone": stale, "/old/a": kept, "/old/b": kept}))
+        monkeypatch.setattr(lessons_db, "PROJECT_CACHE_MAX_ENTRIES", 2)
+        assert lessons_db.resolve_project(tmp_path / "lessons.db") == "my-repo"
+        assert list(json.loads(cache_path.read_text())) == ["/old/b", str(repo / "src")]
+
+    def test_unregistered_project_not_cached(self, repo: Path, tmp_path: Path) -> None:
+        self._register(tmp_path, tmp_path / "elsewhere", "other")
+        with pytest.raises(SystemExit):
+            lessons_db.resolve_project(tmp_path / "lessons.db")
+        assert not lessons_db.project_cache_path(tmp_path / "lessons.db").exists()
+
+    def test_add_resolves_once(self, repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        calls: list[Path | None] = []
+        monkeypatch.setattr(lessons_db, "_detect_project", lambda root=None: calls.append(root) or "proj")
+        db_path = tmp_path / "lessons.db"
+        for text in ("first lesson about git", "second lesson about pathlib"):
+            cmd_add(argparse.Namespace(
+                db_path=db_path, id=None, project=None, date="2026-03-24", text=text,
+                tags="", branch=None, scope="global", on_duplicate="ignore",
+            ))
+        assert calls == [repo]
+        rows = get_connection(db_path).execute("SELECT project_id, branch FROM lessons").fetchall()
+        assert rows == [("proj", "feat/x"), ("proj", "feat/x")]
+
+
 # ---------------------------------------------------------------------------
 # Lifecycle commands: promote / deactivate
 # ---------------------------------------------------------------------------
@@ -662,3 +1541,730 @@ class TestLifecycleCommands:
         args = argparse.Namespace(db_path=tmp_path / "test-lessons.db", id="nonexistent")
         with pytest.raises(SystemExit, match="1"):
             cmd_deactivate(args)
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+
+class TestRunBatch:
+    @pytest.fixture
+    def db(self, db: sqlite3.Connection) -> sqlite3.Connection:
+        for n in (1, 2):
+            insert_lesson(db, lesson_id=f"l{n}", project_id="proj", date="2026-03-24",
+                          text=f"lesson {n}", tag_names=["git"])
+        return db
+
+    def _state(self, db: sqlite3.Connection) -> list[tuple]:
+        return db.execute("SELECT id, tier, active, absorbed_into FROM lessons ORDER BY id").fetchall()
+
+    def test_all_ops_one_commit(self, db: sqlite3.Connection) -> None:
+        statements: list[str] = []
+        db.set_trace_callback(statements.append)
+        results = list(run_batch(db, [
+            {"op": "promote", "id": "l1"},
+            '{"op": "absorb", "id": "l2", "into": "CLAUDE.md"}',
+            {"op": "get", "id": "l1"},
+            {"op": "set-meta", "key": "last_manage_run", "value": "2026-03-24"},
+        ]))
+        db.set_trace_callback(None)
+        assert [r["ok"] for r in results[:-1]] == [True] * 4
+        assert results[2]["result"]["tier"] == "key"
+        assert results[-1] == {"done": True, "committed": True, "ok": 4, "failed": 0}
+        assert sum(s == "COMMIT" for s in statements) == 1
+        assert self._state(db) == [("l1", "key", 1, None), ("l2", "recent", 0, "CLAUDE.md")]
+
+    def test_failure_rolls_back_whole_batch(self, db: sqlite3.Connection) -> None:
+        results = list(run_batch(db, [
+            {"op": "deactivate", "id": "l1"},
+            {"op": "promote", "id": "missing"},
+            {"op": "deactivate", "id": "l2"},
+        ]))
+        assert results[1] == {"i": 1, "op": "promote", "ok": False, "error": "Lesson not found: missing"}
+        assert results[-1]["committed"] is False and len(results) == 3
+        assert [row[2] for row in self._state(db)] == [1, 1]
+
+    def test_savepoints_isolate_failures(self, db: sqlite3.Connection) -> None:
+        results = list(run_batch(db, [
+            {"op": "deactivate", "id": "l1"},
+            {"op": "absorb", "id": "l2"},
+            "not json",
+            {"op": "explode"},
+            {"op": "promote", "id": "l2"},
+        ], savepoints=True))
+        errors = [r.get("error") for r in results[:-1]]
+        assert errors[1] == "missing field: into"
+        assert errors[2].startswith("invalid JSON")
+        assert errors[3] == "unknown op: explode"
+        assert results[-1] == {"done": True, "committed": True, "ok": 2, "failed": 3}
+        assert self._state(db) == [("l1", "recent", 0, None), ("l2", "key", 1, None)]
+
+    def test_non_string_op_is_an_op_error(self, db: sqlite3.Connection) -> None:
+        results = list(run_batch(db, [
+            {"op": ["promote"], "id": "l1"},
+            {"op": {"name": "promote"}, "id": "l1"},
+            {"op": "promote", "id": "l2"},
+        ], savepoints=True))
+        assert [r.get("error") for r in results[:2]] == [
+            "unknown op: ['promote']", "unknown op: {'name': 'promote'}",
+        ]
+        assert results[-1] == {"done": True, "committed": True, "ok": 1, "failed": 2}
+
+
+# ---------------------------------------------------------------------------
+# Keyword index
+# ---------------------------------------------------------------------------
+
+
+class TestKeywordIndex:
+    @pytest.fixture
+    def db(self, _wipe_db: sqlite3.Connection) -> sqlite3.Connection:
+        return _wipe_db
+
+    @staticmethod
+    def _keywords(db: sqlite3.Connection, tag_id: int) -> set[str]:
+        return {
+            r[0] for r in db.execute(
+                "SELECT keyword FROM tag_keywords WHERE tag_id = ?", (tag_id,)
+            )
+        }
+
+    def test_indexed_on_create(self, db: sqlite3.Connection) -> None:
+        tid = get_or_create_tag(db, "perm", keywords="permission,Bash(,make check,ok")
+        assert self._keywords(db, tid) == {"permission", "bash", "make", "check"}
+
+    def test_replaced_on_keyword_update(self, db: sqlite3.Connection) -> None:
+        tid = get_or_create_tag(db, "git", keywords="rebase")
+        get_or_create_tag(db, "git", keywords="merge,push")
+        assert self._keywords(db, tid) == {"merge", "push"}
+
+    def test_hand_edit_reindexed_by_trigger(self, db: sqlite3.Connection) -> None:
+        tid = get_or_create_tag(db, "git", keywords="rebase,head")
+        db.execute("UPDATE tags SET keywords = 'force-push,--amend' WHERE id = ?", (tid,))
+        assert self._keywords(db, tid) == {"force-push", "--amend"}
+        db.execute("UPDATE tags SET keywords = NULL WHERE id = ?", (tid,))
+        assert self._keywords(db, tid) == set()
+        db.rollback()
+
+    @pytest.mark.parametrize("keywords", [
+        "permission,Bash(,make check,ok",
+        "Git Push, RM -rf /tmp,--no-verify",
+        "ab,abc,a_b_c,x-y,,  ,é_café,UPPER",
+        "",
+        "tail-", "-", "x" * 300,
+    ])
+    def test_trigger_tokens_match_python(self, db: sqlite3.Connection, keywords: str) -> None:
+        db.execute("INSERT INTO tags (name, keywords) VALUES ('t', ?)", (keywords,))
+        tid = db.execute("SELECT id FROM tags WHERE name = 't'").fetchone()[0]
+        assert self._keywords(db, tid) == lessons_db._keyword_tokens(keywords)
+        db.rollback()
+
+    def test_reindex_counts_rebuilds_index(self, db: sqlite3.Connection, tmp_path: Path) -> None:
+        path = tmp_path / "reindex-keywords.db"
+        conn = init_lessons_db(path)
+        tid = get_or_create_tag(conn, "git", keywords="rebase,head")
+        conn.execute("DELETE FROM tag_keywords")
+        conn.commit()
+        cmd_reindex_counts(argparse.Namespace(db_path=path))
+        assert self._keywords(conn, tid) == {"rebase", "head"}
+        conn.close()
+
+    def test_rebuild_from_tags(self, db: sqlite3.Connection) -> None:
+        tid = get_or_create_tag(db, "git", keywords="rebase,head")
+        db.execute("DELETE FROM tag_keywords")
+        db.commit()
+        rebuild_keyword_index(db)
+        assert self._keywords(db, tid) == {"rebase", "head"}
+
+    def test_backfilled_on_init(self, tmp_path: Path) -> None:
+        path = tmp_path / "legacy.db"
+        conn = init_lessons_db(path)
+        conn.execute("INSERT INTO tags (name, keywords) VALUES ('git', 'rebase,head')")
+        conn.execute("PRAGMA user_version = 0")  # predates schema versioning
+        conn.commit()
+        conn.close()
+        conn = init_lessons_db(path)
+        assert self._keywords(conn, 1) == {"rebase", "head"}
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# match_lessons (surface-lessons SQL path)
+# ---------------------------------------------------------------------------
+
+
+class TestMatchLessons:
+    @pytest.fixture
+    def db(self, _wipe_db: sqlite3.Connection) -> sqlite3.Connection:
+        get_or_create_tag(_wipe_db, "alpha", keywords="rebase,cherry-pick,head")
+        get_or_create_tag(_wipe_db, "beta", keywords="deploy,kubernetes")
+        insert_lesson(
+            _wipe_db, lesson_id="lesson_alpha", project_id="proj", date="2026-03-24",
+            text="alpha lesson text", tag_names=["alpha"], tier="key",
+        )
+        insert_lesson(
+            _wipe_db, lesson_id="lesson_split", project_id="proj", date="2026-03-25",
+            text="split lesson text", tag_names=["alpha", "beta"],
+        )
+        return _wipe_db
+
+    def test_single_hit_does_not_surface(self, db: sqlite3.Connection) -> None:
+        assert match_lessons(db, "git rebase shared") == []
+
+    def test_two_hits_same_tag_surface(self, db: sqlite3.Connection) -> None:
+        ids = [lid for lid, _ in match_lessons(db, "git rebase HEAD~3")]
+        assert ids == ["lesson_alpha", "lesson_split"]
+
+    def test_hits_split_across_tags_do_not_surface(self, db: sqlite3.Connection) -> None:
+        assert match_lessons(db, "rebase deploy") == []
+
+    def test_plural_counts_once(self, db: sqlite3.Connection) -> None:
+        assert match_lessons(db, "rebases only") == []
+
+    def test_whole_token_hits_only(self, db: sqlite3.Connection) -> None:
+        # `pick` and `hea` are substrings of alpha's keywords, not keyword tokens
+        assert match_lessons(db, "pick hea") == []
+
+    def test_deprecated_tag_does_not_surface(self, db: sqlite3.Connection) -> None:
+        db.execute("UPDATE tags SET status = 'deprecated' WHERE name = 'alpha'")
+        assert match_lessons(db, "rebase head") == []
+
+    def test_exclude_and_limit(self, db: sqlite3.Connection) -> None:
+        assert match_lessons(db, "rebase head", exclude=["lesson_alpha"]) == [
+            ("lesson_split", "split lesson text"),
+        ]
+        assert len(match_lessons(db, "rebase head", limit=1)) == 1
+
+    def test_huge_context_binds_no_per_word_variables(self, db: sqlite3.Connection) -> None:
+        old_limit = db.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        try:
+            filler = " ".join(f"word{i}s" for i in range(2_000))
+            exclude = [f"missing_{i}" for i in range(2_000)]
+            assert [i for i, _ in match_lessons(db, f"rebase {filler} head", exclude=exclude)] == [
+                "lesson_alpha", "lesson_split",
+            ]
+        finally:
+            db.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, old_limit)
+
+    def test_project_scope_filter(self, db: sqlite3.Connection) -> None:
+        update_lesson(db, "lesson_split", scope="project")
+        assert [i for i, _ in match_lessons(db, "rebase head")] == ["lesson_alpha"]
+        assert [i for i, _ in match_lessons(db, "rebase head", project="proj")] == [
+            "lesson_alpha", "lesson_split",
+        ]
+
+
+# ---------------------------------------------------------------------------
+# surface_lessons (scored, byte-budgeted surfacing)
+# ---------------------------------------------------------------------------
+
+
+class TestSurfaceLessons:
+    TODAY = "2026-04-01"
+
+    @pytest.fixture
+    def db(self, _wipe_db: sqlite3.Connection) -> sqlite3.Connection:
+        get_or_create_tag(_wipe_db, "alpha", keywords="rebase,cherry-pick,head")
+        get_or_create_tag(_wipe_db, "beta", keywords="deploy,kubernetes,rebase")
+        return _wipe_db
+
+    def _add(self, db: sqlite3.Connection, lesson_id: str, text: str, **kwargs: object) -> None:
+        kwargs = {"project_id": "proj", "date": "2026-03-24", "tag_names": ["alpha"], **kwargs}
+        insert_lesson(db, lesson_id=lesson_id, text=text, **kwargs)  # type: ignore[arg-type]
+
+    def test_candidates_are_match_lessons(self, db: sqlite3.Connection) -> None:
+        self._add(db, "a", "alpha", tier="key")
+        self._add(db, "b", "both", tag_names=["alpha", "beta"])
+        self._add(db, "c", "other project", scope="project", project_id="other")
+        for context in ("git rebase HEAD~3", "rebase deploy kubernetes", "rebase only"):
+            rows = lessons_db.surface_candidates(db, context, project="proj")
+            assert {r[0] for r in rows} == {i for i, _ in match_lessons(db, context, project="proj", limit=99)}
+        hits = {r[0]: r[6] for r in lessons_db.surface_candidates(db, "rebase head deploy kubernetes")}
+        assert hits == {"a": 2, "b": 4}  # b: rebase+head via alpha, rebase+deploy+kubernetes via beta
+
+    def test_scoring(self, db: sqlite3.Connection) -> None:
+        self._add(db, "old", "old recent lesson", date="2025-01-01")
+        self._add(db, "new", "new recent lesson", date="2026-03-02")  # 30 days: half the recency weight
+        self._add(db, "key", "key lesson", tier="key", date="2025-01-01")
+        self._add(db, "mine", "project lesson", scope="project", date="2025-01-01")
+        ranked = surface_lessons(db, "rebase head", project="proj", limit=4, today=self.TODAY)
+        assert [r["id"] for r in ranked] == ["key", "mine", "new", "old"]
+        assert ranked[2]["score"] == pytest.approx(2 + 0.5)
+
+    def test_budget_and_limit(self, db: sqlite3.Connection) -> None:
+        for n in range(5):
+            self._add(db, f"l{n}", f"lesson {n} " + "x" * 50, date=f"2026-03-2{n}")
+        size = len(("- lesson 0 " + "x" * 50 + "\n").encode())
+        picked = surface_lessons(db, "rebase head", budget_bytes=size * 2, limit=5, today=self.TODAY)
+        assert [r["id"] for r in picked] == ["l4", "l3"]
+        assert sum(r["bytes"] for r in picked) <= size * 2
+        assert len(surface_lessons(db, "rebase head", budget_bytes=10_000, limit=3)) == 3
+        assert surface_lessons(db, "rebase head", budget_bytes=size - 1) == []
+
+    def test_knapsack_beats_greedy(self, db: sqlite3.Connection) -> None:
+        # Greedy by score takes the long key lesson and nothing else fits;
+        # two short lessons score more together.
+        self._add(db, "long", "k" * 96, tier="key")
+        self._add(db, "s1", "s" * 46, date="2026-04-01")
+        self._add(db, "s2", "t" * 46, date="2026-04-01")
+        picked = surface_lessons(db, "rebase head", budget_bytes=100, today=self.TODAY)
+        assert sorted(r["id"] for r in picked) == ["s1", "s2"]
+
+    def test_pack_is_optimal(self) -> None:
+        from itertools import combinations as combos
+
+        rng = random.Random(7)
+        for _ in range(200):
+            items = [(f"i{n}", rng.randint(1, 60), round(rng.uniform(0.1, 5), 2)) for n in range(rng.randint(0, 8))]
+            budget, limit = rng.randint(0, 150), rng.randint(1, 4)
+            best = max(
+                (sum(s for _, _, s in c) for k in range(limit + 1) for c in combos(items, k)
+                 if sum(b for _, b, _ in c) <= budget),
+            )
+            chosen = lessons_db._pack(items, budget, limit)
+            picked = [i for i in items if i[0] in chosen]
+            assert len(picked) <= limit and sum(b for _, b, _ in picked) <= budget
+            assert sum(s for _, _, s in picked) == pytest.approx(best)
+
+    def test_payload_and_cli(self, db: sqlite3.Connection, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        self._add(db, "a", "first lesson", tier="key")
+        self._add(db, "b", "second lesson")
+        db.commit()
+        db_path = Path(db.execute("PRAGMA database_list").fetchone()[2])
+        assert lessons_db.render_surface_payload(surface_lessons(db, "rebase head")) == (
+            "- first lesson\n- second lesson\n"
+        )
+        args = argparse.Namespace(
+            db_path=db_path, format="json", context="rebase head", project=None, exclude="a",
+            budget_bytes=1200, budget_tokens=None, limit=3, socket=tmp_path / "absent.sock",
+        )
+        lessons_db.cmd_surface(args)
+        out = json.loads(capsys.readouterr().out)
+        assert out["payload"] == "- second lesson\n" and out["bytes"] == 16
+        assert [r["id"] for r in out["lessons"]] == ["b"]
+
+
+class TestLessonStats:
+    def _add(self, conn: sqlite3.Connection, lesson_id: str, **kw: object) -> None:
+        insert_lesson(conn, lesson_id=lesson_id, project_id="proj", date="2026-03-24",
+                      text=f"lesson {lesson_id}", tag_names=kw.pop("tags", ["git"]), **kw)
+
+    def test_triggers_track_every_write(self, db: sqlite3.Connection) -> None:
+        get_or_create_tag(db, "unused")
+        self._add(db, "a", tier="key")
+        self._add(db, "b", tags=["git", "bash"])
+        self._add(db, "c", tier="historical", crystallized_from="a,b")
+        lessons_db.promote_lesson(db, "b")
+        lessons_db.deactivate_lesson(db, "a")
+        lessons_db.absorb_lesson(db, "c", "b")
+        update_lesson(db, "b", tier="historical")
+        db.execute("UPDATE tags SET status = 'deprecated' WHERE name = 'unused'")
+        db.execute("DELETE FROM lessons WHERE id = 'a'")
+        db.commit()
+
+        assert lesson_stats_drift(db) == []
+        stats = read_lesson_stats(db)
+        assert (stats["total"], stats["active"], stats["historical_total"]) == (2, 1, 2)
+        assert (stats["absorbed"], stats["crystallized"], stats["active_tags"]) == (1, 1, 2)
+
+    def test_random_writes_stay_exact(self, db: sqlite3.Connection) -> None:
+        rng = random.Random(3)
+        tags = ["git", "bash", "python", "sql"]
+        for n in range(60):
+            ids = [r[0] for r in db.execute("SELECT id FROM lessons")]
+            op = rng.choice(["add", "add", "tier", "active", "absorb", "delete", "tag"]) if ids else "add"
+            if op == "add":
+                self._add(db, f"l{n}", tags=rng.sample(tags, rng.randint(0, 3)),
+                          tier=rng.choice(["recent", "key", "historical"]), active=rng.random() < 0.8)
+            elif op == "tier":
+                update_lesson(db, rng.choice(ids), tier=rng.choice(["recent", "key", "historical"]))
+            elif op == "active":
+                update_lesson(db, rng.choice(ids), active=rng.randint(0, 1))
+            elif op == "absorb":
+                update_lesson(db, rng.choice(ids), absorbed_into=rng.choice([None, "x"]))
+            elif op == "delete":
+                db.execute("DELETE FROM lessons WHERE id = ?", (rng.choice(ids),))
+            else:
+                db.execute("UPDATE tags SET status = ? WHERE name = ?",
+                           (rng.choice(["active", "deprecated"]), rng.choice(tags)))
+        db.commit()
+        assert lesson_stats_drift(db) == []
+
+    def test_migration_backfills(self, tmp_path: Path) -> None:
+        path = tmp_path / "legacy.db"
+        conn = init_lessons_db(path)
+        self._add(conn, "a", tier="key")
+        self._add(conn, "b", active=False)
+        conn.execute("DROP TABLE lesson_stats")  # drops its triggers too
+        conn.execute("PRAGMA user_version = 7")
+        conn.commit()
+        conn.close()
+
+        conn = init_lessons_db(path)
+        stats = read_lesson_stats(conn)
+        assert (stats["total"], stats["active"], stats["key_active"], stats["recent_total"]) == (2, 1, 1, 1)
+        conn.close()
+
+    def test_recompute_and_hygiene_check(
+        self, db: sqlite3.Connection, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        self._add(db, "a")
+        db.execute("UPDATE lesson_stats SET total = 9, orphaned_tags = 4")
+        db.commit()
+        db_path = tmp_path / "test-lessons.db"
+
+        lessons_db.cmd_tag_hygiene(argparse.Namespace(db_path=db_path))
+        assert "lesson_stats drift (total 9 → 1, orphaned_tags 4 → 0)" in capsys.readouterr().out
+
+        cmd_health(argparse.Namespace(db_path=db_path, format="json", recompute=True))
+        assert json.loads(capsys.readouterr().out)["total"] == 1
+        assert lesson_stats_drift(db) == []
+
+    def test_missing_row_is_rebuilt(self, db: sqlite3.Connection) -> None:
+        self._add(db, "a")
+        db.execute("DELETE FROM lesson_stats")
+        db.commit()
+        assert read_lesson_stats(db)["total"] == 1
+        assert recompute_lesson_stats(db) == []
+
+
+class TestArchive:
+    TODAY = "2026-06-30"
+
+    @pytest.fixture
+    def db_path(self, db: sqlite3.Connection, tmp_path: Path) -> Path:
+        for lesson_id, date, active in [
+            ("old_inactive", "2026-01-05", False),
+            ("old_active", "2026-01-06", True),
+            ("new_inactive", "2026-06-20", False),
+        ]:
+            insert_lesson(db, lesson_id=lesson_id, project_id="proj", date=date, active=active,
+                          text=f"{lesson_id} about git rebase", tag_names=["git", "bash"])
+        db.close()
+        return tmp_path / "test-lessons.db"
+
+    def _search(self, db_path: Path, capsys: pytest.CaptureFixture[str], *argv: str) -> list[dict]:
+        cmd_search(build_parser().parse_args(["--db", str(db_path), "--format", "json", "search", "rebase", *argv]))
+        return json.loads(capsys.readouterr().out)
+
+    def test_moves_old_inactive_only(self, db_path: Path) -> None:
+        conn = get_connection(db_path)
+        path = archive_path(db_path)
+        assert path.name == "test-lessons-archive.db"
+        assert archive_lessons(conn, path, older_than_days=90, today=self.TODAY, dry_run=True) == ["old_inactive"]
+        assert not path.exists()
+
+        assert archive_lessons(conn, path, older_than_days=90, today=self.TODAY) == ["old_inactive"]
+        hot = {lid for (lid,) in conn.execute("SELECT id FROM main.lessons")}
+        assert hot == {"old_active", "new_inactive"}
+        assert conn.execute("SELECT COUNT(*) FROM lesson_tags WHERE lesson_id = 'old_inactive'").fetchone()[0] == 0
+        assert conn.execute(
+            "SELECT tags, archived FROM archive.lessons WHERE id = 'old_inactive'"
+        ).fetchone() == ("git, bash", self.TODAY)
+        assert lesson_stats_drift(conn) == []
+        assert archive_lessons(conn, path, older_than_days=90, today=self.TODAY) == []
+        close_connections()
+
+    def test_search_all_unions_archive(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        archive_lessons(get_connection(db_path), archive_path(db_path), older_than_days=90, today=self.TODAY)
+        close_connections()
+        assert {r["id"] for r in self._search(db_path, capsys)} == {"old_active", "new_inactive"}
+        rows = {r["id"]: r for r in self._search(db_path, capsys, "--all")}
+        assert set(rows) == {"old_active", "new_inactive", "old_inactive"}
+        assert rows["old_inactive"]["archive"] is True and rows["old_active"]["archive"] is False
+        assert rows["old_inactive"]["snippet"] == "old_inactive about git rebase"
+        assert {r["id"] for r in self._search(db_path, capsys, "--all", "--active-only")} == {"old_active"}
+        close_connections()
+
+    def test_search_all_without_archive(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        assert len(self._search(db_path, capsys, "--all")) == 3
+        assert not archive_path(db_path).exists()
+        close_connections()
+
+    def test_half_moved_lesson_prefers_hot_and_is_recopied(
+        self, db_path: Path, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        conn = get_connection(db_path)
+        path = archive_path(db_path)
+        archive_lessons(conn, path, older_than_days=90, today=self.TODAY)
+        # Simulate a crash between the archive commit and the hot delete.
+        insert_lesson(conn, lesson_id="old_inactive", project_id="proj", date="2026-01-05",
+                      active=False, text="old_inactive edited about rebase", tag_names=["git"])
+        assert [r["text"] for r in self._search(db_path, capsys, "--all") if r["id"] == "old_inactive"] == [
+            "old_inactive edited about rebase"
+        ]
+        assert archive_lessons(conn, path, older_than_days=90, today=self.TODAY) == ["old_inactive"]
+        assert conn.execute("SELECT text FROM archive.lessons").fetchall() == [("old_inactive edited about rebase",)]
+        assert conn.execute(
+            "SELECT COUNT(*) FROM archive.lessons_fts WHERE lessons_fts MATCH 'edited'"
+        ).fetchone()[0] == 1
+        close_connections()
+
+    def test_archive_copy_committed_before_hot_delete(self, db_path: Path) -> None:
+        conn = get_connection(db_path)
+        path = archive_path(db_path)
+        seen: list[tuple[str, bool]] = []
+
+        def committed_in_archive(lesson_id: str) -> int:
+            # A separate connection only sees what the archive has committed.
+            other = sqlite3.connect(path)
+            try:
+                row = other.execute("SELECT 1 FROM lessons WHERE id = ?", (lesson_id,)).fetchone()
+            finally:
+                other.close()
+            seen.append((lesson_id, row is not None))
+            if len(seen) == 1:
+                raise RuntimeError("crash before the hot delete")
+            return 1
+
+        conn.create_function("committed_in_archive", 1, committed_in_archive)
+        conn.execute(
+            """CREATE TEMP TRIGGER archive_probe BEFORE DELETE ON main.lessons
+               BEGIN SELECT committed_in_archive(old.id); END"""
+        )
+        with pytest.raises(sqlite3.OperationalError):
+            archive_lessons(conn, path, older_than_days=90, today=self.TODAY)
+        assert seen == [("old_inactive", True)]
+        assert conn.execute("SELECT COUNT(*) FROM main.lessons WHERE id = 'old_inactive'").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM archive.lessons WHERE id = 'old_inactive'").fetchone()[0] == 1
+
+        assert archive_lessons(conn, path, older_than_days=90, today=self.TODAY) == ["old_inactive"]
+        assert seen[1:] == [("old_inactive", True)]
+        assert conn.execute("SELECT COUNT(*) FROM main.lessons WHERE id = 'old_inactive'").fetchone()[0] == 0
+        conn.execute("DROP TRIGGER temp.archive_probe")
+        close_connections()
+
+    def test_get_and_counts_see_archived_lessons(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        archive_lessons(get_connection(db_path), archive_path(db_path), older_than_days=90, today=self.TODAY)
+        close_connections()
+        lessons_db.main(["--db", str(db_path), "--format", "json", "get", "old_inactive"])
+        lesson = json.loads(capsys.readouterr().out)
+        assert (lesson["archive"], lesson["archived"], lesson["tags"]) == (True, self.TODAY, ["git", "bash"])
+        lessons_db.main(["--db", str(db_path), "--format", "json", "get", "old_active"])
+        assert json.loads(capsys.readouterr().out)["archive"] is False
+        for command in ("health", "summary"):
+            lessons_db.main(["--db", str(db_path), "--format", "json", command])
+            report = json.loads(capsys.readouterr().out)
+            assert (report["total"], report["archived"]) == (2, 1)
+        close_connections()
+
+    def test_cmd_archive(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        lessons_db.main(["--db", str(db_path), "--format", "json", "archive", "--older-than", "30", "--dry-run"])
+        out = json.loads(capsys.readouterr().out)
+        assert out["dry_run"] is True and "old_inactive" in out["ids"] and "old_active" not in out["ids"]
+        assert not archive_path(db_path).exists()
+        close_connections()
+
+
+class TestExportImport:
+    @pytest.fixture
+    def source(self, tmp_path: Path) -> Path:
+        path = tmp_path / "source.db"
+        conn = init_lessons_db(path)
+        get_or_create_tag(conn, "git", keywords="rebase,commit", description="Git workflows")
+        get_or_create_tag(conn, "old-git", keywords="merge")
+        conn.execute("UPDATE tags SET status = 'merged', merged_into_id = (SELECT id FROM tags WHERE name = 'git') "
+                     "WHERE name = 'old-git'")
+        insert_lesson(conn, lesson_id="a", project_id="proj", date="2026-03-01", text="rebase onto main\tfirst",
+                      tag_names=["git", "bash"], tier="key", branch="feat/x")
+        insert_lesson(conn, lesson_id="b", project_id="other", date="2026-03-02", text="squash before merge",
+                      tag_names=["old-git"], active=False, crystallized_from="x,y")
+        update_lesson(conn, "b", absorbed_into="a")
+        insert_lesson(conn, lesson_id="c", project_id="proj", date="2025-01-01", text="old cherry-pick habit",
+                      tag_names=["git"], active=False)
+        set_metadata(conn, "last_manage_run", "2026-03-03T10:00:00")
+        archive_lessons(conn, archive_path(path), older_than_days=90, today="2026-03-03")
+        conn.close()
+        return path
+
+    def _run(self, *argv: str) -> None:
+        lessons_db.main(list(argv))
+        close_connections()
+
+    def _body(self, path: Path) -> list[dict]:
+        conn = init_lessons_db(path)
+        attach_archive(conn, archive_path(path))
+        records = [r for r in export_records(conn) if r["kind"] != "header"]
+        conn.close()
+        return records
+
+    def test_round_trip(self, source: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        dump, target = tmp_path / "dump.ndjson.gz", tmp_path / "target.db"
+        self._run("--db", str(source), "export", "--output", str(dump))
+        self._run("--db", str(target), "--format", "json", "import", str(dump))
+        assert json.loads(capsys.readouterr().out.split("\n", 1)[1]) == {
+            "tags": 3, "lessons": 2, "archived": 1, "skipped": 0, "metadata": 1,
+        }
+        assert self._body(target) == self._body(source)
+        archived = [r for r in self._body(target) if r.get("archive")]
+        assert [(r["id"], r["tags"], r["archived"]) for r in archived] == [("c", ["git"], "2026-03-03")]
+
+        conn = init_lessons_db(target)
+        assert lesson_stats_drift(conn) == []
+        assert dict(conn.execute("SELECT name, lesson_count FROM tags")) == {"git": 1, "old-git": 0, "bash": 1}
+        assert conn.execute("SELECT l.id FROM lessons_fts JOIN lessons l ON l.rowid = lessons_fts.rowid "
+                            "WHERE lessons_fts MATCH 'squash'").fetchall() == [("b",)]
+        assert conn.execute("SELECT COUNT(*) FROM lessons WHERE id = 'c'").fetchone()[0] == 0
+        attach_archive(conn, archive_path(target))
+        fts = "SELECT id FROM archive.lessons WHERE rowid IN (SELECT rowid FROM archive.lessons_fts WHERE lessons_fts MATCH ?)"
+        assert conn.execute(fts, ("habit",)).fetchall() == [("c",)]
+        triggers = "SELECT name FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+        assert conn.execute(triggers).fetchall() == init_lessons_db(source).execute(triggers).fetchall()
+        conn.close()
+
+    def test_stdout_and_stdin(
+        self, source: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        import io
+
+        self._run("--db", str(source), "export")
+        dump = capsys.readouterr().out
+        assert json.loads(dump.splitlines()[0])["kind"] == "header"
+        monkeypatch.setattr(sys, "stdin", io.StringIO(dump))
+        self._run("--db", str(tmp_path / "target.db"), "import", "-")
+        assert self._body(tmp_path / "target.db") == self._body(source)
+
+    def test_existing_ids(self, source: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        dump = tmp_path / "dump.ndjson"
+        self._run("--db", str(source), "export", "-o", str(dump))
+        capsys.readouterr()
+        with pytest.raises(SystemExit):
+            self._run("--db", str(source), "import", str(dump))
+        assert "nothing written" in capsys.readouterr().err
+        self._run("--db", str(source), "--format", "json", "import", str(dump), "--skip-existing")
+        assert json.loads(capsys.readouterr().out)["skipped"] == 3
+        assert len(self._body(source)) == 7  # 3 tags, 2 lessons, 1 archived, 1 metadata key: nothing doubled
+
+    def test_archived_lessons_need_an_archive(self, source: Path, tmp_path: Path) -> None:
+        conn = init_lessons_db(source)
+        attach_archive(conn, archive_path(source))
+        records = list(export_records(conn))
+        conn.close()
+        target = init_lessons_db(tmp_path / "target.db")
+        with pytest.raises(ValueError, match="no archive DB"):
+            import_records(target, records)
+        assert target.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 0
+        target.close()
+
+    @pytest.mark.parametrize("lines, message", [
+        (['{"kind": "lesson"}'], "missing header"),
+        ([], "empty input"),
+        (['{"kind": "header", "format": "claude-toolkit-lessons", "version": 1}', "{oops"], "line 2"),
+        (['{"kind": "header", "format": "claude-toolkit-lessons", "version": 99}'], "newer than supported"),
+        (['{"kind": "header", "format": "claude-toolkit-lessons", "version": 1}', '{"kind": "widget"}'], "widget"),
+    ])
+    def test_rejects_bad_input(self, db: sqlite3.Connection, lines: list[str], message: str) -> None:
+        with pytest.raises(ValueError, match=message):
+            import_records(db, lessons_db.read_ndjson(lines))
+        assert db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'lessons_fts_ai'").fetchone()[0] == 1
+
+
+class TestListPlanner:
+    @pytest.fixture
+    def db_path(self, db: sqlite3.Connection, tmp_path: Path) -> Path:
+        for n, (project, tags) in enumerate([
+            ("claude-toolkit", ["git", "bash"]),
+            ("claude-toolkit", ["git"]),
+            ("claude-sessions", ["bash"]),
+            ("claude-sessions", ["git", "bash", "python"]),
+        ], start=1):
+            insert_lesson(db, lesson_id=f"l{n}", project_id=project, date=f"2026-03-0{n}",
+                          text=f"lesson {n}", tag_names=tags)
+        db.close()
+        return tmp_path / "test-lessons.db"
+
+    def _ids(self, db_path: Path, capsys: pytest.CaptureFixture[str], *argv: str) -> list[str]:
+        cmd_list(build_parser().parse_args(["--db", str(db_path), "--format", "json", "list", *argv]))
+        return [r["id"] for r in json.loads(capsys.readouterr().out)]
+
+    def test_tag_modes(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        assert self._ids(db_path, capsys, "--tags", "git,python") == ["l4", "l2", "l1"]
+        assert self._ids(db_path, capsys, "--tags", "git,bash", "--all-tags") == ["l4", "l1"]
+        assert self._ids(db_path, capsys, "--tags", "git,nope") == ["l4", "l2", "l1"]
+        assert self._ids(db_path, capsys, "--tags", "git,nope", "--all-tags") == []
+
+    def test_project_exact_by_default(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        assert self._ids(db_path, capsys, "--project", "claude-toolkit") == ["l2", "l1"]
+        assert self._ids(db_path, capsys, "--project", "toolkit") == []
+        assert self._ids(db_path, capsys, "--project", "claude", "--project-like") == ["l4", "l3", "l2", "l1"]
+
+    def test_rejects_unknown_tag_mode(self, db: sqlite3.Connection) -> None:
+        with pytest.raises(ValueError, match="tag_mode"):
+            plan_list_query(db, tags=["git"], tag_mode="most")
+
+    @pytest.mark.parametrize("argv, index", [
+        (["--tags", "git,bash"], "idx_lesson_tags_tag_lesson"),
+        (["--tags", "git,bash", "--all-tags"], "idx_lesson_tags_tag_lesson"),
+        (["--project", "claude-toolkit"], "idx_lessons_project_date"),
+        (["--active", "--tier", "key"], "idx_lessons_active_tier_date"),
+    ])
+    def test_explain_uses_indexes(
+        self, db_path: Path, capsys: pytest.CaptureFixture[str], argv: list[str], index: str
+    ) -> None:
+        cmd_list(build_parser().parse_args(["--db", str(db_path), "--format", "json", "list", "--explain", *argv]))
+        details = [step["detail"] for step in json.loads(capsys.readouterr().out)]
+        assert any(index in d for d in details)
+        assert not any(d.startswith(("SCAN l", "SCAN lesson_tags")) for d in details)
+
+    def test_explain_text_is_indented_tree(self, db_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        cmd_list(build_parser().parse_args(["--db", str(db_path), "list", "--explain", "--tags", "git"]))
+        lines = capsys.readouterr().out.splitlines()
+        assert any(line.startswith("  SEARCH lesson_tags USING COVERING INDEX") for line in lines)
+
+    def test_covering_indexes_keep_yaml_indexes(self, db: sqlite3.Connection) -> None:
+        names = {n for (n,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_lessons_active_tier_date", "idx_lessons_project_date", "idx_lesson_tags_tag_lesson"} <= names
+        assert {"idx_lessons_active_tier", "idx_lessons_project", "idx_lesson_tags_tag"} <= names
+
+    def test_yaml_indexes_restored_on_upgrade(self, tmp_path: Path) -> None:
+        path = tmp_path / "v9.db"
+        conn = init_lessons_db(path)
+        for name in ("idx_lessons_active_tier", "idx_lessons_project", "idx_lesson_tags_tag"):
+            conn.execute(f"DROP INDEX {name}")  # as the old migration 7 left them
+        conn.execute("PRAGMA user_version = 9")
+        conn.commit()
+        conn.close()
+        conn = init_lessons_db(path)
+        names = {n for (n,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_lessons_active_tier", "idx_lessons_project", "idx_lesson_tags_tag"} <= names
+        conn.close()
+
+
+@pytest.fixture(scope="module")
+def bench():
+    import importlib.util
+
+    path = Path(__file__).parent / "perf-lessons-scaling.py"
+    spec = importlib.util.spec_from_file_location("perf_lessons_scaling", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestScalingBenchmark:
+    """Smoke test for tests/perf-lessons-scaling.py at toy sizes."""
+
+    def test_corpus_shape(self, bench, tmp_path: Path) -> None:
+        vocab = bench.generate_corpus(tmp_path / "c.db", 50, tags=6, tags_per_lesson=2, keyword_density=0.5)
+        conn = init_lessons_db(tmp_path / "c.db")
+        assert conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 50
+        assert conn.execute("SELECT COUNT(*) FROM lesson_tags").fetchone()[0] == 100
+        assert len(vocab) == 6
+        conn.close()
+
+    def test_report_and_compare(self, bench) -> None:
+        report = bench.run([20, 40], list(bench.OPS), rounds=1, tags=6, tags_per_lesson=2,
+                           keyword_density=0.3, seed=1)
+        close_connections()
+        assert set(report["ops"]) == set(bench.OPS)
+        assert set(report["ops"]["search"]["sizes"]) == {"20", "40"}
+        assert bench.growth_exponent([(10, 1.0), (100, 10.0), (1000, 100.0)]) == pytest.approx(1.0)
+
+        slower = json.loads(json.dumps(report))
+        slower["ops"]["clusters"]["sizes"]["40"]["median_ms"] = 1000.0
+        slower["ops"]["clusters"]["exponent"] = 3.0
+        problems = bench.compare(slower, report, max_ratio=1.5, max_exponent_delta=0.25, min_ms=0.0)
+        assert any(p.startswith("clusters @ 40") for p in problems)
+        assert any(p.startswith("clusters: growth exponent") for p in problems)
+        assert bench.compare(report, report, max_ratio=1.5, max_exponent_delta=0.25) == []
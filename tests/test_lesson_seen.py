@@ -0,0 +1,120 @@
+"""Tests for cli/lessons/seen.py — per-session surfaced-lessons bitmap."""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from cli.lessons.db import get_or_create_tag, init_lessons_db, insert_lesson, surface_lessons
+from cli.lessons.seen import SEEN_BITS, SEEN_TTL_S, SeenSet, expire_seen, seen_dir
+
+
+class TestSeenSet:
+    def test_check_and_set(self, tmp_path: Path) -> None:
+        with SeenSet("sess-1", tmp_path) as seen:
+            assert "lesson_a" not in seen
+            assert seen.check_and_set("lesson_a") is False
+            assert seen.check_and_set("lesson_a") is True
+            assert "lesson_a" in seen and "lesson_b" not in seen
+            assert seen.check_and_set("lesson_b") is False
+            assert "lesson_b" in seen
+        # Bits are hashed into a fixed SEEN_BITS range.
+        assert (tmp_path / "sess-1.bits").stat().st_size <= SEEN_BITS // 8
+
+    def test_persists_per_session(self, tmp_path: Path) -> None:
+        with SeenSet("sess-1", tmp_path) as seen:
+            seen.check_and_set("lesson_7")
+        with SeenSet("sess-1", tmp_path) as again, SeenSet("sess-2", tmp_path) as other:
+            assert "lesson_7" in again
+            assert "lesson_7" not in other
+
+    def test_clear(self, tmp_path: Path) -> None:
+        with SeenSet("sess-1", tmp_path) as seen:
+            seen.check_and_set("lesson_3")
+            seen.clear()
+            assert "lesson_3" not in seen
+
+    def test_unsafe_session_id_stays_in_dir(self, tmp_path: Path) -> None:
+        with SeenSet("../../etc/passwd", tmp_path) as seen:
+            assert seen.path.parent == tmp_path
+            assert seen.path.name.endswith(".bits") and "/" not in seen.path.name
+
+    def test_runtime_dir(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        assert seen_dir() == tmp_path / "claude-toolkit" / "lessons-seen"
+        monkeypatch.delenv("XDG_RUNTIME_DIR")
+        assert seen_dir().name == "lessons-seen"
+
+    def test_temp_fallback_dirs_are_private(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        with SeenSet("sess"):
+            pass
+        base = tmp_path / f"claude-toolkit-{os.getuid()}"
+        assert (base / "lessons-seen" / "sess.bits").exists()
+        assert base.stat().st_mode & 0o777 == 0o700
+        assert (base / "lessons-seen").stat().st_mode & 0o777 == 0o700
+
+    def test_expiry(self, tmp_path: Path) -> None:
+        with SeenSet("old", tmp_path), SeenSet("fresh", tmp_path):
+            pass
+        stale = time.time() - SEEN_TTL_S - 60
+        os.utime(tmp_path / "old.bits", (stale, stale))
+        assert expire_seen(tmp_path) == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["fresh.bits"]
+        # Creating a new session file sweeps expired ones too.
+        os.utime(tmp_path / "fresh.bits", (stale, stale))
+        with SeenSet("new", tmp_path):
+            pass
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["new.bits"]
+
+
+def _mark_all(directory: str, lesson_ids: list[str]) -> int:
+    with SeenSet("shared", Path(directory)) as seen:
+        return sum(not seen.check_and_set(lid) for lid in lesson_ids)
+
+
+def test_concurrent_processes_mark_each_lesson_once(tmp_path: Path) -> None:
+    lesson_ids = [f"lesson_{n}" for n in range(64)]
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        firsts = pool.starmap(_mark_all, [(str(tmp_path), lesson_ids)] * 4)
+    assert sum(firsts) == len(lesson_ids)
+
+
+def test_surface_skips_lessons_seen_in_session(tmp_path: Path) -> None:
+    conn = init_lessons_db(tmp_path / "lessons.db")
+    get_or_create_tag(conn, "alpha", keywords="rebase,head")
+    for n in range(3):
+        insert_lesson(conn, lesson_id=f"l{n}", project_id="proj", date=f"2026-03-2{n}",
+                      text=f"lesson {n}", tag_names=["alpha"])
+    with SeenSet("sess", tmp_path / "seen") as seen:
+        first = surface_lessons(conn, "rebase head", limit=2, seen=seen)
+        second = surface_lessons(conn, "rebase head", limit=2, seen=seen)
+        third = surface_lessons(conn, "rebase head", limit=2, seen=seen)
+    assert [r["id"] for r in first] == ["l2", "l1"]
+    assert [r["id"] for r in second] == ["l0"]
+    assert third == []
+    with SeenSet("other", tmp_path / "seen") as other:
+        assert len(surface_lessons(conn, "rebase head", limit=2, seen=other)) == 2
+    conn.close()
+
+
+def test_new_lesson_reusing_an_archived_rowid_is_not_seen(tmp_path: Path) -> None:
+    conn = init_lessons_db(tmp_path / "lessons.db")
+    get_or_create_tag(conn, "alpha", keywords="rebase,head")
+    insert_lesson(conn, lesson_id="l_old", project_id="proj", date="2026-03-20",
+                  text="old lesson", tag_names=["alpha"])
+    with SeenSet("sess", tmp_path / "seen") as seen:
+        assert [r["id"] for r in surface_lessons(conn, "rebase head", seen=seen)] == ["l_old"]
+        rowid = conn.execute("SELECT rowid FROM lessons WHERE id = 'l_old'").fetchone()[0]
+        conn.execute("DELETE FROM lessons WHERE id = 'l_old'")
+        insert_lesson(conn, lesson_id="l_new", project_id="proj", date="2026-03-21",
+                      text="new lesson", tag_names=["alpha"])
+        assert conn.execute("SELECT rowid FROM lessons WHERE id = 'l_new'").fetchone()[0] == rowid
+        assert [r["id"] for r in surface_lessons(conn, "rebase head", seen=seen)] == ["l_new"]
+    conn.close()
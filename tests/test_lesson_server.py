@@ -0,0 +1,150 @@
+"""Tests for cli/lessons/server.py — in-memory lessons query server."""
+
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from cli.lessons.db import (
+    get_or_create_tag,
+    init_lessons_db,
+    insert_lesson,
+    match_lessons,
+    surface_candidates,
+    surface_lessons,
+    update_lesson,
+)
+from cli.lessons.server import LessonIndex, make_server, query
+
+CONTEXTS = [
+    "git rebase shared",
+    "git rebase HEAD~3",
+    "rebase deploy",
+    "rebases only",
+    "kubernetes deploy --force",
+    "cherry-pick heads",
+    "pick hea",
+    "ls",
+]
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "lessons.db"
+    conn = init_lessons_db(path)
+    get_or_create_tag(conn, "alpha", keywords="rebase,cherry-pick,head")
+    get_or_create_tag(conn, "beta", keywords="deploy,kubernetes")
+    insert_lesson(
+        conn, lesson_id="lesson_alpha", project_id="proj", date="2026-03-24",
+        text="alpha lesson text", tag_names=["alpha"], tier="key",
+    )
+    insert_lesson(
+        conn, lesson_id="lesson_split", project_id="proj", date="2026-03-25",
+        text="split lesson text", tag_names=["alpha", "beta"], scope="project",
+    )
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def socket_path() -> Iterator[Path]:
+    # AF_UNIX paths are capped at ~108 bytes; pytest's tmp_path can exceed it.
+    with tempfile.TemporaryDirectory(prefix="ctl-") as d:
+        yield Path(d) / "lessons.sock"
+
+
+class TestLessonIndex:
+    @pytest.mark.parametrize("context", CONTEXTS)
+    @pytest.mark.parametrize("project", [None, "proj"])
+    def test_matches_sql_path(self, db_path: Path, context: str, project: str | None) -> None:
+        index = LessonIndex(db_path)
+        index.refresh()
+        conn = sqlite3.connect(db_path)
+        try:
+            assert index.match(context, project=project) == match_lessons(
+                conn, context, project=project,
+            )
+        finally:
+            conn.close()
+            index.close()
+
+    @pytest.mark.parametrize("context", CONTEXTS)
+    @pytest.mark.parametrize("project", [None, "proj"])
+    def test_candidates_match_sql_path(self, db_path: Path, context: str, project: str | None) -> None:
+        index = LessonIndex(db_path)
+        index.refresh()
+        conn = sqlite3.connect(db_path)
+        try:
+            assert sorted(index.candidates(context, project=project)) == sorted(
+                surface_candidates(conn, context, project=project),
+            )
+        finally:
+            conn.close()
+            index.close()
+
+    def test_reloads_after_write(self, db_path: Path) -> None:
+        index = LessonIndex(db_path)
+        assert index.refresh() is True
+        assert index.refresh() is False
+        assert [i for i, _ in index.match("rebase head")] == ["lesson_alpha"]
+
+        conn = init_lessons_db(db_path)
+        update_lesson(conn, "lesson_alpha", active=0)
+        conn.close()
+
+        assert index.refresh() is True
+        assert index.match("rebase head") == []
+        index.close()
+
+
+class TestServer:
+    def test_round_trip(self, db_path: Path, socket_path: Path) -> None:
+        server = make_server(db_path, socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            assert query(socket_path, {"op": "ping"}) == {"ok": True}
+            resp = query(socket_path, {"op": "match", "context": "git rebase HEAD~3", "project": "proj"})
+            assert resp is not None and resp["ok"]
+            assert [r["id"] for r in resp["lessons"]] == ["lesson_alpha", "lesson_split"]
+            surfaced = query(socket_path, {"op": "surface", "context": "git rebase HEAD~3", "project": "proj",
+                                           "budget_bytes": 20, "today": "2026-03-25"})
+            conn = sqlite3.connect(db_path)
+            expected = surface_lessons(conn, "git rebase HEAD~3", project="proj", budget_bytes=20, today="2026-03-25")
+            conn.close()
+            assert surfaced == {"ok": True, "lessons": expected}
+            assert [r["id"] for r in expected] == ["lesson_alpha"]
+            bad = query(socket_path, {"op": "nope"})
+            assert bad is not None and not bad["ok"]
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.index.close()
+
+    def test_surface_session_dedup(self, db_path: Path, socket_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(socket_path.parent))
+        server = make_server(db_path, socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        request = {"op": "surface", "context": "git rebase HEAD~3", "project": "proj", "limit": 1, "session": "s1"}
+        try:
+            ids = [[r["id"] for r in query(socket_path, request)["lessons"]] for _ in range(3)]  # type: ignore[index]
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.index.close()
+        assert ids == [["lesson_alpha"], ["lesson_split"], []]
+
+    def test_query_without_server_returns_none(self, socket_path: Path) -> None:
+        assert query(socket_path, {"op": "ping"}) is None
+
+    def test_stale_socket_replaced(self, db_path: Path, socket_path: Path) -> None:
+        socket_path.touch()
+        server = make_server(db_path, socket_path)
+        server.server_close()
+        server.index.close()
@@ -0,0 +1,56 @@
+"""Tests for cli/lessons/similarity.py — MinHash / LSH / union-find."""
+
+from __future__ import annotations
+
+from cli.lessons.similarity import (
+    LSH_BANDS,
+    NUM_PERM,
+    UnionFind,
+    band_buckets,
+    pack_signature,
+    shingles,
+    similarity,
+    text_signature,
+    unpack_signature,
+)
+
+BASE = "Always run the full test suite before pushing a rebase of a shared branch"
+
+
+class TestSignatures:
+    def test_shingles_normalize_case_and_whitespace(self) -> None:
+        assert shingles("Ab  CDe") == shingles("ab cde") == {"ab cd", "b cde"}
+        assert shingles("tiny") == {"tiny"}
+        assert shingles("   ") == set()
+
+    def test_identical_text_identical_signature(self) -> None:
+        sig = text_signature(BASE)
+        assert len(sig) == NUM_PERM
+        assert similarity(sig, text_signature(BASE.upper())) == 1.0
+
+    def test_similarity_tracks_overlap(self) -> None:
+        base = text_signature(BASE)
+        near = text_signature(BASE + " too")
+        far = text_signature("Prefer pathlib over os.path for new filesystem helpers")
+        assert similarity(base, near) > 0.7
+        assert similarity(base, far) < 0.2
+
+    def test_near_duplicates_share_a_band(self) -> None:
+        a = band_buckets(text_signature(BASE))
+        b = band_buckets(text_signature(BASE + "!"))
+        assert len(a) == LSH_BANDS
+        assert set(a) & set(b)
+
+    def test_pack_round_trip(self) -> None:
+        sig = text_signature(BASE)
+        assert unpack_signature(pack_signature(sig)) == sig
+
+
+class TestUnionFind:
+    def test_groups(self) -> None:
+        uf = UnionFind()
+        uf.union("a", "b")
+        uf.union("c", "b")
+        uf.union("x", "y")
+        uf.find("lonely")
+        assert sorted(sorted(g) for g in uf.groups()) == [["a", "b", "c"], ["x", "y"]]
@@ -0,0 +1,109 @@
+"""Tests for cli/lessons/snapshot.py — bash-sourceable lessons snapshot."""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from cli.lessons.db import (
+    get_or_create_tag,
+    init_lessons_db,
+    insert_lesson,
+    main,
+)
+from cli.lessons.snapshot import snapshot_path, write_snapshot
+
+pytestmark = pytest.mark.skipif(shutil.which("bash") is None, reason="bash not available")
+
+TRICKY_TEXT = "Don't run `rm -rf $HOME`; use \"trash\" instead.\nSecond line"
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "lessons.db"
+    conn = init_lessons_db(path)
+    get_or_create_tag(conn, "alpha", keywords="rebase,cherry-pick")
+    get_or_create_tag(conn, "beta", keywords="deploy,rebase")
+    insert_lesson(
+        conn, lesson_id="lesson_old", project_id="proj", date="2026-03-01",
+        text=TRICKY_TEXT, tag_names=["alpha"],
+    )
+    insert_lesson(
+        conn, lesson_id="lesson_key", project_id="proj", date="2026-01-01",
+        text="key lesson", tag_names=["alpha", "beta"], tier="key", scope="project",
+    )
+    insert_lesson(
+        conn, lesson_id="lesson_off", project_id="proj", date="2026-03-02",
+        text="inactive", tag_names=["beta"],
+    )
+    conn.execute("UPDATE lessons SET active = 0 WHERE id = 'lesson_off'")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _bash(snapshot: Path, expr: str) -> str:
+    script = f'source "$1"; {expr}'
+    return subprocess.run(
+        ["bash", "-c", script, "bash", str(snapshot)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+
+
+class TestSnapshot:
+    def test_sourced_values(self, db_path: Path) -> None:
+        conn = init_lessons_db(db_path)
+        path = write_snapshot(conn, snapshot_path(db_path))
+        conn.close()
+        assert path.name == "lessons-snapshot.sh"
+
+        assert _bash(path, 'echo "${LESSON_IDS[*]}"') == "lesson_key lesson_old\n"
+        assert _bash(path, 'printf %s "${LESSON_TEXT[lesson_old]}"') == TRICKY_TEXT
+        assert _bash(path, 'echo "${LESSON_SCOPE[lesson_key]}/${LESSON_PROJECT[lesson_key]}"') == "project/proj\n"
+        assert _bash(path, 'echo "${LESSON_TAGS[lesson_key]}"') == "1 2\n"
+        assert _bash(path, 'echo "${KEYWORD_TAGS[rebase]}|${KEYWORD_TAGS[cherry-pick]}"') == "1 2|1\n"
+        assert _bash(path, 'echo "${TAG_NAME[2]}"') == "beta\n"
+        assert _bash(path, 'echo "${LESSON_TEXT[lesson_off]-unset}"') == "unset\n"
+
+    def test_atomic_write_leaves_no_temp_files(self, db_path: Path) -> None:
+        conn = init_lessons_db(db_path)
+        write_snapshot(conn, snapshot_path(db_path))
+        write_snapshot(conn, snapshot_path(db_path))
+        conn.close()
+        assert not [p for p in db_path.parent.iterdir() if p.name.startswith(".")]
+
+    def test_regenerated_after_write_command(
+        self, db_path: Path, monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        path = snapshot_path(db_path)
+        assert not path.exists()
+        monkeypatch.setattr(sys, "argv", ["lessons", "--db", str(db_path), "deactivate", "--id", "lesson_key"])
+        main()
+        assert _bash(path, 'echo "${LESSON_IDS[*]}"') == "lesson_old\n"
+        fresh = f'db={db_path}; [[ $1 -nt $db && ( ! -e $db-wal || $1 -nt $db-wal ) ]] && echo fresh'
+        assert _bash(path, fresh) == "fresh\n"
+
+        export = db_path.with_name("import.ndjson")
+        export.write_text(
+            '{"kind": "header", "format": "claude-toolkit-lessons", "version": 1}\n'
+            '{"kind": "lesson", "id": "lesson_new", "project": "proj", "date": "2026-04-01",'
+            ' "text": "imported", "tags": ["beta"]}\n'
+        )
+        monkeypatch.setattr(sys, "argv", ["lessons", "--db", str(db_path), "import", str(export)])
+        main()
+        assert _bash(path, 'echo "${LESSON_IDS[*]}"') == "lesson_new lesson_old\n"
+        assert _bash(path, fresh) == "fresh\n"
+
+        # Keyword edit the triggers missed; the reindex-counts repair must reach the snapshot.
+        conn = init_lessons_db(db_path)
+        conn.execute("DROP TRIGGER tags_keywords_au")
+        conn.execute("UPDATE tags SET keywords = 'deploy' WHERE name = 'beta'")
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr(sys, "argv", ["lessons", "--db", str(db_path), "reindex-counts"])
+        main()
+        assert _bash(path, 'echo "${KEYWORD_TAGS[rebase]}"') == "1\n"